@@ -7,8 +7,9 @@ import time
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 
-from file_ops import copy_with_progress, delete_path, write_text, list_files
-from storage_monitor import WmiDriveEventWatcher, get_removable_drives
+from oplog import OperationLog
+from file_ops import DirSizeCache, compute_dir_sizes, copy_with_progress, delete_path, write_text, list_files
+from storage_monitor import WmiDriveEventWatcher, get_removable_drives, mount_for_drive
 from usb_info import list_usb_devices
 
 
@@ -24,6 +25,13 @@ class App(tk.Tk):
         self.show_hidden_var = tk.BooleanVar(value=True)
 
         self._refresh_timer_id = None
+        # 目录大小统计：记忆表 + 当前统计任务的取消标志
+        self._dir_size_cache = DirSizeCache()
+        self._dir_size_cancel = threading.Event()
+
+        # 操作日志：记录先进入有界存储，界面每帧批量刷新一次
+        self.oplog = OperationLog()
+        self._log_flush_id = None
 
         self._build_ui()
         self._refresh_user()
@@ -46,8 +54,25 @@ class App(tk.Tk):
             self.watcher.stop(join_timeout_sec=2.0)
         except Exception:
             pass
+        self.oplog.close()
         self.destroy()
 
+    # 拷贝时的落盘策略（见 file_ops.FLUSH_POLICIES）；默认周期性刷写，速度与“完成”提示反映真实写入设备的情况
+    FLUSH_POLICY_LABELS = {
+        "none": "不刷写(仅页缓存)",
+        "periodic": "每32MB刷写(推荐)",
+        "end": "结束时刷写",
+        "sync": "同步写(O_SYNC)",
+        "direct": "直写设备(O_DIRECT)",
+    }
+
+    def _selected_flush_policy(self) -> str:
+        label = self.flush_policy_combo.get()
+        for key, text in self.FLUSH_POLICY_LABELS.items():
+            if text == label:
+                return key
+        return "periodic"
+
     def _build_ui(self):
         top = ttk.Frame(self)
         top.pack(fill="x", padx=10, pady=8)
@@ -196,6 +221,12 @@ class App(tk.Tk):
         copy_frame = ttk.Frame(ops)
         copy_frame.pack(fill="x", padx=8, pady=6)
         ttk.Button(copy_frame, text="选择源文件并拷入U盘…", command=self._copy_file).pack(side="left")
+        self.flush_policy_combo = ttk.Combobox(
+            copy_frame, state="readonly", width=22, values=list(self.FLUSH_POLICY_LABELS.values())
+        )
+        self.flush_policy_combo.set(self.FLUSH_POLICY_LABELS["periodic"])
+        self.flush_policy_combo.pack(side="right")
+        ttk.Label(copy_frame, text="落盘策略：").pack(side="right")
 
         # 删除
         del_frame = ttk.Frame(ops)
@@ -211,8 +242,27 @@ class App(tk.Tk):
         self.log = tk.Text(right, height=6)
         self.log.pack(fill="both", expand=True, pady=(4, 0))
 
-    def _log(self, msg: str):
-        self.log.insert("end", msg + "\n")
+    # 日志控件最多保留的行数；更早的记录只在磁盘日志文件中
+    LOG_VIEW_LINES = 1000
+
+    def _log(self, msg: str, level: str = "INFO", device: str | None = None, job: str | None = None):
+        if device is None:
+            device = self.selected_usb_mount.get() or None
+        self.oplog.append(msg, level=level, device=device, job=job)
+        if self._log_flush_id is None:
+            self._log_flush_id = self.after(16, self._flush_log_view)
+
+    def _flush_log_view(self):
+        """把这一帧内积累的日志一次性插入文本框，并裁掉超出上限的旧行。"""
+        self._log_flush_id = None
+        records = self.oplog.drain_pending()
+        if not records:
+            return
+        records = records[-self.LOG_VIEW_LINES:]
+        self.log.insert("end", "".join(r.msg + "\n" for r in records))
+        lines = int(self.log.index("end-1c").split(".")[0])
+        if lines > self.LOG_VIEW_LINES:
+            self.log.delete("1.0", f"{lines - self.LOG_VIEW_LINES}.0")
         self.log.see("end")
 
     def _refresh_user(self):
@@ -248,7 +298,7 @@ class App(tk.Tk):
 
     def _refresh_mounts(self):
         drives = get_removable_drives()
-        values = [d + "\\" for d in drives]
+        values = [mount_for_drive(d) for d in drives]
         self.mount_combo["values"] = values
 
         current = self.selected_usb_mount.get()
@@ -262,8 +312,21 @@ class App(tk.Tk):
         # 刷新文件列表
         self._refresh_file_list()
 
+    @staticmethod
+    def _format_size(size_val: int) -> str:
+        if size_val < 1024:
+            return f"{size_val} B"
+        elif size_val < 1024 * 1024:
+            return f"{size_val / 1024:.1f} KB"
+        elif size_val < 1024 * 1024 * 1024:
+            return f"{size_val / (1024 * 1024):.1f} MB"
+        return f"{size_val / (1024 * 1024 * 1024):.2f} GB"
+
     def _refresh_file_list(self, event=None):
         """刷新文件列表"""
+        # 取消上一次尚未完成的目录大小统计
+        self._dir_size_cancel.set()
+
         for item in self.file_tree.get_children():
             self.file_tree.delete(item)
 
@@ -273,26 +336,23 @@ class App(tk.Tk):
 
         try:
             files = list_files(mount, self.show_hidden_var.get())
+            dirs = []
             for f in files:
                 f_type = '文件夹' if f['is_dir'] else '文件'
 
-                # 转换大小显示
-                size_val = f['size']
+                # 转换大小显示；目录大小稍后由后台统计填入
                 if not f['is_dir']:
-                    if size_val < 1024:
-                        size_str = f"{size_val} B"
-                    elif size_val < 1024 * 1024:
-                        size_str = f"{size_val / 1024:.1f} KB"
-                    else:
-                        size_str = f"{size_val / (1024 * 1024):.1f} MB"
+                    size_str = self._format_size(f['size'])
                 else:
-                    size_str = ""
+                    size_str = "计算中…"
+                    dirs.append(f['path'])
 
                 f_hidden = '√' if f['is_hidden'] else ''
 
                 self.file_tree.insert(
                     '',
                     'end',
+                    iid=f['path'],
                     values=(f['name'], size_str, f_type, f['modified'], f_hidden)
                 )
 
@@ -301,21 +361,49 @@ class App(tk.Tk):
 
         except Exception as e:
             self._log(f"刷新文件列表失败：{e}")
+            return
+
+        if dirs:
+            cancel = threading.Event()
+            self._dir_size_cancel = cancel
+
+            def on_result(path, size, count):
+                self.after(0, lambda: self._set_dir_size(path, size, count, cancel))
+
+            threading.Thread(
+                target=compute_dir_sizes,
+                args=(dirs, on_result, self._dir_size_cache, cancel),
+                daemon=True,
+            ).start()
+
+    def _set_dir_size(self, path, size, count, cancel):
+        if cancel.is_set() or not self.file_tree.exists(path):
+            return
+        self.file_tree.set(path, 'size', f"{self._format_size(size)} ({count}个文件)")
 
     def _on_drive_event_from_worker(self, evt):
         self.after(0, lambda: self._handle_drive_event(evt.action, evt.drive_letter))
 
+    def _mount_for_drive(self, drive_letter: str) -> str:
+        return mount_for_drive(drive_letter)
+
+    def _notify(self, kind: str, title: str, msg: str):
+        if kind == "warning":
+            messagebox.showwarning(title, msg, parent=self)
+        else:
+            messagebox.showinfo(title, msg, parent=self)
+
     def _handle_drive_event(self, action: str, drive_letter: str):
-        mount = drive_letter + "\\"
+        mount = self._mount_for_drive(drive_letter)
         if action == "inserted":
             msg = f"检测到U盘插入：{mount}"
             self._log("[插入] " + msg)
-            messagebox.showinfo("U盘插入", msg, parent=self)
+            self._notify("info", "U盘插入", msg)
             threading.Thread(target=self._wait_ready_then_refresh, args=(mount,), daemon=True).start()
         elif action == "removed":
             msg = f"检测到U盘拔出：{mount}"
             self._log("[拔出] " + msg)
-            messagebox.showwarning("U盘拔出", msg, parent=self)
+            self._notify("warning", "U盘拔出", msg)
             self._schedule_single_refresh()
 
     def _wait_ready_then_refresh(self, mount: str):
@@ -338,6 +426,11 @@ class App(tk.Tk):
         self._refresh_usb_devices()
         self._refresh_file_list()
 
+    def _on_paths_changed(self, added=(), removed=()):
+        """本程序自身修改了 U 盘上的路径后调用；子类可据此增量更新索引等。"""
+        for p in list(added) + list(removed):
+            self._dir_size_cache.invalidate(p)
+
     def _require_mount(self) -> str:
         mp = self.selected_usb_mount.get()
         if not mp:
@@ -362,6 +455,7 @@ class App(tk.Tk):
                 raise RuntimeError("相对路径不能为空。")
             target = write_text(mp, rel, "Hello USB!\n这是一段写入U盘的测试文本。\n")
             self._log(f"写入完成：{target}")
+            self._on_paths_changed(added=[target])
             self._refresh_file_list()
         except Exception as e:
             self._log(f"写入失败：{e}")
@@ -382,6 +476,7 @@ class App(tk.Tk):
             self.speed_label.config(text=" | 速率: -- MB/s")
             self.remaining_label.config(text=" | 剩余: --")
             self.progress_bar.config(mode='determinate', style="")
+            flush_policy = self._selected_flush_policy()
 
             def worker():
                 try:
@@ -392,6 +487,11 @@ class App(tk.Tk):
                     def on_p(p):
                         nonlocal last_update_time, last_copied
 
+                        if p.phase == "flush":
+                            # 数据已全部写出，等待真正写入设备
+                            self.after(0, lambda: self.progress_text.config(text="正在刷写到设备…"))
+                            return
+
                         current_time = time.time()
                         pct = int((p.bytes_copied / max(p.total_bytes, 1)) * 100)
 
@@ -419,21 +519,21 @@ class App(tk.Tk):
 
                             # 线程安全更新 UI
                             self.after(0, lambda: self._update_progress_ui(
-                                pct, speed_mbps, avg_speed, rem_time_str
+                                pct, speed_mbps, avg_speed, rem_time_str, mp
                             ))
 
                             last_update_time = current_time
                             last_copied = p.bytes_copied
 
-                    copy_with_progress(src, dst, on_progress=on_p)
+                    copy_with_progress(src, dst, on_progress=on_p, flush_policy=flush_policy)
 
                     # 成功
-                    self.after(0, lambda: self._copy_complete(src, dst))
+                    self.after(0, lambda: self._copy_complete(src, dst, mp))
 
                 except Exception as e:
                     # [关键修复] 将异常转换为字符串，确保 lambda 绑定的是值而不是引用
                     err_msg = str(e)
-                    self.after(0, lambda: self._copy_failed(err_msg))
+                    self.after(0, lambda: self._copy_failed(err_msg, mp))
 
             threading.Thread(target=worker, daemon=True).start()
 
@@ -441,12 +541,13 @@ class App(tk.Tk):
             self._log(f"拷贝启动失败：{e}")
             messagebox.showerror("错误", str(e), parent=self)
 
-    def _update_progress_ui(self, percent, instant_speed, avg_speed, remaining):
+    def _update_progress_ui(self, percent, instant_speed, avg_speed, remaining, mount):
+        # mount 为任务开始时的目标盘，复制期间用户可能已切换选中的盘
         self.progress_var.set(percent)
         self.speed_label.config(text=f" | {instant_speed:.1f} MB/s")
         self.remaining_label.config(text=f" | 剩余: {remaining}")
 
-    def _copy_complete(self, src, dst):
+    def _copy_complete(self, src, dst, mount):
         self.progress_text.config(text="复制完成!")
         self.progress_var.set(100)
         self.speed_label.config(text="")
@@ -454,12 +555,13 @@ class App(tk.Tk):
         self.progress_bar.config(style="green.Horizontal.TProgressbar")
 
         self._log(f"拷贝完成：{src} -> {dst}")
+        self._on_paths_changed(added=[dst])
         self._refresh_file_list()
 
         # 3秒后重置
         self.after(3000, self._reset_progress)
 
-    def _copy_failed(self, error_msg):
+    def _copy_failed(self, error_msg, mount):
         """处理复制失败"""
         self.progress_text.config(text="复制失败!")
         self.progress_bar.config(style="red.Horizontal.TProgressbar")
@@ -485,6 +587,7 @@ class App(tk.Tk):
                 return
             target = delete_path(mp, rel)
             self._log(f"删除完成：{target}")
+            self._on_paths_changed(removed=[target])
             self._refresh_file_list()
         except Exception as e:
             self._log(f"删除失败：{e}")
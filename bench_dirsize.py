@@ -0,0 +1,127 @@
+"""
+bench_dirsize.py
+目录大小统计基准：比较串行 os.walk 与 compute_dir_sizes（按顶层目录并行，冷/热缓存）的耗时。
+
+合成两种目录树：
+    宽树   - 顶层有多个大小相近的深目录，可按顶层目录并行；
+    深子树 - 同样数量的文件全部在一个顶层目录下，compute_dir_sizes 只能用一个线程统计它。
+也可以用 --root 统计真实目录（如 U 盘挂载点）下的各顶层目录。
+
+用法：
+    python bench_dirsize.py
+    python bench_dirsize.py --files 50000 --depth 8 --workers 8
+    python bench_dirsize.py --root /media/usb --drop-caches     # 冷启动需要 root 权限丢弃页缓存
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from file_ops import DirSizeCache, compute_dir_sizes
+
+
+def make_tree(root: str, tops: int, files: int, depth: int, fanout: int = 3) -> None:
+    """在 root 下建 tops 个顶层目录，每个目录向下 depth 层、每层 fanout 个子目录，共 files 个小文件。"""
+    leaves = []
+    for t in range(tops):
+        level = [os.path.join(root, f"top{t:02d}")]
+        for d in range(depth):
+            level = [os.path.join(p, f"d{d}_{k}") for p in level for k in range(fanout if d < 3 else 1)]
+        leaves += level
+    for i in range(files):
+        leaf = leaves[i % len(leaves)]
+        if i < len(leaves):
+            os.makedirs(leaf, exist_ok=True)
+        with open(os.path.join(leaf, f"f{i}.bin"), "wb") as f:
+            f.write(b"x" * (i % 4096))
+
+
+def _drop_caches() -> None:
+    try:
+        os.sync()
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+    except OSError:
+        pass
+
+
+def walk_serial(paths: list[str]) -> tuple[int, int]:
+    total_bytes = total_files = 0
+    for p in paths:
+        for dirpath, _dirnames, filenames in os.walk(p):
+            for name in filenames:
+                try:
+                    total_bytes += os.lstat(os.path.join(dirpath, name)).st_size
+                    total_files += 1
+                except OSError:
+                    pass
+    return total_bytes, total_files
+
+
+def walk_parallel(paths: list[str], workers: int, cache: Optional[DirSizeCache]) -> tuple[int, int]:
+    totals = [0, 0]
+
+    def on_result(_path: str, nbytes: int, nfiles: int) -> None:
+        totals[0] += nbytes
+        totals[1] += nfiles
+
+    compute_dir_sizes(paths, on_result, cache=cache, workers=workers)
+    return totals[0], totals[1]
+
+
+def bench(name: str, root: str, workers: int, drop: bool) -> None:
+    paths = sorted(e.path for e in os.scandir(root) if e.is_dir(follow_symlinks=False))
+    cache = DirSizeCache()
+    rows = []
+    for label, fn in (("串行 os.walk", lambda: walk_serial(paths)),
+                      (f"并行 x{workers}（无缓存）", lambda: walk_parallel(paths, workers, None)),
+                      (f"并行 x{workers}（填充缓存）", lambda: walk_parallel(paths, workers, cache)),
+                      (f"并行 x{workers}（缓存命中）", lambda: walk_parallel(paths, workers, cache))):
+        if drop and "命中" not in label:
+            _drop_caches()
+        t0 = time.perf_counter()
+        nbytes, nfiles = fn()
+        rows.append((label, time.perf_counter() - t0, nbytes, nfiles))
+    base = rows[0][1]
+    # compute_dir_sizes 按顶层目录分配任务，并行度不超过顶层目录数
+    print(f"[{name}] {len(paths)} 个顶层目录，{rows[0][3]} 个文件，{rows[0][2] / 1024 / 1024:.1f} MB，"
+          f"实际并行度 {min(len(paths), workers)}")
+    for label, sec, nbytes, nfiles in rows:
+        mark = "" if (nbytes, nfiles) == rows[0][2:] else "  结果不一致!"
+        print(f"  {label:<20}{sec * 1000:10.1f} ms  ({base / sec:.1f}x){mark}")
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="目录大小统计基准")
+    parser.add_argument("--root", help="改为统计真实目录下的各顶层目录")
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--tops", type=int, default=8)
+    parser.add_argument("--depth", type=int, default=6)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--drop-caches", action="store_true", help="每轮冷测前丢弃页缓存（Linux，需要 root）")
+    args = parser.parse_args(argv)
+
+    if args.root:
+        bench(args.root, args.root, args.workers, args.drop_caches)
+        return
+
+    work = tempfile.mkdtemp(prefix="bench_dirsize_")
+    try:
+        wide = os.path.join(work, "wide")
+        deep = os.path.join(work, "deep")
+        make_tree(wide, args.tops, args.files, args.depth)
+        # 文件数相同，但全部位于一个顶层目录下：并行度只有 1
+        make_tree(deep, 1, args.files, args.depth + 2)
+        bench("宽树", wide, args.workers, args.drop_caches)
+        bench("单个深子树", deep, args.workers, args.drop_caches)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
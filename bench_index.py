@@ -0,0 +1,125 @@
+"""
+bench_index.py
+卷索引基准：用合成的路径（默认 100 万条）建立 VolumeIndex，报告构建耗时、每条目内存占用
+以及各类查询的延迟。也可以用 --root 对真实目录扫描建索引。
+
+用法：
+    python bench_index.py
+    python bench_index.py --entries 2000000
+    python bench_index.py --root /media/usb
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Optional
+
+from volume_index import IndexEntry, VolumeIndex, parse_query
+
+_EXTS = [".jpg", ".mp4", ".txt", ".pdf", ".docx", ".mp3", ".png", ".zip", ".log", ".py"]
+_WORDS = ["photo", "IMG", "report", "backup", "music", "video", "notes", "data", "项目", "照片"]
+
+QUERIES = [
+    "report",
+    "ext:.mp4",
+    "prefix:IMG_12",
+    "size>500M",
+    "after:2024-06-01 before:2024-06-30",
+    "照片 ext:.jpg",
+    "no_such_name_anywhere",
+]
+
+
+def synth_entries(count: int, seed: int = 0) -> list[IndexEntry]:
+    """生成类似真实 U 盘的目录树：约 1% 为目录，文件名带序号、扩展名与随机大小/时间。"""
+    rng = random.Random(seed)
+    entries = []
+    dirs = [""]
+    base_ts = 1700000000.0
+    for i in range(count):
+        parent = dirs[rng.randrange(len(dirs))]
+        word = _WORDS[rng.randrange(len(_WORDS))]
+        if i % 100 == 0:
+            path = f"{parent}/{word}_{i}" if parent else f"{word}_{i}"
+            dirs.append(path)
+            entries.append(IndexEntry(path, 0, base_ts + rng.random() * 3e7, True))
+        else:
+            name = f"{word}_{i}{_EXTS[rng.randrange(len(_EXTS))]}"
+            path = f"{parent}/{name}" if parent else name
+            entries.append(IndexEntry(path, int(rng.paretovariate(1.2) * 50000), base_ts + rng.random() * 3e7, False))
+    return entries
+
+
+def build_from(entries: list[IndexEntry]) -> VolumeIndex:
+    # 与 VolumeIndex.build 的后台线程做同样的事，只是跳过磁盘扫描
+    idx = VolumeIndex("")
+    with idx._lock:
+        idx._reset()
+        for e in entries:
+            idx._append(e)
+        idx._rebuild()
+    idx.ready.set()
+    return idx
+
+
+def bench_queries(idx: VolumeIndex, repeat: int) -> list[tuple[str, int, float, float]]:
+    rows = []
+    for q in QUERIES:
+        kwargs = parse_query(q)
+        times = []
+        hits = 0
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            hits = len(idx.search(**kwargs))
+            times.append((time.perf_counter() - t0) * 1000)
+        rows.append((q, hits, statistics.median(times), max(times)))
+    return rows
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="卷索引基准")
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--root", help="改为扫描真实目录建索引")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.root:
+        idx = VolumeIndex(args.root)
+        t0 = time.perf_counter()
+        idx.build()
+        idx.ready.wait()
+        print(f"扫描并建立索引: {len(idx)} 条，{time.perf_counter() - t0:.2f}s")
+    else:
+        entries = synth_entries(args.entries)
+        gc.collect()
+        t0 = time.perf_counter()
+        idx = build_from(entries)
+        build_sec = time.perf_counter() - t0
+        print(f"建立索引: {len(idx)} 条，{build_sec:.2f}s（{build_sec / len(idx) * 1e6:.2f} µs/条）")
+
+        # 内存单独再建一次测量：tracemalloc 本身会拖慢构建。
+        # 从生成条目开始统计，建完后丢掉合成数据，剩下的就是索引实际占用（含路径字符串）
+        del idx, entries
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        entries = synth_entries(args.entries)
+        idx = build_from(entries)
+        del entries
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"索引内存: {(after - before) / 1024 / 1024:.1f} MB（{(after - before) / len(idx):.0f} 字节/条，含路径字符串）")
+
+    print(f"{'查询':<36}{'命中':>8}{'中位数ms':>12}{'最大ms':>10}")
+    for q, hits, med, worst in bench_queries(idx, args.repeat):
+        print(f"{q:<36}{hits:>8}{med:>12.2f}{worst:>10.2f}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+bench_oplog.py
+操作日志压力测试：后台线程连续写入大量日志（默认 100 万条），主线程按 16 ms 一帧模拟 GUI 刷新
+（drain_pending 后插入文本框并裁剪到 LOG_VIEW_LINES），报告写入吞吐、每帧耗时、内存占用与导出耗时。
+
+有图形环境时使用真实的 tk.Text，否则用等价的行列表代替。
+内存超出环形缓冲上限或最慢一帧超过 --frame-budget-ms 时以非零状态退出。
+
+用法：
+    python bench_oplog.py
+    python bench_oplog.py --events 2000000 --writers 4
+    python bench_oplog.py --tracemalloc     # 额外统计 Python 分配（写入会慢约 10 倍）
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Optional
+
+from oplog import OperationLog
+
+try:
+    import resource
+except ImportError:  # Windows 上没有 resource 模块，不报告进程 RSS
+    resource = None
+
+LOG_VIEW_LINES = 1000  # 与 App.LOG_VIEW_LINES 一致
+FRAME_MS = 16
+
+
+class _LineView:
+    """无图形环境时代替 tk.Text：同样插入整批文本并裁掉超出上限的旧行。"""
+
+    def __init__(self):
+        self.lines: list[str] = []
+
+    def flush(self, records) -> None:
+        self.lines.extend(r.msg for r in records[-LOG_VIEW_LINES:])
+        if len(self.lines) > LOG_VIEW_LINES:
+            del self.lines[:len(self.lines) - LOG_VIEW_LINES]
+
+    def close(self) -> None:
+        pass
+
+
+class _TkView:
+    def __init__(self):
+        import tkinter as tk
+        self.root = tk.Tk()
+        self.root.withdraw()
+        self.text = tk.Text(self.root)
+
+    def flush(self, records) -> None:
+        # 与 App._flush_log_view 相同的处理
+        records = records[-LOG_VIEW_LINES:]
+        self.text.insert("end", "".join(r.msg + "\n" for r in records))
+        lines = int(self.text.index("end-1c").split(".")[0])
+        if lines > LOG_VIEW_LINES:
+            self.text.delete("1.0", f"{lines - LOG_VIEW_LINES}.0")
+        self.text.see("end")
+        self.root.update_idletasks()
+
+    def close(self) -> None:
+        self.root.destroy()
+
+
+def _make_view(use_tk: bool):
+    if use_tk:
+        try:
+            return _TkView(), "tk.Text"
+        except Exception:  # 没有 DISPLAY 等
+            pass
+    return _LineView(), "行列表（无图形环境）"
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="操作日志压力测试")
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--writers", type=int, default=2, help="并发写日志的线程数")
+    parser.add_argument("--capacity", type=int, default=5000)
+    parser.add_argument("--frame-budget-ms", type=float, default=50.0)
+    parser.add_argument("--no-tk", action="store_true", help="不使用 tk.Text")
+    parser.add_argument("--tracemalloc", action="store_true", help="用 tracemalloc 统计 Python 分配")
+    args = parser.parse_args(argv)
+
+    log_dir = tempfile.mkdtemp(prefix="bench_oplog_")
+    view, view_name = _make_view(not args.no_tk)
+    try:
+        gc.collect()
+        rss_before = _peak_rss_mb()
+        if args.tracemalloc:
+            tracemalloc.start()
+        log = OperationLog(capacity=args.capacity, log_dir=log_dir)
+        per_writer = args.events // args.writers
+        devices = ["E:\\", "F:\\", "/media/usb0", None]
+
+        def writer(w: int) -> None:
+            for i in range(per_writer):
+                log.append(f"writer {w} event {i} copied chunk {i * 4096}", device=devices[i % len(devices)],
+                           level="WARN" if i % 1000 == 0 else "INFO", job=f"job-{w}")
+
+        threads = [threading.Thread(target=writer, args=(w,), daemon=True) for w in range(args.writers)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+
+        frame_ms: list[float] = []
+        late_ms: list[float] = []
+        max_pending = 0
+        next_frame = time.perf_counter()
+        while True:
+            alive = any(t.is_alive() for t in threads)
+            next_frame += FRAME_MS / 1000
+            delay = next_frame - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            late_ms.append(max(0.0, -delay) * 1000)
+            f0 = time.perf_counter()
+            records = log.drain_pending()
+            max_pending = max(max_pending, len(records))
+            if records:
+                view.flush(records)
+            frame_ms.append((time.perf_counter() - f0) * 1000)
+            if not alive:
+                break
+        write_sec = time.perf_counter() - t0
+        current, peak = tracemalloc.get_traced_memory()
+        if args.tracemalloc:
+            tracemalloc.stop()
+        ring = len(log.records())
+
+        export_path = os.path.join(log_dir, "export.txt")
+        e0 = time.perf_counter()
+        exported = log.export(export_path)
+        export_sec = time.perf_counter() - e0
+        log.close()
+
+        total = per_writer * args.writers
+        frames = sorted(frame_ms)
+        print(f"写入 {total} 条（{args.writers} 个线程）: {write_sec:.2f}s，{total / write_sec:,.0f} 条/s")
+        print(f"界面刷新（{view_name}）: {len(frames)} 帧，中位 {statistics.median(frames):.2f} ms，"
+              f"p99 {frames[int(len(frames) * 0.99) - 1]:.2f} ms，最大 {frames[-1]:.2f} ms，最大延迟 {max(late_ms):.1f} ms")
+        mem = [f"环形缓冲 {ring} 条", f"单帧最多取出 {max_pending} 条"]
+        if args.tracemalloc:
+            mem.append(f"Python 分配 当前 {current / 1024 / 1024:.1f} MB / 峰值 {peak / 1024 / 1024:.1f} MB")
+        if resource is not None:
+            mem.append(f"进程峰值 RSS {rss_before:.1f} -> {_peak_rss_mb():.1f} MB")
+        print("内存: " + "，".join(mem))
+        print(f"导出: {exported} 条，{export_sec:.2f}s（磁盘上保留最近的轮转文件）")
+
+        failures = []
+        if ring > args.capacity or max_pending > args.capacity:
+            failures.append(f"内存中记录超出上限 {args.capacity}")
+        if frames[-1] > args.frame_budget_ms:
+            failures.append(f"最慢一帧 {frames[-1]:.1f} ms 超过 {args.frame_budget_ms:.0f} ms")
+        for line in failures:
+            print("失败: " + line)
+        return 1 if failures else 0
+    finally:
+        view.close()
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+bench_pack.py
+打包模式基准：生成大量小文件，比较逐个 copy_with_progress 复制与 pack_files 打包（tar / zip）
+写入目标目录的耗时。目标目录应为 U 盘上的目录，FAT 盘上差异最明显。
+
+用法：
+    python bench_pack.py /media/usb
+    python bench_pack.py /media/usb --files 10000 --size-kb 4
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Optional
+
+from file_ops import copy_with_progress, pack_files
+
+
+def make_small_files(root: str, count: int, size: int, per_dir: int = 500) -> None:
+    data = os.urandom(size)
+    for i in range(count):
+        d = os.path.join(root, f"d{i // per_dir:03d}")
+        if i % per_dir == 0:
+            os.makedirs(d, exist_ok=True)
+        with open(os.path.join(d, f"f{i:05d}.bin"), "wb") as f:
+            f.write(data)
+
+
+def _sync(path: str) -> None:
+    # 计时包含落盘：对目标目录所在文件系统执行 sync（Windows 上无此调用则跳过）
+    if hasattr(os, "sync"):
+        os.sync()
+
+
+def bench_per_file(src_root: str, dst_root: str) -> float:
+    t0 = time.perf_counter()
+    for dirpath, _dirnames, filenames in os.walk(src_root):
+        rel = os.path.relpath(dirpath, src_root)
+        for name in filenames:
+            copy_with_progress(os.path.join(dirpath, name), os.path.join(dst_root, rel, name))
+    _sync(dst_root)
+    return time.perf_counter() - t0
+
+
+def bench_pack(src_root: str, archive: str, fmt: str) -> float:
+    t0 = time.perf_counter()
+    pack_files([src_root], archive, fmt=fmt)
+    _sync(archive)
+    return time.perf_counter() - t0
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="小文件逐个复制 vs 打包写入基准")
+    parser.add_argument("dst_dir", help="目标目录（U 盘上）")
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--size-kb", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    work = tempfile.mkdtemp(prefix="bench_pack_")
+    src = os.path.join(work, "src")
+    out = os.path.join(args.dst_dir, ".bench_pack")
+    try:
+        make_small_files(src, args.files, args.size_kb * 1024)
+        total_mb = args.files * args.size_kb / 1024
+        os.makedirs(out, exist_ok=True)
+        results = [("逐个复制", bench_per_file(src, os.path.join(out, "files")))]
+        for fmt in ("tar", "zip"):
+            results.append((f"打包 {fmt}", bench_pack(src, os.path.join(out, f"pack.{fmt}"), fmt)))
+        print(f"{args.files} 个 {args.size_kb} KB 文件，共 {total_mb:.1f} MB -> {args.dst_dir}")
+        base = results[0][1]
+        for name, sec in results:
+            print(f"{name:>8}: {sec:7.2f}s  {args.files / sec:9.0f} 文件/s  {total_mb / sec:7.2f} MB/s  ({base / sec:.1f}x)")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+        shutil.rmtree(out, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,341 @@
+"""
+capacity_test.py
+扩容盘检测：用按偏移生成的确定性数据写满 U 盘剩余空间，再全部读回校验。
+假容量 U 盘超出真实容量的写入会被丢弃或回绕覆盖前面的数据，读回时即可发现。
+"""
+from __future__ import annotations
+
+import errno
+import functools
+import hashlib
+import json
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from array import array
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional
+
+import usb_extensions
+from file_ops import get_io_hook
+
+TEST_DIRNAME = "USBLAB_CAPTEST"
+STATE_FILENAME = "state.json"
+# FAT32 单文件上限 4 GiB，测试文件取 1 GiB
+FILE_SIZE = 1024 * 1024 * 1024
+CHUNK_SIZE = 4 * 1024 * 1024
+SECTOR = 512
+# 留一点余量给目录项/状态文件，避免把文件系统写到完全满
+RESERVE_BYTES = 4 * 1024 * 1024
+# 能否在校验前丢弃页缓存；不能时（Windows）需要重新插拔 U 盘后再校验
+CAN_DROP_CACHE = hasattr(os, "posix_fadvise")
+
+# 测试数据格式版本，记录在 state.json 中；格式不同的未完成检测不能续测
+PATTERN_VERSION = 2
+
+_MULT = 0x9E3779B97F4A7C15
+_MASK = (1 << 64) - 1
+
+
+@functools.lru_cache(maxsize=4)
+def _sector_template(seed: int, sectors: int) -> bytes:
+    # 每个扇区除头部外的填充内容只由 seed 决定，整块预先生成后反复复用
+    return hashlib.shake_128(seed.to_bytes(8, "little")).digest(SECTOR) * sectors
+
+
+def pattern_chunk(offset: int, length: int, seed: int) -> bytes:
+    """
+    生成从全局偏移 offset 开始、长度 length 的测试数据。
+    每个 512 字节扇区的前 8 字节为 (扇区号 * 黄金比例常数 + seed) mod 2^64（小端序），
+    其余 504 字节为由 seed 派生的固定填充。扇区头与偏移绑定，回绕写入（假容量）的数据必然校验失败；
+    整块只需按扇区填入头部，不依赖 numpy 也能达到数百 MB/s。
+    """
+    first = offset // SECTOR
+    skip = offset - first * SECTOR
+    sectors = -(-(skip + length) // SECTOR)
+    buf = bytearray(_sector_template(seed & _MASK, sectors))
+    heads = array("Q", [((first + k) * _MULT + seed) & _MASK for k in range(sectors)])
+    if sys.byteorder != "little":
+        heads.byteswap()
+    memoryview(buf).cast("Q")[::SECTOR // 8] = heads
+    if skip == 0 and length == len(buf):
+        return bytes(buf)
+    return bytes(buf[skip:skip + length])
+
+
+def _pipelined_patterns(start: int, end: int, seed: int, depth: int = 4) -> Iterator[tuple[int, bytes]]:
+    """在后台线程中预生成数据块，主线程只负责写/读，两者流水并行。"""
+    q: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def producer():
+        off = start
+        while off < end and not stop.is_set():
+            n = min(CHUNK_SIZE, end - off)
+            q.put((off, pattern_chunk(off, n, seed)))
+            off += n
+        q.put(None)
+
+    t = threading.Thread(target=producer, name="CapacityPattern", daemon=True)
+    t.start()
+    try:
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            yield item
+    finally:
+        stop.set()
+        # 让生产者从阻塞的 put 中退出
+        while t.is_alive():
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                t.join(0.05)
+
+
+@dataclass
+class CapacityReport:
+    free_bytes: int  # 开始时文件系统报告的剩余空间
+    written_bytes: int = 0
+    verified_bytes: int = 0
+    # 损坏区间 [(起始偏移, 结束偏移)]，偏移为测试数据流中的全局偏移
+    corrupted_ranges: list[tuple[int, int]] = field(default_factory=list)
+    write_mbps: float = 0.0
+    read_mbps: float = 0.0
+    completed: bool = False
+    # 写入已完成、按 pause_before_verify 停在校验之前，等待重新插拔
+    needs_replug: bool = False
+
+    @property
+    def usable_bytes(self) -> int:
+        """第一个损坏位置之前的数据均可信，视为真实可用容量。"""
+        if self.corrupted_ranges:
+            return self.corrupted_ranges[0][0]
+        return self.verified_bytes
+
+    @property
+    def is_fake(self) -> bool:
+        return bool(self.corrupted_ranges)
+
+
+def _state_path(mount: str) -> str:
+    return os.path.join(mount, TEST_DIRNAME, STATE_FILENAME)
+
+
+def _load_state(mount: str) -> Optional[dict]:
+    try:
+        with open(_state_path(mount), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_state(mount: str, state: dict) -> None:
+    path = _state_path(mount)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def has_unfinished_test(mount: str) -> bool:
+    state = _load_state(mount)
+    return state is not None and state.get("phase") != "done" and state.get("pattern") == PATTERN_VERSION
+
+
+def cleanup(mount: str) -> None:
+    """删除测试目录及其中全部测试文件。"""
+    shutil.rmtree(os.path.join(mount, TEST_DIRNAME), ignore_errors=True)
+
+
+def _drop_cache(fd: int) -> None:
+    # 校验时必须真正从设备读取，而不是读页缓存中刚写入的数据
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def _merge_range(ranges: list[tuple[int, int]], start: int, end: int) -> None:
+    if ranges and ranges[-1][1] == start:
+        ranges[-1] = (ranges[-1][0], end)
+    else:
+        ranges.append((start, end))
+
+
+def _write_file(path: str, base: int, size: int, seed: int,
+                on_bytes: Callable[[int], None], cancel: Optional[threading.Event]) -> int:
+    """写一个测试文件，返回实际写入字节数（空间不足时提前结束）。"""
+    written = 0
+    hook = get_io_hook()
+    with open(path, "wb", buffering=0) as f:
+        try:
+            for off, data in _pipelined_patterns(base, base + size, seed):
+                if cancel is not None and cancel.is_set():
+                    break
+                # 无缓冲写可能只写入一部分，按实际写入量推进，保证计数与文件内容一致
+                view = memoryview(data)
+                while view:
+                    n = f.write(view)
+                    if not n:
+                        raise OSError(errno.EIO, "写入返回 0 字节", path)
+                    if hook:
+                        hook("write", path, n)
+                    view = view[n:]
+                    written += n
+                    on_bytes(n)
+        except OSError as e:
+            if e.errno != errno.ENOSPC:
+                raise
+            f.truncate(written)
+        os.fsync(f.fileno())
+        _drop_cache(f.fileno())
+    return written
+
+
+def _verify_file(path: str, base: int, size: int, seed: int, report: CapacityReport,
+                 on_bytes: Callable[[int], None], cancel: Optional[threading.Event]) -> bool:
+    """读回一个测试文件并与期望数据比较，损坏区间按扇区粒度记录。返回是否读完。"""
+    hook = get_io_hook()
+    with open(path, "rb", buffering=0) as f:
+        _drop_cache(f.fileno())
+        for off, expected in _pipelined_patterns(base, base + size, seed):
+            if cancel is not None and cancel.is_set():
+                return False
+            actual = f.read(len(expected))
+            if hook:
+                hook("read", path, len(actual))
+            if actual != expected:
+                for s in range(0, len(expected), SECTOR):
+                    if actual[s:s + SECTOR] != expected[s:s + SECTOR]:
+                        _merge_range(report.corrupted_ranges, off + s, off + min(s + SECTOR, len(expected)))
+            report.verified_bytes += len(expected)
+            on_bytes(len(expected))
+    return True
+
+
+def run_capacity_test(
+        mount: str,
+        resume: bool = True,
+        seed: Optional[int] = None,
+        on_progress: Optional[Callable[[str, int, int], None]] = None,
+        cancel: Optional[threading.Event] = None,
+        pause_before_verify: bool = False,
+) -> CapacityReport:
+    """
+    执行扩容检测：写满剩余空间 -> 读回校验。
+
+    每写完/校验完一个文件都会记录进度到测试目录下的 state.json，
+    resume=True 时从上次中断的文件继续。on_progress(阶段, 已完成字节, 总字节)，阶段为 "write"/"verify"。
+    Linux 下校验前会丢弃页缓存；无法丢弃缓存时（CAN_DROP_CACHE 为 False）应传 pause_before_verify=True，
+    写入完成后返回 needs_replug=True 的报告，重新插拔 U 盘后以 resume=True 再次调用完成校验。
+    """
+    test_dir = os.path.join(mount, TEST_DIRNAME)
+    state = _load_state(mount) if resume else None
+    if state is not None and state.get("pattern") != PATTERN_VERSION:
+        # 旧版本写入的数据按新格式校验会全部失败，只能重新开始
+        state = None
+    if state is None:
+        cleanup(mount)
+        os.makedirs(test_dir, exist_ok=True)
+        free = usb_extensions.get_disk_space(mount)["free_bytes"]
+        state = {
+            "pattern": PATTERN_VERSION,
+            "seed": seed if seed is not None else int.from_bytes(os.urandom(8), "little"),
+            "free_bytes": free,
+            "target_bytes": max(free - RESERVE_BYTES, 0) // SECTOR * SECTOR,
+            "files": [],  # 已完整写入的文件 [名称, 大小]
+            "phase": "write",
+            "verified_files": 0,
+            "verified_bytes": 0,
+            "corrupted": [],
+            "write_sec": 0.0,
+            "read_sec": 0.0,
+        }
+        _save_state(mount, state)
+
+    seed = state["seed"]
+    target = state["target_bytes"]
+    report = CapacityReport(free_bytes=state["free_bytes"],
+                            written_bytes=sum(size for _, size in state["files"]),
+                            verified_bytes=state["verified_bytes"],
+                            corrupted_ranges=[tuple(r) for r in state["corrupted"]])
+
+    done = report.written_bytes
+
+    def on_write(n: int) -> None:
+        nonlocal done
+        done += n
+        if on_progress:
+            on_progress("write", done, target)
+
+    # ---------- 写入阶段 ----------
+    wrote = state["phase"] == "write"
+    while state["phase"] == "write":
+        base = report.written_bytes
+        size = min(FILE_SIZE, target - base)
+        if size <= 0:
+            state["phase"] = "verify"
+            break
+        name = f"{len(state['files']):05d}.bin"
+        t0 = time.perf_counter()
+        written = _write_file(os.path.join(test_dir, name), base, size, seed, on_write, cancel)
+        state["write_sec"] += time.perf_counter() - t0
+        if cancel is not None and cancel.is_set():
+            # 未写完的文件下次从头重写
+            done = report.written_bytes
+            _save_state(mount, state)
+            return report
+        state["files"].append([name, written])
+        report.written_bytes += written
+        if written < size:
+            # 空间提前耗尽：以实际写入量为准
+            state["phase"] = "verify"
+        _save_state(mount, state)
+
+    if wrote and pause_before_verify:
+        _save_state(mount, state)
+        report.needs_replug = True
+        return report
+
+    # ---------- 校验阶段 ----------
+    def on_read(n: int) -> None:
+        if on_progress:
+            on_progress("verify", report.verified_bytes, report.written_bytes)
+
+    base = sum(size for _, size in state["files"][:state["verified_files"]])
+    for name, size in state["files"][state["verified_files"]:]:
+        t0 = time.perf_counter()
+        snapshot = (report.verified_bytes, list(report.corrupted_ranges))
+        try:
+            finished = _verify_file(os.path.join(test_dir, name), base, size, seed, report, on_read, cancel)
+        except OSError:
+            # 读不出来的文件整段视为损坏
+            report.verified_bytes, report.corrupted_ranges = snapshot
+            report.verified_bytes += size
+            _merge_range(report.corrupted_ranges, base, base + size)
+            finished = True
+            if on_progress:
+                on_progress("verify", report.verified_bytes, report.written_bytes)
+        state["read_sec"] += time.perf_counter() - t0
+        if not finished:
+            report.verified_bytes, report.corrupted_ranges = snapshot
+            _save_state(mount, state)
+            return report
+        base += size
+        state["verified_files"] += 1
+        state["verified_bytes"] = report.verified_bytes
+        state["corrupted"] = [list(r) for r in report.corrupted_ranges]
+        _save_state(mount, state)
+
+    state["phase"] = "done"
+    _save_state(mount, state)
+
+    mib = 1024 * 1024
+    report.write_mbps = report.written_bytes / mib / state["write_sec"] if state["write_sec"] > 0 else 0.0
+    report.read_mbps = report.verified_bytes / mib / state["read_sec"] if state["read_sec"] > 0 else 0.0
+    report.completed = True
+    return report
@@ -0,0 +1,180 @@
+"""
+dashboard.py
+多盘看板：同时显示全部已插入可移动盘的容量、当前任务、实时吞吐和健康状态。
+
+每个盘一个 DriveState（__slots__），状态变化时才标记为脏；
+界面每帧只重绘脏行，刷新开销与变化数量成正比，而不是与盘数成正比。
+容量查询等耗时操作统一提交到共享线程池执行。
+"""
+from __future__ import annotations
+
+import threading
+import tkinter as tk
+from concurrent.futures import Executor
+from tkinter import ttk
+from typing import Callable, Iterable, Optional
+
+import usb_extensions
+
+
+class DriveState:
+    __slots__ = ("mount", "total_gb", "free_gb", "percent", "job", "job_percent",
+                 "throughput_bps", "health")
+
+    def __init__(self, mount: str):
+        self.mount = mount
+        self.total_gb = 0.0
+        self.free_gb = 0.0
+        self.percent = 0.0
+        self.job: Optional[str] = None
+        self.job_percent = 0.0
+        self.throughput_bps = 0.0
+        self.health = "未检测"
+
+    def row_values(self) -> tuple:
+        if self.total_gb:
+            capacity = f"{self.free_gb:.2f}G 闲 / {self.total_gb:.2f}G ({self.percent:.0f}%)"
+        else:
+            capacity = "--"
+        job = f"{self.job} {self.job_percent:.0f}%" if self.job else "空闲"
+        speed = f"{self.throughput_bps / (1024 * 1024):.1f} MB/s" if self.throughput_bps > 0 else ""
+        return self.mount, capacity, job, speed, self.health
+
+
+class DashboardModel:
+    """
+    线程安全的多盘状态表。所有 set_* 方法可在任意线程调用，值未变化时不产生脏标记。
+    """
+
+    def __init__(self, pool: Executor):
+        self.pool = pool
+        self._lock = threading.Lock()
+        self._states: dict[str, DriveState] = {}
+        self._dirty: set[str] = set()
+        self._removed: set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def get(self, mount: str) -> Optional[DriveState]:
+        return self._states.get(mount)
+
+    def sync_drives(self, mounts: Iterable[str]) -> None:
+        """与当前盘符列表对齐：只处理新增和移除的盘。"""
+        mounts = set(mounts)
+        with self._lock:
+            current = set(self._states)
+            added = mounts - current
+            for m in current - mounts:
+                del self._states[m]
+                self._dirty.discard(m)
+                self._removed.add(m)
+            for m in added:
+                self._states[m] = DriveState(m)
+                self._removed.discard(m)
+                self._dirty.add(m)
+        for m in added:
+            self.refresh_capacity(m)
+
+    def _update(self, mount: str, **fields) -> None:
+        with self._lock:
+            state = self._states.get(mount)
+            if state is None:
+                return
+            changed = False
+            for name, value in fields.items():
+                if getattr(state, name) != value:
+                    setattr(state, name, value)
+                    changed = True
+            if changed:
+                self._dirty.add(mount)
+
+    def refresh_capacity(self, mount: str) -> None:
+        """在共享线程池中查询容量，完成后更新状态。"""
+        def work():
+            info = usb_extensions.get_disk_space(mount)
+            self._update(mount, total_gb=info["total_gb"], free_gb=info["free_gb"], percent=info["percent"])
+        self.pool.submit(work)
+
+    def set_job(self, mount: str, job: Optional[str], percent: float = 0.0) -> None:
+        # 进度只保留整数百分比，避免每个数据块都触发重绘
+        self._update(mount, job=job, job_percent=float(int(percent)))
+
+    def set_throughput(self, mount: str, bps: float) -> None:
+        # 按 0.1 MB/s 取整，抖动不触发重绘
+        self._update(mount, throughput_bps=round(bps / (1024 * 1024), 1) * 1024 * 1024)
+
+    def set_health(self, mount: str, health: str) -> None:
+        self._update(mount, health=health)
+
+    def mark_all_dirty(self) -> None:
+        with self._lock:
+            self._dirty.update(self._states)
+
+    def take_changes(self) -> tuple[list[tuple], list[str]]:
+        """取出自上次调用以来变化的行 (values) 与被移除的盘。变化集合只有一份，同一时刻只应有一个窗口消费。"""
+        with self._lock:
+            rows = [self._states[m].row_values() for m in self._dirty if m in self._states]
+            removed = list(self._removed)
+            self._dirty.clear()
+            self._removed.clear()
+        return rows, removed
+
+
+class DashboardWindow(tk.Toplevel):
+    """看板窗口：每帧从模型取出变化并只更新对应行。双击某行回调 on_select(mount)。"""
+
+    FRAME_MS = 100
+
+    def __init__(self, master, model: DashboardModel, on_select: Optional[Callable[[str], None]] = None):
+        super().__init__(master)
+        self.title("多盘看板")
+        self.geometry("760x480")
+        self.model = model
+        self.on_select = on_select
+
+        cols = ("mount", "capacity", "job", "speed", "health")
+        self.tree = ttk.Treeview(self, columns=cols, show="headings")
+        for c, text, width in (("mount", "盘符", 80), ("capacity", "容量", 230), ("job", "当前任务", 150),
+                               ("speed", "吞吐", 100), ("health", "健康", 100)):
+            self.tree.heading(c, text=text)
+            self.tree.column(c, width=width, anchor="w")
+        scroll = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scroll.set)
+        scroll.pack(side="right", fill="y")
+        self.tree.pack(fill="both", expand=True)
+        self.tree.bind("<Double-1>", self._on_double_click)
+
+        self.status = ttk.Label(self, text="")
+        self.status.pack(fill="x")
+
+        # 首次打开时全部行都需要绘制
+        model.mark_all_dirty()
+        self._tick_id = None
+        self._tick()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+
+    def _tick(self):
+        rows, removed = self.model.take_changes()
+        for m in removed:
+            if self.tree.exists(m):
+                self.tree.delete(m)
+        for values in rows:
+            mount = values[0]
+            if self.tree.exists(mount):
+                self.tree.item(mount, values=values)
+            else:
+                self.tree.insert("", "end", iid=mount, values=values)
+        if rows or removed:
+            self.status.config(text=f"已连接 {len(self.model)} 个盘")
+        self._tick_id = self.after(self.FRAME_MS, self._tick)
+
+    def _on_double_click(self, event):
+        item = self.tree.identify_row(event.y)
+        if item and self.on_select:
+            self.on_select(item)
+
+    def _on_close(self):
+        if self._tick_id is not None:
+            self.after_cancel(self._tick_id)
+        self.destroy()
@@ -0,0 +1,233 @@
+"""
+diskstats.py
+块设备 I/O 统计采样（Linux）：定期读取 /proc/diskstats（或 /sys/class/block/<dev>/stat），
+计算 U 盘对应块设备的读/写速度、IOPS、队列中请求数和利用率。
+包括其他进程的读写和拷贝结束后内核的回写，这些是应用层拷贝循环看不到的。
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Callable, Iterable, Iterator, Optional
+
+PROC_DISKSTATS = "/proc/diskstats"
+PROC_MOUNTS = "/proc/mounts"
+SYS_CLASS_BLOCK = "/sys/class/block"
+
+SECTOR_BYTES = 512  # diskstats 中的扇区数固定按 512 字节计
+
+_OCTAL_ESCAPE = re.compile(rb"\\([0-7]{3})")
+
+
+def _unescape_mount_field(field: bytes) -> str:
+    """/proc/mounts 中空格、制表符、换行和反斜杠以 \\NNN 八进制转义，其余字节（如 UTF-8 中文）原样保留。"""
+    return _OCTAL_ESCAPE.sub(lambda m: bytes([int(m.group(1), 8)]), field).decode("utf-8", errors="surrogateescape")
+
+
+@dataclass(slots=True)
+class DiskStatsSample:
+    device: str
+    ts: float
+    read_mbps: float
+    write_mbps: float
+    read_iops: float
+    write_iops: float
+    in_flight: int
+    util_percent: float
+
+
+def iter_block_mounts(mounts_path: str = PROC_MOUNTS) -> Iterator[tuple[str, str]]:
+    """遍历块设备的挂载，产出 (块设备名, 挂载点)，如 ("sdb1", "/media/usb")。读取失败时不产出。"""
+    try:
+        # 按字节读取：先还原八进制转义再整体按 UTF-8 解码，非 ASCII 路径才不会被破坏
+        with open(mounts_path, "rb") as f:
+            lines = f.readlines()
+    except OSError:
+        return
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 2 or not parts[0].startswith(b"/dev/"):
+            continue
+        dev = os.path.basename(os.path.realpath(_unescape_mount_field(parts[0])))
+        yield dev, _unescape_mount_field(parts[1])
+
+
+def block_device_for_mount(mount: str, mounts_path: str = PROC_MOUNTS) -> Optional[str]:
+    """根据挂载点查找块设备名（如 "/media/usb" -> "sdb1"），找不到时返回 None。"""
+    target = os.path.realpath(mount).rstrip("/") or "/"
+    for dev, mnt in iter_block_mounts(mounts_path):
+        if (mnt.rstrip("/") or "/") == target:
+            return dev
+    return None
+
+
+def parent_disk(dev: str, sys_root: str = SYS_CLASS_BLOCK) -> str:
+    """分区名映射到所在整盘（sdb1 -> sdb），不是分区时原样返回。"""
+    path = os.path.join(sys_root, dev)
+    if os.path.exists(os.path.join(path, "partition")):
+        return os.path.basename(os.path.dirname(os.path.realpath(path)))
+    return dev
+
+
+def _parse_counters(fields: list[bytes]) -> tuple[int, int, int, int, int, int]:
+    """
+    从统计字段（不含 major/minor/name）中取出：
+    (读完成数, 读扇区数, 写完成数, 写扇区数, 队列中请求数, io_ticks 毫秒)
+    """
+    return (int(fields[0]), int(fields[2]), int(fields[4]), int(fields[6]),
+            int(fields[8]), int(fields[9]))
+
+
+def read_counters(devices: Iterable[str], proc_path: str = PROC_DISKSTATS,
+                  sys_root: Optional[str] = None) -> dict[str, tuple[int, int, int, int, int, int]]:
+    """
+    一次性读取多个设备的原始计数器。
+
+    默认整体读取 /proc/diskstats，按行只对关心的设备做完整解析；
+    sys_root 不为 None 时改为逐个读取 <sys_root>/<dev>/stat。
+    """
+    wanted = {d.encode(): d for d in devices}
+    result: dict[str, tuple[int, int, int, int, int, int]] = {}
+    if not wanted:
+        return result
+
+    if sys_root is not None:
+        for name in wanted.values():
+            try:
+                with open(os.path.join(sys_root, name, "stat"), "rb") as f:
+                    result[name] = _parse_counters(f.read().split())
+            except (OSError, ValueError, IndexError):
+                continue
+        return result
+
+    with open(proc_path, "rb") as f:
+        data = f.read()
+    for line in data.splitlines():
+        # 前三列为 major minor name，只切出前 4 段判断设备名，避免为无关设备分配完整列表
+        head = line.split(None, 3)
+        if len(head) < 4 or head[2] not in wanted:
+            continue
+        try:
+            result[wanted[head[2]]] = _parse_counters(head[3].split())
+        except (ValueError, IndexError):
+            continue
+    return result
+
+
+class DiskStatsSampler:
+    """
+    后台采样线程。devices 为 {标签: 块设备名}，标签通常是挂载点。
+    每 interval 秒计算一次差值，通过 on_sample(标签, DiskStatsSample) 发布，并保存在 history 中供导出。
+    proc_path / sys_root 可注入，便于测试。
+    """
+
+    def __init__(
+            self,
+            devices: Optional[dict[str, str]] = None,
+            interval: float = 1.0,
+            on_sample: Optional[Callable[[str, DiskStatsSample], None]] = None,
+            proc_path: str = PROC_DISKSTATS,
+            sys_root: Optional[str] = None,
+            history: int = 3600,
+    ):
+        self.interval = interval
+        self.on_sample = on_sample
+        self.proc_path = proc_path
+        self.sys_root = sys_root
+        self.history: deque[tuple[str, DiskStatsSample]] = deque(maxlen=history)
+        self.latest: dict[str, DiskStatsSample] = {}
+        self._devices: dict[str, str] = dict(devices or {})
+        self._prev: dict[str, tuple[float, tuple[int, int, int, int, int, int]]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def available(proc_path: str = PROC_DISKSTATS) -> bool:
+        return os.path.exists(proc_path)
+
+    def set_devices(self, devices: dict[str, str]) -> None:
+        with self._lock:
+            self._devices = dict(devices)
+            self._prev = {k: v for k, v in self._prev.items() if k in self._devices}
+            self.latest = {k: v for k, v in self.latest.items() if k in self._devices}
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="DiskStatsSampler", daemon=True)
+        self._thread.start()
+
+    def stop(self, join_timeout_sec: float = 2.0) -> None:
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=join_timeout_sec)
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sample_once()
+            except OSError:
+                pass
+            self._stop.wait(self.interval)
+
+    def sample_once(self) -> list[tuple[str, DiskStatsSample]]:
+        """读取一次计数器并与上次比较；第一次调用只建立基线，返回空列表。"""
+        with self._lock:
+            devices = dict(self._devices)
+        counters = read_counters(set(devices.values()), self.proc_path, self.sys_root)
+        now = time.monotonic()
+        wall = time.time()
+
+        out = []
+        for label, dev in devices.items():
+            cur = counters.get(dev)
+            if cur is None:
+                continue
+            prev = self._prev.get(label)
+            self._prev[label] = (now, cur)
+            if prev is None:
+                continue
+            dt = now - prev[0]
+            if dt <= 0:
+                continue
+            p = prev[1]
+            mb = SECTOR_BYTES / (1024 * 1024)
+            sample = DiskStatsSample(
+                device=dev,
+                ts=wall,
+                read_mbps=(cur[1] - p[1]) * mb / dt,
+                write_mbps=(cur[3] - p[3]) * mb / dt,
+                read_iops=(cur[0] - p[0]) / dt,
+                write_iops=(cur[2] - p[2]) / dt,
+                in_flight=cur[4],
+                util_percent=min((cur[5] - p[5]) / (dt * 1000) * 100, 100.0),
+            )
+            out.append((label, sample))
+
+        with self._lock:
+            for label, sample in out:
+                self.latest[label] = sample
+                self.history.append((label, sample))
+        if self.on_sample:
+            for label, sample in out:
+                self.on_sample(label, sample)
+        return out
+
+    def export_jsonl(self, path: str) -> int:
+        """把历史采样导出为 JSON Lines，返回条数。"""
+        with self._lock:
+            items = list(self.history)
+        with open(path, "w", encoding="utf-8") as f:
+            for label, sample in items:
+                row = asdict(sample)
+                row["mount"] = label
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        return len(items)
@@ -0,0 +1,191 @@
+"""
+duplicates.py
+U 盘重复文件查找：先按大小分组，再按文件头部哈希分组，最后才计算全文件哈希。
+哈希在进程池中计算，分块读取保证内存占用有界；结果缓存在卷索引（volume_index）中。
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+from volume_index import INDEX_FILENAME, HashCache
+
+PARTIAL_BYTES = 64 * 1024
+_READ_CHUNK = 1024 * 1024
+
+
+@dataclass
+class DuplicateGroup:
+    size: int
+    digest: str
+    paths: list[str]
+
+    @property
+    def wasted_bytes(self) -> int:
+        return self.size * (len(self.paths) - 1)
+
+
+def _hash_file(path: str, limit: Optional[int] = None) -> str:
+    """计算文件（或其前 limit 字节）的 BLAKE2b 哈希。在子进程中运行。"""
+    h = hashlib.blake2b(digest_size=20)
+    remaining = limit
+    with open(path, "rb") as f:
+        while remaining is None or remaining > 0:
+            n = _READ_CHUNK if remaining is None else min(_READ_CHUNK, remaining)
+            chunk = f.read(n)
+            if not chunk:
+                break
+            h.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return h.hexdigest()
+
+
+def _iter_files(root: str) -> Iterator[tuple[str, int, int]]:
+    """递归遍历，产出 (路径, 大小, mtime_ns)，跳过符号链接和索引文件本身。"""
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        try:
+            it = os.scandir(d)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False) and entry.name != INDEX_FILENAME:
+                        st = entry.stat(follow_symlinks=False)
+                        yield entry.path, st.st_size, st.st_mtime_ns
+                except OSError:
+                    continue
+
+
+def _hash_groups(
+        pool: ProcessPoolExecutor,
+        groups: list[list[tuple[str, int, int]]],
+        kind: str,
+        cache: Optional[HashCache],
+        max_in_flight: int,
+        cancel: Optional[threading.Event],
+        on_group_done: Callable[[list[tuple[str, int, int]], dict[str, str]], None],
+) -> None:
+    """
+    对每个候选组中的文件计算哈希。提交到进程池的任务数不超过 max_in_flight，
+    某组的全部文件哈希完成后立即回调 on_group_done(组, {路径: 哈希})。
+    """
+    limit = PARTIAL_BYTES if kind == "partial" else None
+    pending: dict = {}
+    results: list[dict[str, str]] = [{} for _ in groups]
+    remaining = [len(g) for g in groups]
+
+    def finish(gi: int, path: str, digest: str) -> None:
+        results[gi][path] = digest
+        remaining[gi] -= 1
+        if remaining[gi] == 0:
+            on_group_done(groups[gi], results[gi])
+
+    def drain(block_all: bool) -> None:
+        while pending and (block_all or len(pending) >= max_in_flight):
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                gi, path, size, mtime_ns = pending.pop(fut)
+                try:
+                    digest = fut.result()
+                except OSError:
+                    # 读取失败的文件不参与比较
+                    remaining[gi] -= 1
+                    if remaining[gi] == 0:
+                        on_group_done(groups[gi], results[gi])
+                    continue
+                if cache is not None:
+                    cache.put(path, size, mtime_ns, kind, digest)
+                finish(gi, path, digest)
+
+    for gi, group in enumerate(groups):
+        for path, size, mtime_ns in group:
+            if cancel is not None and cancel.is_set():
+                for fut in pending:
+                    fut.cancel()
+                return
+            cached = cache.get(path, size, mtime_ns, kind) if cache is not None else None
+            if cached is not None:
+                finish(gi, path, cached)
+                continue
+            drain(block_all=False)
+            pending[pool.submit(_hash_file, path, limit)] = (gi, path, size, mtime_ns)
+    drain(block_all=True)
+
+
+def _split_by_digest(group: list[tuple[str, int, int]], digests: dict[str, str]) -> list[list[tuple[str, int, int]]]:
+    buckets: dict[str, list[tuple[str, int, int]]] = {}
+    for item in group:
+        digest = digests.get(item[0])
+        if digest is not None:
+            buckets.setdefault(digest, []).append(item)
+    return [b for b in buckets.values() if len(b) > 1]
+
+
+def find_duplicates(
+        root: str,
+        on_group: Optional[Callable[[DuplicateGroup], None]] = None,
+        workers: Optional[int] = None,
+        use_cache: bool = True,
+        cancel: Optional[threading.Event] = None,
+) -> list[DuplicateGroup]:
+    """
+    查找 root 下内容完全相同的文件。
+
+    每确认一组重复文件就调用 on_group（在调用线程中），便于 GUI 边算边显示。
+    use_cache=True 时从卷根目录的索引文件读取/写回哈希缓存。
+    """
+    by_size: dict[int, list[tuple[str, int, int]]] = {}
+    for item in _iter_files(root):
+        if item[1] > 0:
+            by_size.setdefault(item[1], []).append(item)
+    size_groups = [g for g in by_size.values() if len(g) > 1]
+
+    cache = HashCache(root).load() if use_cache else None
+    found: list[DuplicateGroup] = []
+
+    def emit(group: list[tuple[str, int, int]], digests: dict[str, str]) -> None:
+        for bucket in _split_by_digest(group, digests):
+            dup = DuplicateGroup(size=bucket[0][1], digest=digests[bucket[0][0]],
+                                 paths=sorted(p for p, _, _ in bucket))
+            found.append(dup)
+            if on_group:
+                on_group(dup)
+
+    workers = workers or min(os.cpu_count() or 1, 4)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # 小文件的头部哈希就是全文件哈希，确认后直接输出
+            small = [g for g in size_groups if g[0][1] <= PARTIAL_BYTES]
+            large = [g for g in size_groups if g[0][1] > PARTIAL_BYTES]
+
+            candidates: list[list[tuple[str, int, int]]] = []
+            _hash_groups(pool, small, "full", cache, workers * 2, cancel, emit)
+            _hash_groups(pool, large, "partial", cache, workers * 2, cancel,
+                         lambda g, d: candidates.extend(_split_by_digest(g, d)))
+            _hash_groups(pool, candidates, "full", cache, workers * 2, cancel, emit)
+    finally:
+        if cache is not None:
+            cache.save()
+
+    return found
+
+
+def delete_duplicates(group: DuplicateGroup, keep: int = 0) -> list[str]:
+    """删除组内除第 keep 个以外的文件，返回被删除的路径。"""
+    removed = []
+    for i, path in enumerate(group.paths):
+        if i == keep:
+            continue
+        os.remove(path)
+        removed.append(path)
+    return removed
@@ -0,0 +1,249 @@
+"""
+eject.py
+回写感知的安全弹出（Linux）：
+1. 对挂载点调用 syncfs 触发回写，期间轮询 /proc/meminfo 的 Dirty/Writeback 与设备队列中请求数，报告刷写进度；
+2. 回写完成后卸载：默认经 udisks（udisksctl unmount），普通桌面用户无需 root；
+   udisksctl 不可用或以 root 运行而 udisks 失败时退回 umount <挂载点>；
+3. 最后给整块盘断电。
+每个阶段分别计时。卸载与断电命令可替换，便于用 loop 设备或替身命令测试。
+Windows 仍走 usb_extensions.safe_eject_drive。
+"""
+from __future__ import annotations
+
+import argparse
+import ctypes
+import ctypes.util
+import os
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional, Sequence
+
+from diskstats import PROC_DISKSTATS, PROC_MOUNTS, SYS_CLASS_BLOCK, block_device_for_mount, parent_disk, read_counters
+
+PROC_MEMINFO = "/proc/meminfo"
+
+# 以 "-b" 结尾的命令追加块设备路径 /dev/<dev>，否则追加挂载点
+DEFAULT_UMOUNT_CMD = ("udisksctl", "unmount", "-b")
+FALLBACK_UMOUNT_CMD = ("umount",)
+DEFAULT_POWER_OFF_CMD = ("udisksctl", "power-off", "-b")
+
+_libc = None
+
+
+def _syncfs(path: str) -> None:
+    """只回写 path 所在文件系统；libc 不提供 syncfs 时退回全局 sync。"""
+    global _libc
+    if _libc is None:
+        try:
+            _libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        except OSError:
+            _libc = False
+    func = getattr(_libc, "syncfs", None) if _libc else None
+    if func is None:
+        os.sync()
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        if func(fd) != 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+    finally:
+        os.close(fd)
+
+
+def read_dirty_bytes(meminfo_path: str = PROC_MEMINFO) -> int:
+    """返回系统中 Dirty + Writeback 的字节数（内核只提供全局值）。"""
+    total = 0
+    try:
+        with open(meminfo_path, "rb") as f:
+            for line in f:
+                if line.startswith(b"Dirty:") or line.startswith(b"Writeback:"):
+                    total += int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return total
+
+
+@dataclass
+class EjectReport:
+    mount: str
+    device: Optional[str] = None
+    initial_dirty_bytes: int = 0
+    flush_sec: float = 0.0
+    unmount_sec: float = 0.0
+    power_off_sec: float = 0.0
+    ok: bool = False
+    error: Optional[str] = None
+    phases: list[str] = field(default_factory=list)
+
+    def format(self) -> str:
+        lines = [f"弹出 {self.mount}" + (f" ({self.device})" if self.device else "") + (" 成功" if self.ok else " 失败")]
+        lines.append(f"  回写: {self.flush_sec:.2f}s（开始时脏页 {self.initial_dirty_bytes / (1024 * 1024):.1f} MB）")
+        if "unmount" in self.phases:
+            lines.append(f"  卸载: {self.unmount_sec:.2f}s")
+        if "power_off" in self.phases:
+            lines.append(f"  断电: {self.power_off_sec:.2f}s")
+        if self.error:
+            lines.append(f"  错误: {self.error}")
+        return "\n".join(lines)
+
+
+def _run_cmd(cmd: Sequence[str], arg: str) -> None:
+    p = subprocess.run([*cmd, arg], capture_output=True, text=True, encoding="utf-8", errors="replace")
+    if p.returncode != 0:
+        raise RuntimeError((p.stderr or p.stdout).strip() or f"{cmd[0]} 退出码 {p.returncode}")
+
+
+def _is_root() -> bool:
+    return hasattr(os, "geteuid") and os.geteuid() == 0
+
+
+def _unmount(report: EjectReport, umount_cmd: Sequence[str], fallback_cmd: Optional[Sequence[str]]) -> None:
+    """
+    卸载挂载点。umount_cmd 以 "-b" 结尾时作用于块设备（找不到块设备则直接用 fallback_cmd）。
+    命令不存在，或以 root 运行而命令失败（如没有 udisks 守护进程）时，改用 fallback_cmd 卸载挂载点。
+    """
+    by_device = umount_cmd[-1] == "-b"
+    if by_device and report.device is None:
+        if not fallback_cmd:
+            raise RuntimeError("找不到挂载点对应的块设备")
+        _run_cmd(fallback_cmd, report.mount)
+        return
+    try:
+        _run_cmd(umount_cmd, "/dev/" + report.device if by_device else report.mount)
+    except OSError:
+        if not fallback_cmd:
+            raise
+        _run_cmd(fallback_cmd, report.mount)
+    except RuntimeError:
+        if not fallback_cmd or not _is_root():
+            raise
+        _run_cmd(fallback_cmd, report.mount)
+
+
+def eject_mount(
+        mount: str,
+        on_progress: Optional[Callable[[str, float], None]] = None,
+        umount_cmd: Optional[Sequence[str]] = DEFAULT_UMOUNT_CMD,
+        fallback_umount_cmd: Optional[Sequence[str]] = FALLBACK_UMOUNT_CMD,
+        power_off_cmd: Optional[Sequence[str]] = DEFAULT_POWER_OFF_CMD,
+        poll_interval: float = 0.1,
+        flush_timeout: float = 600.0,
+        meminfo_path: str = PROC_MEMINFO,
+        diskstats_path: str = PROC_DISKSTATS,
+        mounts_path: str = PROC_MOUNTS,
+        sys_root: str = SYS_CLASS_BLOCK,
+) -> EjectReport:
+    """
+    依次执行 回写 -> 卸载 -> 断电，返回各阶段耗时。
+
+    on_progress(phase, fraction)：phase 为 "flush" / "unmount" / "power_off"，
+    fraction 为 0~1（flush 阶段按脏页减少的比例估算）。
+    umount_cmd / power_off_cmd 为 None 时跳过对应阶段。umount_cmd 以 "-b" 结尾时追加 /dev/<分区>，
+    否则追加挂载点，失败时的回退见 _unmount；power_off_cmd 追加 /dev/<整盘>。
+    """
+    report = EjectReport(mount=mount, device=block_device_for_mount(mount, mounts_path))
+    progress = on_progress or (lambda phase, fraction: None)
+
+    # ---- 回写 ----
+    report.phases.append("flush")
+    t0 = time.perf_counter()
+    initial = report.initial_dirty_bytes = read_dirty_bytes(meminfo_path)
+    errors: list[BaseException] = []
+
+    def flush():
+        try:
+            _syncfs(mount)
+        except BaseException as e:
+            errors.append(e)
+
+    th = threading.Thread(target=flush, name="syncfs", daemon=True)
+    th.start()
+    done = 0.0
+    progress("flush", 0.0)
+    while th.is_alive():
+        th.join(poll_interval)
+        if time.perf_counter() - t0 > flush_timeout:
+            report.error = "回写超时"
+            report.flush_sec = time.perf_counter() - t0
+            return report
+        remaining = read_dirty_bytes(meminfo_path)
+        if initial > 0:
+            # 全局计数可能因其他进程写入而回升，进度只增不减
+            done = max(done, min(1.0 - remaining / initial, 0.99))
+            progress("flush", done)
+    # syncfs 返回后再等设备队列排空，确保数据已到达设备
+    if report.device:
+        while time.perf_counter() - t0 <= flush_timeout:
+            try:
+                c = read_counters([report.device], diskstats_path).get(report.device)
+            except OSError:
+                c = None
+            if c is None or c[4] == 0:
+                break
+            time.sleep(poll_interval)
+    report.flush_sec = time.perf_counter() - t0
+    progress("flush", 1.0)
+    if errors:
+        report.error = f"回写失败: {errors[0]}"
+        return report
+
+    # ---- 卸载 ----
+    if umount_cmd:
+        report.phases.append("unmount")
+        progress("unmount", 0.0)
+        t0 = time.perf_counter()
+        try:
+            _unmount(report, umount_cmd, fallback_umount_cmd)
+        except (OSError, RuntimeError) as e:
+            report.unmount_sec = time.perf_counter() - t0
+            report.error = f"卸载失败: {e}"
+            return report
+        report.unmount_sec = time.perf_counter() - t0
+        progress("unmount", 1.0)
+
+    # ---- 断电 ----
+    if power_off_cmd and report.device:
+        report.phases.append("power_off")
+        progress("power_off", 0.0)
+        t0 = time.perf_counter()
+        try:
+            _run_cmd(power_off_cmd, "/dev/" + parent_disk(report.device, sys_root))
+        except (OSError, RuntimeError) as e:
+            report.power_off_sec = time.perf_counter() - t0
+            # 已卸载，数据安全；断电失败只作提示
+            report.ok = True
+            report.error = f"断电失败（已安全卸载，可直接拔出）: {e}"
+            return report
+        report.power_off_sec = time.perf_counter() - t0
+        progress("power_off", 1.0)
+
+    report.ok = True
+    return report
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="回写感知的安全弹出")
+    parser.add_argument("mount")
+    parser.add_argument("--umount-cmd", default="udisksctl unmount -b",
+                        help="卸载命令，以 -b 结尾时作用于块设备；空字符串表示跳过")
+    parser.add_argument("--fallback-umount-cmd", default="umount",
+                        help="卸载命令不存在或以 root 运行而失败时改用的命令，空字符串表示不回退")
+    parser.add_argument("--power-off-cmd", default="udisksctl power-off -b", help="断电命令，空字符串表示跳过")
+    args = parser.parse_args(argv)
+
+    def show(phase, fraction):
+        print(f"\r{phase:<10} {fraction * 100:5.1f}%", end="", flush=True)
+
+    report = eject_mount(args.mount, on_progress=show,
+                         umount_cmd=args.umount_cmd.split() or None,
+                         fallback_umount_cmd=args.fallback_umount_cmd.split() or None,
+                         power_off_cmd=args.power_off_cmd.split() or None)
+    print()
+    print(report.format())
+
+
+if __name__ == "__main__":
+    main()
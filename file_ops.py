@@ -1,11 +1,19 @@
 from __future__ import annotations
 
+import errno
+import functools
+import mmap
 import os
 import shutil
 import time
 import stat
+import sys
+import tarfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from typing import Callable, Optional
+from typing import Callable, Iterable, Iterator, Optional
 from datetime import datetime
 
 
@@ -26,10 +34,39 @@ def delete_path(usb_root: str, relative_path: str) -> str:
     return target
 
 
+# I/O 钩子 hook(op, path, nbytes)，op 为 "read" / "write" / "list"。
+# 模拟后端（simulation.py）借此对读写限速、注入延迟与错误；为 None 时不产生额外开销。
+# 复制、打包/解包、同步以及 capacity_test、surface_scan 的读写循环都会调用它。
+_io_hook: Optional[Callable[[str, str, int], None]] = None
+
+
+def set_io_hook(hook: Optional[Callable[[str, str, int], None]]) -> Optional[Callable[[str, str, int], None]]:
+    """设置 I/O 钩子，返回原来的钩子以便恢复。"""
+    global _io_hook
+    old, _io_hook = _io_hook, hook
+    return old
+
+
+def get_io_hook() -> Optional[Callable[[str, str, int], None]]:
+    """当前的 I/O 钩子；其他模块的读写循环在开始时取一次。"""
+    return _io_hook
+
+
+class OperationCancelled(Exception):
+    """长时间的复制/打包/同步任务被 cancel 事件中止。"""
+
+
+def _check_cancel(cancel: Optional[threading.Event]) -> None:
+    if cancel is not None and cancel.is_set():
+        raise OperationCancelled("操作已取消")
+
+
 def list_files(drive_path: str, show_hidden: bool = True) -> list[dict]:
     """
     列出指定驱动器路径下的所有文件和目录。
     """
+    if _io_hook:
+        _io_hook("list", drive_path, 0)
     files = []
     try:
         # 使用 scandir 获取更详细的文件信息
@@ -78,6 +115,132 @@ class CopyProgress:
     bytes_copied: int
     total_bytes: int
     speed_bps: float
+    phase: str = "copy"  # "copy" | "flush"（数据已全部写出，正在等待落盘）
+
+
+_fallocate = None
+_FALLOC_FL_KEEP_SIZE = 0x01
+
+
+def _linux_fallocate(fd: int, size: int) -> bool:
+    """
+    直接调用 fallocate(2)。不能用 os.posix_fallocate：文件系统不支持时 glibc 会逐块写零来“模拟”，
+    在 exFAT 等 U 盘上等于先把整个文件多写一遍。
+    使用 FALLOC_FL_KEEP_SIZE 只预留簇、不改变文件长度：vfat 上 mode 0 会走 fat_cont_expand 把整个文件写零。
+    返回 False 表示文件系统不支持。
+    """
+    global _fallocate
+    if _fallocate is None:
+        import ctypes
+        import ctypes.util
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+            _fallocate = libc.fallocate64 if hasattr(libc, "fallocate64") else libc.fallocate
+            _fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+        except (OSError, AttributeError):
+            _fallocate = False
+    if not _fallocate:
+        return False
+    import ctypes
+    if _fallocate(fd, _FALLOC_FL_KEEP_SIZE, 0, size) == 0:
+        return True
+    err = ctypes.get_errno()
+    if err in (errno.EOPNOTSUPP, errno.ENOSYS, errno.EINVAL):
+        return False
+    raise OSError(err, os.strerror(err))
+
+
+def _preallocate(fd: int, size: int) -> None:
+    """
+    预分配目标文件空间：Linux 上用 fallocate(2) 预留簇（尽早暴露空间不足），其他平台或文件系统不支持时不做处理。
+    不能退回 ftruncate 扩展长度：vfat 与旧版 exfat 驱动扩展文件时同样会写零，数据等于写两遍。
+    """
+    if size <= 0:
+        return
+    if sys.platform.startswith("linux"):
+        _linux_fallocate(fd, size)
+
+
+def _iter_data_segments(fd: int, total: int):
+    """
+    利用 SEEK_DATA / SEEK_HOLE 遍历源文件中的数据段，产出 (offset, length)。
+    平台或文件系统不支持时，视整个文件为一个数据段。
+    """
+    if not (hasattr(os, "SEEK_DATA") and hasattr(os, "SEEK_HOLE")):
+        yield 0, total
+        return
+
+    pos = 0
+    while pos < total:
+        try:
+            start = os.lseek(fd, pos, os.SEEK_DATA)
+        except OSError as e:
+            if e.errno == errno.ENXIO:
+                # pos 之后全部是空洞
+                return
+            # 不支持稀疏查询，退回整段复制
+            yield pos, total - pos
+            return
+        end = os.lseek(fd, start, os.SEEK_HOLE)
+        yield start, min(end, total) - start
+        pos = end
+
+
+# 落盘策略：
+#   none     - 不主动刷写，速度为页缓存写入速度（数据可能仍在内存中）
+#   periodic - 每写入 flush_every 字节执行一次 fdatasync，速度/剩余时间贴近设备真实写入速度
+#   end      - 复制完成后 fsync 一次，结束前会有一段“刷写”阶段
+#   sync     - 以 O_SYNC 打开目标文件，每次写入都同步落盘
+#   direct   - 以 O_DIRECT 绕过页缓存直接写设备，结束时再 fsync 一次（不支持的平台退回 sync/end）
+FLUSH_POLICIES = ("none", "periodic", "end", "sync", "direct")
+_DIRECT_ALIGN = 4096
+
+
+def _fdatasync(fd: int) -> None:
+    if hasattr(os, "fdatasync"):
+        os.fdatasync(fd)
+    else:
+        os.fsync(fd)
+
+
+# 预读窗口：read_ahead=True 时在读到窗口一半处提示内核预读下一段
+_READ_AHEAD_WINDOW = 16 * 1024 * 1024
+
+
+def _fadvise(fd: int, offset: int, length: int, advice_name: str) -> None:
+    # Windows 等不支持 posix_fadvise 的平台直接忽略
+    advice = getattr(os, advice_name, None)
+    if advice is None or not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except OSError:
+        pass
+
+
+def _open_dst(dst_file: str, policy: str) -> tuple[int, str]:
+    """按落盘策略打开目标文件，返回 (fd, 实际生效的策略)。"""
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+    if policy == "direct":
+        if hasattr(os, "O_DIRECT"):
+            try:
+                return os.open(dst_file, flags | os.O_DIRECT, 0o666), "direct"
+            except OSError:
+                # 部分文件系统（如 tmpfs）不支持 O_DIRECT
+                pass
+        policy = "sync"
+    if policy == "sync":
+        sync_flag = getattr(os, "O_DSYNC", 0) or getattr(os, "O_SYNC", 0)
+        if sync_flag:
+            return os.open(dst_file, flags | sync_flag, 0o666), "sync"
+        policy = "end"
+    return os.open(dst_file, flags, 0o666), policy
+
+
+def _clear_direct(fd: int) -> None:
+    """O_DIRECT 只能写对齐长度，写最后不足对齐的尾块前先去掉该标志。"""
+    import fcntl
+    fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) & ~os.O_DIRECT)
 
 
 def copy_with_progress(
@@ -85,22 +248,748 @@ def copy_with_progress(
         dst_file: str,
         chunk_size: int = 1024 * 1024,
         on_progress: Optional[Callable[[CopyProgress], None]] = None,
+        preallocate: bool = False,
+        sparse: bool = False,
+        flush_policy: str = "none",
+        flush_every: int = 32 * 1024 * 1024,
+        read_ahead: bool = False,
+        cancel: Optional[threading.Event] = None,
 ) -> None:
+    """
+    分块复制文件并通过 on_progress 回调报告进度。
+
+    preallocate=True：写入前按源文件大小预分配目标空间（减少 FAT 簇链碎片，空间不足时立即失败）。
+    sparse=True：用 SEEK_DATA/SEEK_HOLE 跳过源文件空洞，目标端对应位置保持为空洞；
+                 进度仍按逻辑大小（含空洞）计算。与 preallocate 同时使用时空洞会被实际分配。
+    flush_policy：落盘策略，见 FLUSH_POLICIES。速度按包含刷写耗时的总时间计算，
+                  最后一次进度回调（及函数返回）发生在数据按策略落盘之后；
+                  刷写期间会回调 phase="flush" 的进度。
+    read_ahead=True：对源文件提示顺序读取（POSIX_FADV_SEQUENTIAL），并按窗口提前 WILLNEED，
+                     让内核在本线程写目标文件时继续从 U 盘读后续数据。
+    cancel 被置位时在下一块之前抛出 OperationCancelled，并删除半截的目标文件。
+    """
+    if flush_policy not in FLUSH_POLICIES:
+        raise ValueError(f"未知的落盘策略：{flush_policy}")
+
     total = os.path.getsize(src_file)
     copied = 0
     t0 = time.time()
+    hook = _io_hook
+
+    def report(phase: str = "copy") -> None:
+        if on_progress:
+            dt = max(time.time() - t0, 1e-6)
+            on_progress(CopyProgress(bytes_copied=copied, total_bytes=total, speed_bps=copied / dt, phase=phase))
 
     os.makedirs(os.path.dirname(dst_file) or ".", exist_ok=True)
 
-    with open(src_file, "rb") as fsrc, open(dst_file, "wb") as fdst:
-        while True:
-            chunk = fsrc.read(chunk_size)
-            if not chunk:
-                break
-            fdst.write(chunk)
-            copied += len(chunk)
+    fd, policy = _open_dst(dst_file, flush_policy)
+    direct = policy == "direct"
+    if direct:
+        chunk_size = max(_DIRECT_ALIGN, chunk_size // _DIRECT_ALIGN * _DIRECT_ALIGN)
+    # mmap 缓冲区按页对齐，满足 O_DIRECT 的要求；普通模式下也避免每块重新分配
+    buf = mmap.mmap(-1, chunk_size)
+    view = memoryview(buf)
+    ok = False
+    try:
+        with open(src_file, "rb", buffering=0) as fsrc:
+            if preallocate:
+                _preallocate(fd, total)
+            src_fd = fsrc.fileno()
+            advised_to = 0
+            if read_ahead:
+                _fadvise(src_fd, 0, 0, "POSIX_FADV_SEQUENTIAL")
+
+            if sparse:
+                segments = _iter_data_segments(fsrc.fileno(), total)
+            else:
+                segments = iter([(0, total)])
+
+            unflushed = 0
+            pos = 0
+            for seg_start, seg_len in segments:
+                # 空洞部分不读不写，直接计入进度
+                copied = seg_start
+                fsrc.seek(seg_start)
+                os.lseek(fd, seg_start, os.SEEK_SET)
+                pos = seg_start
+                remaining = seg_len
+                while remaining > 0:
+                    _check_cancel(cancel)
+                    if read_ahead and pos + _READ_AHEAD_WINDOW // 2 >= advised_to:
+                        start = max(pos, advised_to)
+                        advised_to = min(pos + _READ_AHEAD_WINDOW, total)
+                        _fadvise(src_fd, start, advised_to - start, "POSIX_FADV_WILLNEED")
+                    n = fsrc.readinto(view[:min(chunk_size, remaining)])
+                    if not n:
+                        break
+                    if hook:
+                        hook("read", src_file, n)
+                    if direct and (n % _DIRECT_ALIGN or pos % _DIRECT_ALIGN):
+                        _clear_direct(fd)
+                        direct = False
+                    written = 0
+                    while written < n:
+                        written += os.write(fd, view[written:n])
+                    if hook:
+                        hook("write", dst_file, n)
+                    pos += n
+                    copied += n
+                    remaining -= n
 
+                    unflushed += n
+                    if policy == "periodic" and unflushed >= flush_every:
+                        _fdatasync(fd)
+                        unflushed = 0
+                    report()
+
+            # 结尾为空洞（或源文件为空洞结尾）时，需要把目标文件补到逻辑长度
+            if pos != total:
+                os.ftruncate(fd, total)
+
+            copied = total
+            # direct：不对齐的尾块经页缓存写入，且 O_DIRECT 不保证元数据与设备缓存落盘，结尾总要 fsync
+            if policy in ("periodic", "end", "direct") or (policy == "sync" and pos != total):
+                report("flush")
+                os.fsync(fd)
+            ok = True
+            report()
+    finally:
+        view.release()
+        buf.close()
+        os.close(fd)
+        if not ok:
+            # 复制中途失败：不留下半截（且可能已按全长预留空间）的目标文件
+            try:
+                os.remove(dst_file)
+            except OSError:
+                pass
+
+
+def benchmark_flush_policies(src_file: str, dst_dir: str, policies: Iterable[str] = FLUSH_POLICIES) -> list[dict]:
+    """
+    用同一源文件依次测试各落盘策略，返回每种策略的总耗时与平均速度，
+    以及“看起来完成”（最后一次 copy 阶段回调）的时刻，用于对比页缓存速度与真实落盘速度。
+    """
+    results = []
+    total = os.path.getsize(src_file)
+    for policy in policies:
+        dst = os.path.join(dst_dir, f".flush_bench_{policy}.bin")
+        last_copy_at = 0.0
+        t0 = time.time()
+
+        def on_p(p: CopyProgress) -> None:
+            nonlocal last_copy_at
+            if p.phase == "copy":
+                last_copy_at = time.time() - t0
+
+        try:
+            copy_with_progress(src_file, dst, flush_policy=policy, on_progress=on_p)
+            elapsed = time.time() - t0
+        finally:
+            if os.path.exists(dst):
+                os.remove(dst)
+        results.append({
+            "policy": policy,
+            "seconds": round(elapsed, 3),
+            "mbps": round(total / (1024 * 1024) / max(elapsed, 1e-6), 2),
+            "copy_phase_seconds": round(last_copy_at, 3),
+        })
+    return results
+
+
+class _CountingReader:
+    """包装源文件对象，在被 tarfile/zipfile 读取时累计字节数并回调进度；cancel 置位时中止读取。"""
+
+    def __init__(self, fobj, on_read: Callable[[int], None], cancel: Optional[threading.Event] = None):
+        self._f = fobj
+        self._on_read = on_read
+        self._cancel = cancel
+
+    def read(self, size: int = -1) -> bytes:
+        _check_cancel(self._cancel)
+        data = self._f.read(size)
+        if data:
+            self._on_read(len(data))
+        return data
+
+
+def _iter_pack_entries(paths: Iterable[str]) -> Iterator[tuple[str, str]]:
+    """
+    把待打包的文件/目录展开为 (源路径, 包内路径)，目录递归展开。
+    包内路径以所选项的文件名为根，统一使用 "/" 分隔。
+    """
+    for path in paths:
+        path = os.path.abspath(path)
+        base = os.path.dirname(path)
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    full = os.path.join(dirpath, name)
+                    yield full, os.path.relpath(full, base).replace(os.sep, "/")
+        else:
+            yield path, os.path.basename(path)
+
+
+def pack_files(
+        paths: Iterable[str],
+        archive_path: str,
+        fmt: str = "tar",
+        chunk_size: int = 1024 * 1024,
+        on_progress: Optional[Callable[[CopyProgress], None]] = None,
+        cancel: Optional[threading.Event] = None,
+) -> int:
+    """
+    打包模式：把大量小文件顺序写入 U 盘上的单个 tar/zip 容器。
+
+    FAT 盘上逐个创建小文件时，开销主要在目录项和 FAT 表更新；
+    打包后只创建一个文件，数据按顺序流式写入，不产生临时文件。
+    fmt="tar" 或 "zip"（zip 使用 STORED，不压缩）。返回打包的文件数。
+    cancel 被置位时抛出 OperationCancelled；中途失败不保留半截的容器文件。
+    """
+    if fmt not in ("tar", "zip"):
+        raise ValueError(f"不支持的打包格式：{fmt}")
+
+    entries = list(_iter_pack_entries(paths))
+    total = sum(os.path.getsize(src) for src, _ in entries)
+    copied = 0
+    t0 = time.time()
+    hook = _io_hook
+
+    def on_read(src: str, n: int) -> None:
+        nonlocal copied
+        copied += n
+        if hook:
+            # 容器经缓冲顺序写出，按读入量近似计为同样大小的写入
+            hook("read", src, n)
+            hook("write", archive_path, n)
+        if on_progress:
             dt = max(time.time() - t0, 1e-6)
-            speed = copied / dt
+            on_progress(CopyProgress(bytes_copied=copied, total_bytes=total, speed_bps=copied / dt))
+
+    os.makedirs(os.path.dirname(archive_path) or ".", exist_ok=True)
+
+    try:
+        if fmt == "tar":
+            # "w|" 为流式写入模式：只顺序写，不回退修改。
+            # tarfile 的流缓冲区是不断拼接的 bytes，bufsize 过大时每次小写入都要复制整个缓冲区，
+            # 因此保持默认记录大小，批量写盘交给 chunk_size 大小的文件缓冲
+            with open(archive_path, "wb", buffering=chunk_size) as fdst, \
+                    tarfile.open(fileobj=fdst, mode="w|") as tar:
+                for src, arcname in entries:
+                    _check_cancel(cancel)
+                    info = tar.gettarinfo(src, arcname=arcname)
+                    with open(src, "rb") as fsrc:
+                        tar.addfile(info, _CountingReader(fsrc, functools.partial(on_read, src), cancel))
+        else:
+            with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_STORED) as zf:
+                for src, arcname in entries:
+                    _check_cancel(cancel)
+                    zinfo = zipfile.ZipInfo.from_file(src, arcname=arcname)
+                    with open(src, "rb") as fsrc, zf.open(zinfo, "w") as fdst:
+                        reader = _CountingReader(fsrc, functools.partial(on_read, src), cancel)
+                        while True:
+                            chunk = reader.read(chunk_size)
+                            if not chunk:
+                                break
+                            fdst.write(chunk)
+    except BaseException:
+        try:
+            os.remove(archive_path)
+        except OSError:
+            pass
+        raise
+
+    return len(entries)
+
+
+def _safe_join(root: str, member_name: str) -> str:
+    """把包内路径拼到解包目录下，拒绝绝对路径与 "../" 越界。"""
+    target = os.path.abspath(os.path.join(root, member_name))
+    if os.path.commonpath([os.path.abspath(root), target]) != os.path.abspath(root):
+        raise ValueError(f"非法的包内路径：{member_name}")
+    return target
+
+
+def _iter_archive_members(archive_path: str) -> Iterator[tuple[str, int, float, object]]:
+    """
+    流式遍历 tar/zip 容器中的普通文件，产出 (包内路径, 大小, mtime, 可读文件对象)。
+    文件对象只在下一次迭代前有效。
+    """
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as zf:
+            for zinfo in zf.infolist():
+                if zinfo.is_dir():
+                    continue
+                mtime = time.mktime(zinfo.date_time + (0, 0, -1))
+                with zf.open(zinfo) as fsrc:
+                    yield zinfo.filename, zinfo.file_size, mtime, fsrc
+    else:
+        with tarfile.open(archive_path, mode="r|*") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                fsrc = tar.extractfile(member)
+                yield member.name, member.size, member.mtime, fsrc
+
+
+def unpack_stream(
+        archive_path: str,
+        dst_dir: str,
+        chunk_size: int = 1024 * 1024,
+        on_progress: Optional[Callable[[CopyProgress], None]] = None,
+        cancel: Optional[threading.Event] = None,
+) -> int:
+    """
+    与 pack_files 配套的流式解包：从 U 盘上的 tar/zip 容器导出到电脑目录。
+    顺序读取容器，不先整体解压到临时目录。进度按容器文件大小计算。返回解出的文件数。
+    cancel 被置位时抛出 OperationCancelled，已解出的完整文件保留，正在写的文件删除。
+    """
+    total = os.path.getsize(archive_path)
+    copied = 0
+    count = 0
+    t0 = time.time()
+    hook = _io_hook
+
+    for name, _size, mtime, fsrc in _iter_archive_members(archive_path):
+        target = _safe_join(dst_dir, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            with open(target, "wb") as fdst:
+                while True:
+                    _check_cancel(cancel)
+                    chunk = fsrc.read(chunk_size)
+                    if not chunk:
+                        break
+                    if hook:
+                        hook("read", archive_path, len(chunk))
+                    fdst.write(chunk)
+                    if hook:
+                        hook("write", target, len(chunk))
+                    copied = min(copied + len(chunk), total)
+                    if on_progress:
+                        dt = max(time.time() - t0, 1e-6)
+                        on_progress(CopyProgress(bytes_copied=copied, total_bytes=total, speed_bps=copied / dt))
+        except OperationCancelled:
+            os.remove(target)
+            raise
+        os.utime(target, (mtime, mtime))
+        count += 1
+
+    if on_progress:
+        dt = max(time.time() - t0, 1e-6)
+        on_progress(CopyProgress(bytes_copied=total, total_bytes=total, speed_bps=total / dt))
+    return count
+
+
+def export_files(
+        paths: Iterable[str],
+        dst_dir: str,
+        concurrency: int = 1,
+        chunk_size: int = 1024 * 1024,
+        on_progress: Optional[Callable[[CopyProgress], None]] = None,
+        read_ahead: bool = True,
+        cancel: Optional[threading.Event] = None,
+) -> int:
+    """
+    批量导出：把 U 盘上选中的文件/目录（目录递归）复制到 dst_dir，保持相对结构。
+    concurrency 为同时读取的文件数：BOT（usb-storage）设备一次只能处理一个命令，应为 1；
+    UAS 设备支持多个未完成请求，适当并行可提高吞吐（见 usb_transport.recommended_concurrency）。
+    on_progress 汇报所有文件合计的进度，可能在多个工作线程中调用。返回导出的文件数。
+    cancel 被置位时各线程在下一块之前停止，抛出 OperationCancelled。
+    """
+    paths = [os.path.abspath(p) for p in paths]
+    # 先建出全部目录：_iter_pack_entries 只列文件，空目录否则会丢失
+    for path in paths:
+        if os.path.isdir(path):
+            base = os.path.dirname(path)
+            for dirpath, _dirnames, _filenames in os.walk(path):
+                os.makedirs(os.path.join(dst_dir, os.path.relpath(dirpath, base)), exist_ok=True)
+    entries = list(_iter_pack_entries(paths))
+    total = sum(os.path.getsize(src) for src, _ in entries)
+    lock = threading.Lock()
+    done_files: dict[str, int] = {}
+    copied = 0
+    t0 = time.time()
+
+    def copy_one(src: str, rel: str) -> None:
+        def on_p(p: CopyProgress) -> None:
+            nonlocal copied
+            with lock:
+                copied += p.bytes_copied - done_files.get(src, 0)
+                done_files[src] = p.bytes_copied
+                snapshot = copied
             if on_progress:
-                on_progress(CopyProgress(bytes_copied=copied, total_bytes=total, speed_bps=speed))
\ No newline at end of file
+                dt = max(time.time() - t0, 1e-6)
+                on_progress(CopyProgress(bytes_copied=snapshot, total_bytes=total, speed_bps=snapshot / dt))
+
+        dst = os.path.join(dst_dir, *rel.split("/"))
+        copy_with_progress(src, dst, chunk_size=chunk_size, on_progress=on_p, read_ahead=read_ahead, cancel=cancel)
+        st = os.stat(src)
+        os.utime(dst, (st.st_atime, st.st_mtime))
+
+    # 大文件优先，减少最后只剩一个大文件单线程拖尾的情况
+    entries.sort(key=lambda e: os.path.getsize(e[0]), reverse=True)
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = [pool.submit(copy_one, src, rel) for src, rel in entries]
+        try:
+            for fut in as_completed(futures):
+                fut.result()
+        except BaseException:
+            for f in futures:
+                f.cancel()
+            raise
+
+    if on_progress:
+        dt = max(time.time() - t0, 1e-6)
+        on_progress(CopyProgress(bytes_copied=total, total_bytes=total, speed_bps=total / dt))
+    return len(entries)
+
+
+def _drop_cache(paths: Iterable[str]) -> None:
+    """尽量把源文件从页缓存中逐出，使重复测试读到的是设备而不是内存。"""
+    for src, _ in _iter_pack_entries(paths):
+        try:
+            fd = os.open(src, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            _fadvise(fd, 0, 0, "POSIX_FADV_DONTNEED")
+        finally:
+            os.close(fd)
+
+
+def benchmark_export_concurrency(
+        paths: Iterable[str],
+        dst_dir: str,
+        levels: Iterable[int] = (1, 2, 4, 8),
+        read_ahead: bool = True,
+) -> list[dict]:
+    """
+    用同一批源文件依次以不同并发度执行 export_files，返回每档的耗时与吞吐。
+    每次测试前尝试逐出源文件的页缓存，测试产生的文件随即删除。
+    """
+    paths = list(paths)
+    total = sum(os.path.getsize(src) for src, _ in _iter_pack_entries(paths))
+    results = []
+    for level in levels:
+        out = os.path.join(dst_dir, f".export_bench_{level}")
+        _drop_cache(paths)
+        t0 = time.time()
+        try:
+            files = export_files(paths, out, concurrency=level, read_ahead=read_ahead)
+            elapsed = time.time() - t0
+        finally:
+            shutil.rmtree(out, ignore_errors=True)
+        results.append({
+            "concurrency": level,
+            "files": files,
+            "seconds": round(elapsed, 3),
+            "mbps": round(total / (1024 * 1024) / max(elapsed, 1e-6), 2),
+        })
+    return results
+
+
+@dataclass
+class SyncAction:
+    action: str  # "mkdir" | "copy" | "patch" | "delete"
+    rel_path: str
+    size: int = 0
+
+
+@dataclass
+class SyncResult:
+    actions: list[SyncAction]
+    total_bytes: int  # 源目录全部文件大小，即“全量复制”需要写入的字节数
+    bytes_written: int
+    dry_run: bool
+
+    @property
+    def bytes_avoided(self) -> int:
+        return max(self.total_bytes - self.bytes_written, 0)
+
+
+# FAT 的 mtime 精度为 2 秒，比较时留出余量
+_MTIME_TOLERANCE_SEC = 2.0
+
+
+def _scan_tree(root: str) -> dict[str, tuple[int, float, bool]]:
+    """递归扫描目录，返回 {相对路径: (大小, mtime, 是否目录)}，相对路径统一用 "/" 分隔。"""
+    result: dict[str, tuple[int, float, bool]] = {}
+    hook = _io_hook
+    stack = [("", root)]
+    while stack:
+        rel_dir, abs_dir = stack.pop()
+        if hook:
+            hook("list", abs_dir, 0)
+        try:
+            it = os.scandir(abs_dir)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                result[rel] = (0 if is_dir else st.st_size, st.st_mtime, is_dir)
+                if is_dir:
+                    stack.append((rel, entry.path))
+    return result
+
+
+def _patch_blocks(src_file: str, dst_file: str, block_size: int, cancel: Optional[threading.Event] = None) -> int:
+    """
+    块级增量更新：逐块比较源与目标，只把不同的块原地写回目标文件，
+    最后截断到源文件长度。两端都在本机可读，直接比较块内容即可，无需另算校验和。
+    返回实际写入的字节数。
+    """
+    written = 0
+    hook = _io_hook
+    with open(src_file, "rb") as fsrc, open(dst_file, "r+b") as fdst:
+        offset = 0
+        while True:
+            _check_cancel(cancel)
+            a = fsrc.read(block_size)
+            if not a:
+                break
+            b = fdst.read(len(a))
+            if hook:
+                hook("read", src_file, len(a))
+                hook("read", dst_file, len(b))
+            if a != b:
+                fdst.seek(offset)
+                fdst.write(a)
+                if hook:
+                    hook("write", dst_file, len(a))
+                written += len(a)
+            offset += len(a)
+            fdst.seek(offset)
+        fdst.truncate(offset)
+    return written
+
+
+def _removed_with_ancestor(rel: str, src_tree: dict, dst_tree: dict) -> bool:
+    """
+    目标端多余的 rel 是否会随某个上级目录一起被删除：
+    上级目录本身多余（会被 rmtree），或在源端是文件（复制前会 rmtree 目标端同名目录）。
+    """
+    parent = rel
+    while "/" in parent:
+        parent = parent.rsplit("/", 1)[0]
+        src = src_tree.get(parent)
+        if src is None and parent in dst_tree:
+            return True
+        if src is not None and not src[2]:
+            return True
+    return False
+
+
+def sync_tree(
+        src_root: str,
+        dst_root: str,
+        delete_extraneous: bool = False,
+        dry_run: bool = False,
+        block_checksums: bool = False,
+        block_threshold: int = 16 * 1024 * 1024,
+        block_size: int = 1024 * 1024,
+        on_action: Optional[Callable[[SyncAction], None]] = None,
+        cancel: Optional[threading.Event] = None,
+) -> SyncResult:
+    """
+    镜像同步：把本地目录 src_root 同步到 U 盘目录 dst_root，只传输变化的部分。
+
+    - 按 (大小, mtime) 判断文件是否变化，两端目录并行扫描；
+    - block_checksums=True 时，不小于 block_threshold 的已变化文件按块比较，只重写变化的块；
+    - delete_extraneous=True 时删除目标端多余的文件/目录；
+    - dry_run=True 只生成计划，不做任何修改；
+    - cancel 被置位时在当前文件/块之后停止，抛出 OperationCancelled。
+
+    返回 SyncResult，其中 bytes_avoided 为相对全量复制少写入的字节数。
+    """
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        src_future = pool.submit(_scan_tree, src_root)
+        dst_future = pool.submit(_scan_tree, dst_root)
+        src_tree = src_future.result()
+        dst_tree = dst_future.result() if os.path.isdir(dst_root) else {}
+
+    plan: list[SyncAction] = []
+    for rel in sorted(src_tree):
+        size, mtime, is_dir = src_tree[rel]
+        existing = dst_tree.get(rel)
+        if is_dir:
+            if existing is None or not existing[2]:
+                plan.append(SyncAction("mkdir", rel))
+            continue
+        if existing is not None and not existing[2]:
+            d_size, d_mtime, _ = existing
+            if d_size == size and abs(d_mtime - mtime) <= _MTIME_TOLERANCE_SEC:
+                continue
+            if block_checksums and size >= block_threshold and d_size > 0:
+                plan.append(SyncAction("patch", rel, size))
+                continue
+        plan.append(SyncAction("copy", rel, size))
+
+    if delete_extraneous:
+        # 深层路径在前，保证先删文件/子目录再删父目录
+        for rel in sorted((r for r in dst_tree if r not in src_tree), key=lambda r: r.count("/"), reverse=True):
+            if _removed_with_ancestor(rel, src_tree, dst_tree):
+                continue
+            plan.append(SyncAction("delete", rel, dst_tree[rel][0]))
+
+    total = sum(size for size, _, is_dir in src_tree.values() if not is_dir)
+    written = 0
+
+    for act in plan:
+        _check_cancel(cancel)
+        if on_action:
+            on_action(act)
+        if dry_run:
+            if act.action in ("copy", "patch"):
+                written += act.size
+            continue
+
+        src = os.path.join(src_root, *act.rel_path.split("/"))
+        dst = os.path.join(dst_root, *act.rel_path.split("/"))
+        if act.action == "mkdir":
+            if os.path.exists(dst) and not os.path.isdir(dst):
+                os.remove(dst)
+            os.makedirs(dst, exist_ok=True)
+        elif act.action == "delete":
+            delete_path(dst_root, os.path.join(*act.rel_path.split("/")))
+        else:
+            if act.action == "patch":
+                written += _patch_blocks(src, dst, block_size, cancel)
+            else:
+                if os.path.isdir(dst):
+                    shutil.rmtree(dst)
+                copy_with_progress(src, dst, cancel=cancel)
+                written += act.size
+            st = os.stat(src)
+            os.utime(dst, (st.st_atime, st.st_mtime))
+
+    return SyncResult(actions=plan, total_bytes=total, bytes_written=written, dry_run=dry_run)
+
+
+class DirSizeCache:
+    """
+    目录大小记忆表：{目录路径: (mtime_ns, 直属文件总字节, 直属文件数, 子目录列表)}。
+
+    目录 mtime 未变时直接复用直属文件的统计结果，不再 scandir；子目录仍逐个检查。
+    注意：原地改写文件内容通常不会改变所在目录的 mtime，本程序自身写入后应调用 invalidate。
+    线程安全：统计线程 put 的同时，界面线程可能 invalidate。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[str, tuple[int, int, int, tuple[str, ...]]] = {}
+
+    def get(self, path: str, mtime_ns: int):
+        with self._lock:
+            rec = self._entries.get(path)
+        if rec is not None and rec[0] == mtime_ns:
+            return rec
+        return None
+
+    def put(self, path: str, rec: tuple[int, int, int, tuple[str, ...]]) -> None:
+        with self._lock:
+            self._entries[path] = rec
+
+    def invalidate(self, path: str) -> None:
+        """
+        path 被新建/修改/删除后调用：使其所在目录、path 本身及其下全部子目录的记录失效。
+        传入目录时（如整目录同步后），其中被原地改写的文件不会改变各级目录 mtime，必须按前缀清除。
+        """
+        path = os.path.normpath(path)
+        prefix = os.path.join(path, "")
+        with self._lock:
+            self._entries.pop(os.path.dirname(path), None)
+            for key in [k for k in self._entries if k == path or k.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def dir_size(
+        path: str,
+        cache: Optional[DirSizeCache] = None,
+        cancel: Optional[threading.Event] = None,
+) -> Optional[tuple[int, int]]:
+    """
+    基于 os.scandir 递归统计目录的总字节数与文件数，返回 (bytes, files)。
+    cancel 被置位时提前返回 None。
+    """
+    total_bytes = 0
+    total_files = 0
+    stack = [os.path.normpath(path)]
+    while stack:
+        if cancel is not None and cancel.is_set():
+            return None
+        d = stack.pop()
+        try:
+            mtime_ns = os.stat(d).st_mtime_ns
+        except OSError:
+            continue
+        rec = cache.get(d, mtime_ns) if cache is not None else None
+        if rec is None:
+            files_bytes = files_count = 0
+            subdirs = []
+            try:
+                with os.scandir(d) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.append(entry.path)
+                            else:
+                                files_bytes += entry.stat(follow_symlinks=False).st_size
+                                files_count += 1
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+            rec = (mtime_ns, files_bytes, files_count, tuple(subdirs))
+            if cache is not None:
+                cache.put(d, rec)
+        total_bytes += rec[1]
+        total_files += rec[2]
+        stack.extend(rec[3])
+    return total_bytes, total_files
+
+
+def compute_dir_sizes(
+        paths: Iterable[str],
+        on_result: Callable[[str, int, int], None],
+        cache: Optional[DirSizeCache] = None,
+        cancel: Optional[threading.Event] = None,
+        workers: int = 4,
+) -> None:
+    """
+    并行统计多个目录的递归大小；每个目录统计完成就回调 on_result(path, bytes, files)，
+    回调在工作线程中发生。cancel 置位后不再回调，尚未开始的目录也不再统计。
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(dir_size, p, cache, cancel): p for p in paths}
+        for fut in as_completed(futures):
+            if cancel is not None and cancel.is_set():
+                for f in futures:
+                    f.cancel()
+                return
+            result = fut.result()
+            if result is not None:
+                on_result(futures[fut], result[0], result[1])
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("用法: python file_ops.py <源文件> <U盘目录>  # 对比各落盘策略的真实写入速度")
+        sys.exit(1)
+    for row in benchmark_flush_policies(sys.argv[1], sys.argv[2]):
+        print(f"{row['policy']:>9}: {row['mbps']:8.2f} MB/s  总耗时 {row['seconds']:.2f}s"
+              f"  (复制阶段结束于 {row['copy_phase_seconds']:.2f}s)")
@@ -0,0 +1,346 @@
+"""
+hotplug_trace.py
+U 盘插拔事件的录制与高速回放。
+
+- TraceRecorder：包装任意 watcher 的 on_event 回调，把 DriveEvent 连同时间戳写入 JSON Lines 轨迹文件；
+- replay_trace：在无界面（不依赖 Tk 显示、不依赖 WMI）的环境中，把轨迹按原速或加速
+  喂给 App._on_drive_event_from_worker，统计刷新次数、刷新 CPU 时间与界面线程最长阻塞。
+
+用法：
+    python hotplug_trace.py synth hub16.jsonl --drives 16 --spread-ms 40
+    python hotplug_trace.py replay hub16.jsonl --speed 10 --query-latency-ms 300
+"""
+from __future__ import annotations
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import queue
+import shutil
+import string
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from storage_monitor import DriveEvent
+
+
+class TraceRecorder:
+    """
+    可直接作为 watcher 的 on_event 使用：记录事件后再转发给 forward。
+    例如 watcher.on_event = TraceRecorder("trace.jsonl", forward=app._on_drive_event_from_worker)
+    """
+
+    def __init__(self, path: str, forward: Optional[Callable[[DriveEvent], None]] = None):
+        self.path = path
+        self.forward = forward
+        self.count = 0
+        self._t0: Optional[float] = None
+        self._lock = threading.Lock()
+        self._file = open(path, "w", encoding="utf-8")
+
+    def __call__(self, evt: DriveEvent) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            if self._t0 is None:
+                self._t0 = now
+            if self._file is not None:
+                self._file.write(json.dumps({"t": round(now - self._t0, 6), "action": evt.action,
+                                             "drive_letter": evt.drive_letter}) + "\n")
+                self._file.flush()
+                self.count += 1
+        if self.forward:
+            self.forward(evt)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def load_trace(path: str) -> list[tuple[float, DriveEvent]]:
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                d = json.loads(line)
+                events.append((float(d["t"]), DriveEvent(action=d["action"], drive_letter=d["drive_letter"])))
+    events.sort(key=lambda x: x[0])
+    return events
+
+
+def save_trace(path: str, events: list[tuple[float, DriveEvent]]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for t, evt in events:
+            f.write(json.dumps({"t": t, "action": evt.action, "drive_letter": evt.drive_letter}) + "\n")
+
+
+def synth_hub_trace(drives: int = 16, spread_ms: float = 40.0, hold_sec: float = 1.0) -> list[tuple[float, DriveEvent]]:
+    """生成“整个 Hub 上电”的轨迹：drives 个盘在 spread_ms 内依次插入，hold_sec 后依次拔出。"""
+    letters = [f"{c}:" for c in string.ascii_uppercase[3:]][:drives]
+    step = spread_ms / 1000.0 / max(drives - 1, 1)
+    events = [(round(i * step, 6), DriveEvent("inserted", d)) for i, d in enumerate(letters)]
+    base = events[-1][0] + hold_sec if events else 0.0
+    events += [(round(base + i * step, 6), DriveEvent("removed", d)) for i, d in enumerate(letters)]
+    return events
+
+
+class FakeDriveBackend:
+    """
+    回放用的假设备后端：每个“盘符”对应临时目录下的一个真实目录，
+    插入时创建并放入若干文件，拔出时删除；设备枚举可配置固定延迟以模拟 WMI/PowerShell 查询开销。
+    """
+
+    def __init__(self, files_per_drive: int = 20, query_latency_sec: float = 0.0):
+        self.root = tempfile.mkdtemp(prefix="usb_lab_replay_")
+        self.files_per_drive = files_per_drive
+        self.query_latency_sec = query_latency_sec
+        self._lock = threading.Lock()
+        self._drives: dict[str, str] = {}
+
+    def mount_for(self, drive_letter: str) -> str:
+        return os.path.join(self.root, drive_letter.rstrip(":"))
+
+    def apply(self, evt: DriveEvent) -> None:
+        mount = self.mount_for(evt.drive_letter)
+        with self._lock:
+            if evt.action == "inserted":
+                os.makedirs(mount, exist_ok=True)
+                for i in range(self.files_per_drive):
+                    with open(os.path.join(mount, f"file{i}.txt"), "w") as f:
+                        f.write("x" * i)
+                self._drives[evt.drive_letter] = mount
+            else:
+                self._drives.pop(evt.drive_letter, None)
+                shutil.rmtree(mount, ignore_errors=True)
+
+    def get_removable_drives(self) -> list[str]:
+        time.sleep(self.query_latency_sec)
+        with self._lock:
+            return sorted(self._drives)
+
+    def list_usb_devices(self) -> list[dict]:
+        time.sleep(self.query_latency_sec)
+        with self._lock:
+            return [{"product": f"Fake USB {d}", "service": "USBSTOR"} for d in sorted(self._drives)]
+
+    def close(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+class _UiLoop:
+    """Tk after/after_cancel 的最小替代：单线程执行回调，可从任意线程投递。"""
+
+    def __init__(self):
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._cancelled: set = set()
+        self._inbox: queue.Queue = queue.Queue()
+        self.max_stall_sec = 0.0
+        self.callbacks = 0
+
+    def after(self, ms: int, fn: Callable[[], None]):
+        timer_id = next(self._seq)
+        self._inbox.put((time.perf_counter() + ms / 1000.0, timer_id, fn))
+        return timer_id
+
+    def after_cancel(self, timer_id) -> None:
+        self._cancelled.add(timer_id)
+
+    def run_until(self, deadline: float, idle: Optional[Callable[[], bool]] = None) -> None:
+        while True:
+            while True:
+                try:
+                    heapq.heappush(self._heap, self._inbox.get_nowait())
+                except queue.Empty:
+                    break
+            now = time.perf_counter()
+            if self._heap and self._heap[0][0] <= now:
+                _, timer_id, fn = heapq.heappop(self._heap)
+                if timer_id in self._cancelled:
+                    self._cancelled.discard(timer_id)
+                    continue
+                t0 = time.perf_counter()
+                fn()
+                self.max_stall_sec = max(self.max_stall_sec, time.perf_counter() - t0)
+                self.callbacks += 1
+                continue
+            if now >= deadline or (idle is not None and not self._heap and self._inbox.empty() and idle()):
+                return
+            wait = min(deadline - now, self._heap[0][0] - now if self._heap else 0.005, 0.005)
+            time.sleep(max(wait, 0))
+
+
+def _make_headless_app(backend: FakeDriveBackend):
+    """
+    构造一个复用 App 插拔事件处理逻辑（去抖、就绪等待、刷新调度）的无界面对象，
+    界面相关的刷新改为调用假后端。
+    """
+    from app import App
+    from file_ops import list_files
+
+    loop = _UiLoop()
+
+    class HeadlessApp:
+        _on_drive_event_from_worker = App._on_drive_event_from_worker
+        _handle_drive_event = App._handle_drive_event
+        _schedule_single_refresh = App._schedule_single_refresh
+        _do_refresh_after_event = App._do_refresh_after_event
+
+        def __init__(self):
+            self._refresh_timer_id = None
+            self.after = loop.after
+            self.after_cancel = loop.after_cancel
+            self.mounts: list[str] = []
+            self.current_mount = ""
+            self.logs: list[str] = []
+            self.notifications = 0
+            self.refreshes = 0
+            self.refresh_cpu_sec = 0.0
+            self.refresh_wall_sec = 0.0
+            self.pending_waits = 0
+            self._waits_lock = threading.Lock()
+
+        def _wait_ready_then_refresh(self, mount):
+            with self._waits_lock:
+                self.pending_waits += 1
+            try:
+                App._wait_ready_then_refresh(self, mount)
+            finally:
+                with self._waits_lock:
+                    self.pending_waits -= 1
+
+        def _mount_for_drive(self, drive_letter):
+            return backend.mount_for(drive_letter)
+
+        def _notify(self, kind, title, msg):
+            self.notifications += 1
+
+        def _log(self, msg, **kwargs):
+            self.logs.append(msg)
+
+        def _refresh_mounts(self):
+            self.mounts = [backend.mount_for(d) for d in backend.get_removable_drives()]
+            if self.current_mount not in self.mounts:
+                self.current_mount = self.mounts[0] if self.mounts else ""
+
+        def _refresh_usb_devices(self):
+            backend.list_usb_devices()
+
+        def _refresh_file_list(self, event=None):
+            if self.current_mount:
+                list_files(self.current_mount)
+
+    # 统计每次去抖后的整体刷新
+    original = HeadlessApp._do_refresh_after_event
+
+    def measured(self):
+        c0, w0 = time.thread_time(), time.perf_counter()
+        original(self)
+        self.refresh_cpu_sec += time.thread_time() - c0
+        self.refresh_wall_sec += time.perf_counter() - w0
+        self.refreshes += 1
+
+    HeadlessApp._do_refresh_after_event = measured
+    return HeadlessApp(), loop
+
+
+@dataclass
+class ReplayReport:
+    events: int
+    refreshes: int
+    refresh_cpu_sec: float
+    refresh_wall_sec: float
+    max_ui_stall_ms: float
+    notifications: int
+    elapsed_sec: float
+
+    def format(self) -> str:
+        return (f"事件 {self.events} 个 | 刷新 {self.refreshes} 次 | 刷新 CPU {self.refresh_cpu_sec * 1000:.1f} ms"
+                f" (墙钟 {self.refresh_wall_sec * 1000:.1f} ms) | 界面最长阻塞 {self.max_ui_stall_ms:.1f} ms"
+                f" | 弹窗 {self.notifications} 次 | 用时 {self.elapsed_sec:.2f} s")
+
+
+def replay_trace(
+        events: list[tuple[float, DriveEvent]],
+        speed: float = 1.0,
+        backend: Optional[FakeDriveBackend] = None,
+        settle_sec: float = 3.0,
+) -> ReplayReport:
+    """
+    按时间轴回放（speed>1 为加速）。事件由独立线程投递，模拟 watcher 线程；
+    全部事件投递后继续运行最多 settle_sec 秒，等待去抖刷新完成。
+    """
+    own_backend = backend is None
+    backend = backend or FakeDriveBackend()
+    app, loop = _make_headless_app(backend)
+    done = threading.Event()
+
+    def feeder():
+        t0 = time.perf_counter()
+        for t, evt in events:
+            delay = t0 + t / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            backend.apply(evt)
+            app._on_drive_event_from_worker(evt)
+        done.set()
+
+    start = time.perf_counter()
+    threading.Thread(target=feeder, name="TraceFeeder", daemon=True).start()
+    try:
+        while not done.is_set():
+            loop.run_until(time.perf_counter() + 0.05)
+        # 等待就绪检测线程结束、去抖定时器触发，最多 settle_sec 秒
+        loop.run_until(time.perf_counter() + settle_sec,
+                       idle=lambda: app._refresh_timer_id is None and app.pending_waits == 0)
+    finally:
+        if own_backend:
+            backend.close()
+
+    return ReplayReport(
+        events=len(events),
+        refreshes=app.refreshes,
+        refresh_cpu_sec=app.refresh_cpu_sec,
+        refresh_wall_sec=app.refresh_wall_sec,
+        max_ui_stall_ms=loop.max_stall_sec * 1000,
+        notifications=app.notifications,
+        elapsed_sec=time.perf_counter() - start,
+    )
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="U 盘插拔事件轨迹生成与回放")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_synth = sub.add_parser("synth", help="生成 Hub 上电轨迹")
+    p_synth.add_argument("path")
+    p_synth.add_argument("--drives", type=int, default=16)
+    p_synth.add_argument("--spread-ms", type=float, default=40.0)
+    p_replay = sub.add_parser("replay", help="无界面回放轨迹")
+    p_replay.add_argument("path")
+    p_replay.add_argument("--speed", type=float, default=1.0)
+    p_replay.add_argument("--query-latency-ms", type=float, default=0.0)
+    p_replay.add_argument("--files-per-drive", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "synth":
+        save_trace(args.path, synth_hub_trace(args.drives, args.spread_ms))
+        print(f"已生成: {args.path}")
+    else:
+        backend = FakeDriveBackend(files_per_drive=args.files_per_drive,
+                                   query_latency_sec=args.query_latency_ms / 1000.0)
+        try:
+            report = replay_trace(load_trace(args.path), speed=args.speed, backend=backend)
+        finally:
+            backend.close()
+        print(report.format())
+
+
+if __name__ == "__main__":
+    main()
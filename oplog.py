@@ -0,0 +1,157 @@
+"""
+oplog.py
+结构化操作日志：内存中只保留最近 capacity 条（环形缓冲），
+全部记录同时顺序写入磁盘上按大小轮转的 JSON Lines 文件，导出时从文件流式复制。
+"""
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Optional, TextIO
+
+
+@dataclass(slots=True)
+class LogRecord:
+    ts: float
+    level: str  # "INFO" | "WARN" | "ERROR"
+    msg: str
+    device: Optional[str] = None
+    job: Optional[str] = None
+
+    def format(self, with_date: bool = False) -> str:
+        t = time.strftime("%Y-%m-%d %H:%M:%S" if with_date else "%H:%M:%S", time.localtime(self.ts))
+        parts = [t]
+        if self.level != "INFO":
+            parts.append(self.level)
+        if self.device:
+            parts.append(f"[{self.device}]")
+        if self.job:
+            parts.append(f"<{self.job}>")
+        return " ".join(parts) + " " + self.msg
+
+
+def default_log_dir() -> str:
+    return os.path.join(tempfile.gettempdir(), "usb_lab_gui_logs")
+
+
+class OperationLog:
+    """
+    线程安全的操作日志存储。
+
+    - records()：内存中最近 capacity 条记录；
+    - drain_pending()：取出上次调用以来新增的记录，供 GUI 每帧批量刷新；
+    - 磁盘文件超过 max_file_bytes 时轮转为 .1、.2 …，最多保留 backups 个旧文件。
+    """
+
+    def __init__(
+            self,
+            capacity: int = 5000,
+            log_dir: Optional[str] = None,
+            max_file_bytes: int = 8 * 1024 * 1024,
+            backups: int = 5,
+    ):
+        self.capacity = capacity
+        self.max_file_bytes = max_file_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+        self._ring: deque[LogRecord] = deque(maxlen=capacity)
+        # GUI 长时间未取走时同样有界，只丢最旧的待显示记录（磁盘文件中仍完整）
+        self._pending: deque[LogRecord] = deque(maxlen=capacity)
+        self.total = 0
+
+        log_dir = log_dir or default_log_dir()
+        os.makedirs(log_dir, exist_ok=True)
+        self.path = os.path.join(log_dir, time.strftime("oplog-%Y%m%d-%H%M%S") + f"-{os.getpid()}.jsonl")
+        self._file: Optional[TextIO] = open(self.path, "a", encoding="utf-8", newline="")
+        self._file_bytes = 0
+
+    def append(self, msg: str, level: str = "INFO", device: Optional[str] = None,
+               job: Optional[str] = None) -> LogRecord:
+        rec = LogRecord(time.time(), level, msg, device, job)
+        line = json.dumps(asdict(rec), ensure_ascii=False) + "\n"
+        with self._lock:
+            self._ring.append(rec)
+            self._pending.append(rec)
+            self.total += 1
+            if self._file is not None:
+                self._file.write(line)
+                self._file_bytes += len(line.encode("utf-8"))
+                if self._file_bytes >= self.max_file_bytes:
+                    self._rotate()
+        return rec
+
+    def records(self) -> list[LogRecord]:
+        with self._lock:
+            return list(self._ring)
+
+    def drain_pending(self) -> list[LogRecord]:
+        with self._lock:
+            items = list(self._pending)
+            self._pending.clear()
+        return items
+
+    def _files_oldest_first(self) -> list[str]:
+        olds = [f"{self.path}.{i}" for i in range(self.backups, 0, -1)]
+        return [p for p in olds + [self.path] if os.path.exists(p)]
+
+    def _rotate(self) -> None:
+        self._file.close()
+        try:
+            oldest = f"{self.path}.{self.backups}"
+            if os.path.exists(oldest):
+                os.remove(oldest)
+            for i in range(self.backups - 1, 0, -1):
+                src = f"{self.path}.{i}"
+                if os.path.exists(src):
+                    os.replace(src, f"{self.path}.{i + 1}")
+            if self.backups > 0:
+                os.replace(self.path, f"{self.path}.1")
+            else:
+                os.remove(self.path)
+            self._file_bytes = 0
+        except OSError:
+            # Windows 上文件正被导出读取时无法改名，本次先不轮转，继续追加
+            pass
+        self._file = open(self.path, "a", encoding="utf-8", newline="")
+
+    def export(self, dst_path: str, as_text: bool = True) -> int:
+        """
+        把磁盘上的日志（含轮转文件）按时间顺序流式导出到 dst_path，返回导出的条数。
+        as_text=True 导出为可读文本，否则原样复制 JSON Lines。
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            # 在锁内打开全部文件：导出期间继续写入/轮转也不影响已打开的句柄；
+            # 只导出当前已落盘的部分
+            sources = [(open(p, "r", encoding="utf-8", newline=""), os.path.getsize(p))
+                       for p in self._files_oldest_first()]
+
+        count = 0
+        with open(dst_path, "w", encoding="utf-8") as out:
+            for f, remaining in sources:
+                with f:
+                    for line in f:
+                        remaining -= len(line.encode("utf-8"))
+                        if remaining < 0:
+                            break
+                        if as_text:
+                            try:
+                                out.write(LogRecord(**json.loads(line)).format(with_date=True) + "\n")
+                            except (ValueError, TypeError):
+                                continue
+                        else:
+                            out.write(line)
+                        count += 1
+        return count
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,221 @@
+"""
+perf_regress.py
+基于模拟后端（simulation.py）的性能回归检查：在限速的模拟盘上测量拷贝、导出、列目录与插拔刷新，
+与仓库中保存的基线（perf_baseline.json）比较，任一指标变差超过容差即以非零状态退出。
+
+模拟盘的带宽与延迟固定，测到的差异来自本项目代码本身的开销，而不是硬件。
+
+用法：
+    python perf_regress.py                  # 与基线比较
+    python perf_regress.py --update         # 重新生成基线
+    python perf_regress.py --tolerance 0.3
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Optional
+
+import file_ops
+import simulation
+from hotplug_trace import replay_trace, synth_hub_trace
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perf_baseline.json")
+MB = 1024 * 1024
+
+# 模拟盘参数：接近一块普通 USB 3.0 U 盘
+SIM_SPEC = simulation.SimDeviceSpec(read_bps=120 * MB, write_bps=60 * MB, latency_sec=0.0005, files=0)
+# 小文件导出用的盘：每次读取延迟较高，设备耗时远大于线程调度抖动，
+# 测到的是并发读取能否把延迟重叠起来
+EXPORT_SPEC = simulation.SimDeviceSpec(read_bps=40 * MB, write_bps=40 * MB, latency_sec=0.002, files=0)
+# 插拔刷新：每次设备枚举 20 ms（接近 WMI 查询），列目录 2 ms。
+# 这些模拟延迟每次刷新固定约 42 ms，墙钟时间几乎全是 sleep，因此指标取刷新线程的 CPU 时间
+REPLAY_SPEC = simulation.SimDeviceSpec(latency_sec=0.002, files=50)
+REPLAY_QUERY_LATENCY_SEC = 0.02
+# 取多次中的最好值；次数太少时单次调度抖动就会造成误报
+MIN_RUNS = 3
+
+
+@dataclass
+class Metric:
+    name: str
+    value: float
+    unit: str
+    higher_is_better: bool
+    # 纯 CPU 耗时的指标：比较前按 cpu_reference 换算到基线机器的速度
+    cpu_bound: bool = False
+    # 毫秒级指标允许的绝对误差，None 时使用 compare 的默认值
+    abs_slack_ms: Optional[float] = None
+
+
+def _best(runs: int, fn: Callable[[], float], higher_is_better: bool) -> float:
+    values = [fn() for _ in range(runs)]
+    return max(values) if higher_is_better else min(values)
+
+
+def _cpu_reference() -> float:
+    """与 list_files 处理每个条目相近的纯 Python 工作量（毫秒），用来衡量本机当前的 CPU 速度。"""
+    t0 = time.perf_counter()
+    rows = []
+    for i in range(2000):
+        rows.append({"name": f"n{i:04d}.txt", "size": i, "is_dir": False,
+                     "modified": datetime.fromtimestamp(1.7e9 + i).strftime("%Y-%m-%d %H:%M:%S")})
+    return (time.perf_counter() - t0) * 1000
+
+
+def measure(runs: int = 5) -> list[Metric]:
+    runs = max(runs, MIN_RUNS)
+    backend = simulation.SimBackend(SIM_SPEC)
+    local = tempfile.mkdtemp(prefix="usb_lab_perf_")
+    simulation.install(backend)
+    try:
+        mount = backend.mount_for(backend.insert())
+        src = os.path.join(local, "src.bin")
+        with open(src, "wb") as f:
+            f.write(os.urandom(32 * MB))
+
+        def copy_to_usb() -> float:
+            t0 = time.perf_counter()
+            file_ops.copy_with_progress(src, os.path.join(mount, "copy.bin"), on_progress=lambda p: None)
+            return 32 / (time.perf_counter() - t0)
+
+        def copy_from_usb() -> float:
+            t0 = time.perf_counter()
+            file_ops.copy_with_progress(os.path.join(mount, "copy.bin"), os.path.join(local, "back.bin"),
+                                        on_progress=lambda p: None, read_ahead=True)
+            return 32 / (time.perf_counter() - t0)
+
+        tree = os.path.join(backend.mount_for(backend.insert(EXPORT_SPEC)), "tree")
+        for i in range(40):
+            d = os.path.join(tree, f"d{i}")
+            os.makedirs(d)
+            for j in range(25):
+                with open(os.path.join(d, f"f{j}.bin"), "wb") as f:
+                    f.write(b"\0" * 16384)
+
+        def export_tree() -> float:
+            out = os.path.join(local, "export")
+            t0 = time.perf_counter()
+            file_ops.export_files([tree], out, concurrency=4)
+            dt = time.perf_counter() - t0
+            shutil.rmtree(out)
+            return 40 * 25 * 16384 / MB / dt
+
+        listing = os.path.join(mount, "listing")
+        os.makedirs(listing)
+        for i in range(2000):
+            open(os.path.join(listing, f"n{i:04d}.txt"), "w").close()
+
+        def list_dir() -> float:
+            t0 = time.perf_counter()
+            file_ops.list_files(listing)
+            return (time.perf_counter() - t0) * 1000
+
+        # 列目录只需十几毫秒，受 CPU 频率与调度影响很大：与参考工作量交替测量并多取几次
+        list_ms, ref_ms = [], []
+        for _ in range(runs * 4):
+            list_ms.append(list_dir())
+            ref_ms.append(_cpu_reference())
+
+        # 只保留插入事件：刷新时 8 个盘都在，列表与目录读取才有实际工作量
+        events = [e for e in synth_hub_trace(drives=8, spread_ms=40.0) if e[1].action == "inserted"]
+
+        def refresh() -> float:
+            replay_backend = simulation.SimBackend(REPLAY_SPEC, query_latency_sec=REPLAY_QUERY_LATENCY_SEC)
+            # install() 只挂了主后端的读写垫片，回放期间换成回放后端的，列目录延迟才会生效
+            saved_hook = file_ops.set_io_hook(replay_backend.io_hook)
+            try:
+                report = replay_trace(events, speed=4.0, backend=replay_backend)
+            finally:
+                file_ops.set_io_hook(saved_hook)
+                replay_backend.close()
+            return report.refresh_cpu_sec * 1000 / max(report.refreshes, 1)
+
+        return [
+            Metric("copy_to_usb", _best(runs, copy_to_usb, True), "MB/s", True),
+            Metric("copy_from_usb", _best(runs, copy_from_usb, True), "MB/s", True),
+            Metric("export_tree", _best(runs, export_tree, True), "MB/s", True),
+            Metric("list_2000", min(list_ms), "ms", False, cpu_bound=True),
+            Metric("cpu_reference", min(ref_ms), "ms", False),
+            # 每次刷新只有约 1 ms CPU，默认 5 ms 的绝对误差会掩盖成倍的变慢
+            Metric("hotplug_refresh", _best(runs, refresh, False), "ms", False, cpu_bound=True, abs_slack_ms=0.5),
+        ]
+    finally:
+        simulation.uninstall()
+        backend.close()
+        shutil.rmtree(local, ignore_errors=True)
+
+
+def compare(metrics: list[Metric], baseline: dict, tolerance: float, abs_slack_ms: float = 5.0) -> list[str]:
+    """
+    返回超出容差的指标说明；毫秒级指标另外允许 abs_slack_ms（或指标自带的值）的绝对误差，避免计时抖动误报。
+    cpu_bound 指标先按本次与基线的 cpu_reference 之比换算，消除机器当前 CPU 速度的差异。
+    """
+    failures = []
+    by_name = {m.name: m for m in metrics}
+    scale = 1.0
+    if "cpu_reference" in by_name and "cpu_reference" in baseline:
+        scale = by_name["cpu_reference"].value / baseline["cpu_reference"]["value"]
+    for m in metrics:
+        base = baseline.get(m.name)
+        if base is None or m.name == "cpu_reference":
+            continue
+        ref = base["value"]
+        value = m.value / scale if m.cpu_bound else m.value
+        if m.higher_is_better:
+            worse = value < ref * (1 - tolerance)
+        else:
+            slack = abs_slack_ms if m.abs_slack_ms is None else m.abs_slack_ms
+            worse = value > ref * (1 + tolerance) and value - ref > slack
+        if worse:
+            note = f"，按 CPU 速度换算为 {value:.2f}" if m.cpu_bound and scale != 1.0 else ""
+            failures.append(f"{m.name}: {m.value:.2f} {m.unit}{note}（基线 {ref:.2f} {m.unit}）")
+    return failures
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="模拟后端性能回归检查")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update", action="store_true", help="用本次结果覆盖基线")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许变差的比例")
+    parser.add_argument("--runs", type=int, default=5, help=f"每项重复次数（至少 {MIN_RUNS}）")
+    args = parser.parse_args(argv)
+
+    metrics = measure(args.runs)
+    for m in metrics:
+        print(f"{m.name:>16}: {m.value:10.2f} {m.unit}")
+
+    if args.update:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({m.name: {"value": round(m.value, 3), "unit": m.unit, "higher_is_better": m.higher_is_better}
+                       for m in metrics}, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"基线已更新: {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"找不到基线 {args.baseline}，请先运行 --update")
+        return 2
+
+    failures = compare(metrics, baseline, args.tolerance)
+    if failures:
+        print("性能回归：")
+        for line in failures:
+            print("  " + line)
+        return 1
+    print("未发现性能回归")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
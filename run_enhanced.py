@@ -2,23 +2,58 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
 import threading
 import os
+import time
 from app import App
-from file_ops import copy_with_progress, delete_path
+from file_ops import delete_path, pack_files, unpack_stream, sync_tree, export_files, OperationCancelled
 import usb_extensions
+from duplicates import find_duplicates, delete_duplicates
+from volume_index import VolumeIndex, parse_query
+from surface_scan import scan_surface, region_colors
+import capacity_test
+from hotplug_trace import TraceRecorder
+from dashboard import DashboardModel, DashboardWindow
+from diskstats import DiskStatsSampler, block_device_for_mount
+from eject import eject_mount
+from usb_transport import transport_for_mount
+from concurrent.futures import ThreadPoolExecutor
 
 class EnhancedApp(App):
     def __init__(self):
+        # 共享工作线程池与多盘状态需在父类初始化（会刷新盘符列表）之前就绪。
+        # 导出/打包/同步/扫描/弹出等后台任务和看板的容量查询都提交到这里；
+        # 扩容检测、表面扫描可能运行数小时，线程数留出余量，避免容量查询排不上队
+        self.pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="usb-lab")
+        self._job_cancels: set[threading.Event] = set()
+        # 索引增量更新必须按提交顺序执行（如同步先删后加同一目录），单独用一个线程串行处理
+        self.index_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="usb-lab-index")
+        self.dashboard = DashboardModel(self.pool)
+        self.dashboard_win = None
+        self.io_sampler = DiskStatsSampler(on_sample=self._on_io_sample)
+        self.io_devices: dict[str, str] = {}
+        self.io_label = None
         super().__init__()
       
         self.title("USB实验平台")
         self.geometry("1100x850") 
+        self.volume_index = None
         self._inject_new_features()
         self.selected_usb_mount.trace_add('write', self._update_capacity_display)
+        self.selected_usb_mount.trace_add('write', self._rebuild_volume_index)
+        self.selected_usb_mount.trace_add('write', self._reset_io_label)
+        self._rebuild_volume_index()
+        self._reset_io_label()
+        if DiskStatsSampler.available():
+            self.io_sampler.start()
 
     def _inject_new_features(self):
        
         top_frame = self.winfo_children()[0]
         ttk.Button(top_frame, text="💾 导出操作日志", command=self._export_log_to_file).pack(side="right", padx=5)
+        self.trace_recorder = None
+        self.trace_btn = ttk.Button(top_frame, text="⏺ 录制插拔事件", command=self._toggle_trace_recording)
+        self.trace_btn.pack(side="right", padx=5)
+        ttk.Button(top_frame, text="📊 多盘看板", command=self._open_dashboard).pack(side="right", padx=5)
+        ttk.Button(top_frame, text="📈 导出IO指标", command=self._export_io_metrics).pack(side="right", padx=5)
 
         
         sel_frame = self.mount_combo.master 
@@ -28,6 +63,8 @@ class EnhancedApp(App):
         self.cap_label.pack(side="right", padx=10)
         self.cap_bar = ttk.Progressbar(sel_frame, variable=self.cap_var, length=120)
         self.cap_bar.pack(side="right")
+        self.io_label = ttk.Label(sel_frame, text="")
+        self.io_label.pack(side="right", padx=10)
 
         
         main_paned = self.winfo_children()[1] 
@@ -40,8 +77,105 @@ class EnhancedApp(App):
         ttk.Button(f_btns, text="📥 导出(U盘->电脑)", command=self._copy_from_usb).pack(side="left", fill="x", expand=True, padx=2)
         ttk.Button(f_btns, text="✏️ 重命名文件", command=self._rename_file).pack(side="left", fill="x", expand=True, padx=2)
         ttk.Button(f_btns, text="🗑️ 批量删除", command=self._batch_delete).pack(side="left", fill="x", expand=True, padx=2)
+        f_pack = ttk.Frame(adv_frame)
+        f_pack.pack(fill="x", pady=(0, 5))
+        ttk.Button(f_pack, text="📦 打包拷入(小文件)", command=self._pack_to_usb).pack(side="left", fill="x", expand=True, padx=2)
+        ttk.Button(f_pack, text="📂 解包导出", command=self._unpack_from_usb).pack(side="left", fill="x", expand=True, padx=2)
+        ttk.Button(f_pack, text="🔄 同步文件夹", command=self._sync_folder).pack(side="left", fill="x", expand=True, padx=2)
+        ttk.Button(f_pack, text="🔍 查找重复文件", command=self._find_duplicates).pack(side="left", fill="x", expand=True, padx=2)
+        ttk.Button(f_pack, text="🩺 表面扫描", command=self._surface_scan).pack(side="left", fill="x", expand=True, padx=2)
+        ttk.Button(f_pack, text="🧪 扩容检测", command=self._capacity_test).pack(side="left", fill="x", expand=True, padx=2)
+        f_search = ttk.Frame(adv_frame)
+        f_search.pack(fill="x", pady=(0, 5))
+        self.search_entry = ttk.Entry(f_search)
+        self.search_entry.pack(side="left", fill="x", expand=True, padx=2)
+        self.search_entry.bind("<Return>", lambda e: self._search_volume())
+        ttk.Button(f_search, text="🔎 全盘搜索", command=self._search_volume).pack(side="left", padx=2)
+        self.index_label = ttk.Label(f_search, text="索引: --")
+        self.index_label.pack(side="left", padx=5)
         self.file_tree.configure(selectmode="extended")
 
+    def _on_close(self):
+        self.io_sampler.stop()
+        # 池中线程是非守护线程，解释器退出时会等待它们：先让运行中的任务在下一块数据前停下
+        for ev in self._job_cancels:
+            ev.set()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.index_pool.shutdown(wait=False, cancel_futures=True)
+        super()._on_close()
+
+    def _job_cancel_event(self) -> threading.Event:
+        """为可取消的后台任务创建取消事件，关闭程序时统一置位。"""
+        ev = threading.Event()
+        self._job_cancels.add(ev)
+        return ev
+
+    def _open_dashboard(self):
+        # 只保留一个看板窗口：模型的变化集合只能被一个窗口取走
+        if self.dashboard_win is not None and self.dashboard_win.winfo_exists():
+            self.dashboard_win.deiconify()
+            self.dashboard_win.lift()
+            return
+        self.dashboard_win = DashboardWindow(self, self.dashboard, on_select=self.selected_usb_mount.set)
+
+    def _refresh_mounts(self):
+        super()._refresh_mounts()
+        mounts = self.tk.splitlist(self.mount_combo["values"])
+        self.dashboard.sync_drives(mounts)
+        devices = {}
+        for m in mounts:
+            dev = block_device_for_mount(m)
+            if dev:
+                devices[m] = dev
+        self.io_devices = devices
+        self.io_sampler.set_devices(devices)
+        if self.io_label is not None:
+            self._reset_io_label()
+
+    def _reset_io_label(self, *args):
+        # 选中的盘变化后清掉上一块盘的读数；找不到块设备（如 Windows 盘符、不支持 diskstats）时不显示 IO 统计
+        mount = self.selected_usb_mount.get()
+        if mount in self.io_devices and DiskStatsSampler.available():
+            self.io_label.config(text=f"IO {self.io_devices[mount]}: 采样中...")
+        else:
+            self.io_label.config(text="")
+
+    def _on_io_sample(self, mount, s):
+        # 采样线程回调：看板模型线程安全，可直接更新；复制任务进行中时吞吐由复制进度负责
+        state = self.dashboard.get(mount)
+        if state is not None and state.job is None:
+            self.dashboard.set_throughput(mount, (s.read_mbps + s.write_mbps) * 1024 * 1024)
+        text = (f"IO 读 {s.read_mbps:.1f} / 写 {s.write_mbps:.1f} MB/s  "
+                f"{s.read_iops + s.write_iops:.0f} IOPS  队列 {s.in_flight}  忙 {s.util_percent:.0f}%")
+        # Tk 变量只能在主线程读取，是否为当前选中的盘在回调里判断
+        self.after(0, lambda: mount == self.selected_usb_mount.get() and self.io_label.config(text=text))
+
+    def _export_io_metrics(self):
+        if not DiskStatsSampler.available():
+            return messagebox.showinfo("提示", "当前系统不支持块设备 IO 统计")
+        f = filedialog.asksaveasfilename(title="IO 指标保存为", defaultextension=".jsonl", filetypes=[("JSON Lines", "*.jsonl")])
+        if f:
+            n = self.io_sampler.export_jsonl(f)
+            messagebox.showinfo("完成", f"IO 指标已导出 ({n} 条采样)")
+
+    def _update_progress_ui(self, percent, instant_speed, avg_speed, remaining, mount):
+        super()._update_progress_ui(percent, instant_speed, avg_speed, remaining, mount)
+        self.dashboard.set_job(mount, "复制", percent)
+        self.dashboard.set_throughput(mount, instant_speed * 1024 * 1024)
+
+    def _finish_dashboard_job(self, mount):
+        self.dashboard.set_job(mount, None)
+        self.dashboard.set_throughput(mount, 0)
+        self.dashboard.refresh_capacity(mount)
+
+    def _copy_complete(self, src, dst, mount):
+        super()._copy_complete(src, dst, mount)
+        self._finish_dashboard_job(mount)
+
+    def _copy_failed(self, error_msg, mount):
+        self._finish_dashboard_job(mount)
+        super()._copy_failed(error_msg, mount)
+
     def _refresh_usb_devices(self):
         for item in self.usb_tree.get_children():
             self.usb_tree.delete(item)
@@ -60,6 +194,59 @@ class EnhancedApp(App):
         except Exception as e:
             self._log(f"刷新失败: {e}")
 
+    def _rebuild_volume_index(self, *args):
+        mount = self.selected_usb_mount.get()
+        if self.volume_index is not None:
+            if self.volume_index.volume_root == mount:
+                return
+            self.volume_index.cancel()
+            self.volume_index = None
+        if not mount or not os.path.isdir(mount):
+            self.index_label.config(text="索引: --")
+            return
+        self.index_label.config(text="索引: 构建中...")
+        self.volume_index = VolumeIndex(mount)
+        self.volume_index.build(on_done=lambda idx: self.after(0, lambda: idx is self.volume_index and self.index_label.config(text=f"索引: {len(idx)} 项")))
+
+    def _on_paths_changed(self, added=(), removed=()):
+        super()._on_paths_changed(added, removed)
+        idx = self.volume_index
+        if idx is None or not idx.ready.is_set():
+            return
+        removed, added = list(removed), list(added)
+
+        # 添加目录会递归扫描，放到后台执行，完成后回主线程更新计数
+        def update():
+            for p in removed:
+                idx.remove_path(p)
+            for p in added:
+                idx.add_path(p)
+            self.after(0, lambda: idx is self.volume_index and self.index_label.config(text=f"索引: {len(idx)} 项"))
+        self.index_pool.submit(update)
+
+    def _search_volume(self):
+        idx = self.volume_index
+        if idx is None or not idx.ready.is_set():
+            return messagebox.showinfo("提示", "索引尚未就绪，请稍候")
+        query = self.search_entry.get().strip()
+        try:
+            kwargs = parse_query(query)
+        except ValueError as e:
+            return messagebox.showerror("查询格式错误", str(e))
+        results = idx.search(limit=2000, **kwargs)
+        win = tk.Toplevel(self)
+        win.title(f"搜索结果: {query} ({len(results)} 项)")
+        win.geometry("760x400")
+        tree = ttk.Treeview(win, columns=("size", "modified"), show="tree headings")
+        tree.heading("#0", text="路径")
+        tree.heading("size", text="大小")
+        tree.heading("modified", text="修改时间")
+        tree.column("size", width=90, anchor="e")
+        tree.column("modified", width=140)
+        tree.pack(fill="both", expand=True)
+        for r in results:
+            tree.insert("", "end", text=r.path + ("/" if r.is_dir else ""), values=("" if r.is_dir else r.size, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(r.mtime))))
+
     def _update_capacity_display(self, *args):
         mount = self.selected_usb_mount.get()
         if mount and os.path.exists(mount):
@@ -74,31 +261,326 @@ class EnhancedApp(App):
         mp = self.selected_usb_mount.get()
         sel = self.file_tree.selection()
         if not sel: return messagebox.showwarning("提示", "请先选择要导出的文件")
-        fname = self.file_tree.item(sel[0])['values'][0]
-        src = os.path.join(mp, fname)
+        # 行 iid 即完整路径；values 会被 Tk 按数字转换（"007" -> 7），不能用来拼路径
+        srcs = list(sel)
         dst_dir = filedialog.askdirectory(title="选择保存位置")
         if not dst_dir: return
-        dst = os.path.join(dst_dir, fname)
-        self.progress_text.config(text=f"正在导出: {fname}")
+        self.progress_text.config(text=f"正在导出 {len(srcs)} 项...")
+        self.progress_var.set(0)
+        last_ui = 0.0
+
+        def on_p(p):
+            # 多个读取线程都会回调，界面更新限制在每 0.1 秒一次
+            nonlocal last_ui
+            now = time.time()
+            if now - last_ui < 0.1 and p.bytes_copied < p.total_bytes:
+                return
+            last_ui = now
+            percent = p.bytes_copied / p.total_bytes * 100 if p.total_bytes else 100
+            speed = p.speed_bps / (1024 * 1024)
+            self.after(0, lambda: [self.progress_var.set(percent), self.progress_text.config(text=f"导出中 {percent:.0f}%  {speed:.1f} MB/s")])
+
+        cancel = self._job_cancel_event()
+
+        def worker():
+            info = transport_for_mount(mp)
+            self.after(0, lambda: self._log(f"导出: 传输协议 {info.transport}，queue_depth {info.queue_depth}，并发 {info.concurrency}", device=mp))
+            try:
+                t0 = time.time()
+                n = export_files(srcs, dst_dir, concurrency=info.concurrency, on_progress=on_p, cancel=cancel)
+                dt = time.time() - t0
+                self.after(0, lambda: [self._log(f"导出成功: {n} 个文件 -> {dst_dir} ({dt:.1f}s)", device=mp), self.progress_text.config(text="完成")])
+            except OperationCancelled:
+                pass
+            except Exception as e:
+                err = str(e)
+                self.after(0, lambda: [self._log(f"导出失败: {err}", level="ERROR", device=mp), messagebox.showerror("错误", err)])
+        self.pool.submit(worker)
+
+    def _pack_to_usb(self):
+        try:
+            mp = self._require_mount()
+        except Exception as e:
+            return messagebox.showerror("错误", str(e))
+        srcs = filedialog.askopenfilenames(title="选择要打包拷入的文件")
+        if not srcs: return
+        name = simpledialog.askstring("打包", "容器文件名 (.tar / .zip):", initialvalue="pack.tar", parent=self)
+        if not name: return
+        fmt = "zip" if name.lower().endswith(".zip") else "tar"
+        dst = os.path.join(mp, name)
+        self.progress_text.config(text=f"正在打包: {len(srcs)} 个文件")
+        self.progress_var.set(0)
+        cancel = self._job_cancel_event()
+        def worker():
+            try:
+                n = pack_files(srcs, dst, fmt=fmt, cancel=cancel, on_progress=lambda p: self.after(0, lambda: self.progress_var.set(p.bytes_copied/max(p.total_bytes, 1)*100)))
+                self.after(0, lambda: [self._log(f"打包完成: {n} 个文件 -> {dst}"), self.progress_text.config(text="完成"), self._on_paths_changed(added=[dst]), self._refresh_file_list()])
+            except OperationCancelled:
+                pass
+            except Exception as e:
+                err_msg = str(e)
+                self.after(0, lambda: messagebox.showerror("错误", err_msg))
+        self.pool.submit(worker)
+
+    def _unpack_from_usb(self):
+        sel = self.file_tree.selection()
+        if not sel: return messagebox.showwarning("提示", "请先选择 U 盘上的 tar/zip 容器")
+        src = sel[0]
+        fname = os.path.basename(src)
+        dst_dir = filedialog.askdirectory(title="选择解包位置")
+        if not dst_dir: return
+        self.progress_text.config(text=f"正在解包: {fname}")
+        self.progress_var.set(0)
+        cancel = self._job_cancel_event()
+        def worker():
+            try:
+                n = unpack_stream(src, dst_dir, cancel=cancel, on_progress=lambda p: self.after(0, lambda: self.progress_var.set(p.bytes_copied/max(p.total_bytes, 1)*100)))
+                self.after(0, lambda: [self._log(f"解包完成: {n} 个文件 -> {dst_dir}"), self.progress_text.config(text="完成")])
+            except OperationCancelled:
+                pass
+            except Exception as e:
+                err_msg = str(e)
+                self.after(0, lambda: messagebox.showerror("错误", err_msg))
+        self.pool.submit(worker)
+
+    def _sync_folder(self):
+        try:
+            mp = self._require_mount()
+        except Exception as e:
+            return messagebox.showerror("错误", str(e))
+        src_dir = filedialog.askdirectory(title="选择要同步到U盘的本地文件夹")
+        if not src_dir: return
+        dst_dir = os.path.join(mp, os.path.basename(os.path.normpath(src_dir)))
+        delete_extra = messagebox.askyesno("同步", "是否删除U盘中多余的文件?")
+        self.progress_text.config(text="正在计算同步计划...")
+        cancel = self._job_cancel_event()
+
+        # 试运行要完整扫描两棵目录树并计算块校验和，同样放到后台，完成后再回主线程确认
+        def plan_worker():
+            try:
+                plan = sync_tree(src_dir, dst_dir, delete_extraneous=delete_extra, dry_run=True, block_checksums=True, cancel=cancel)
+                self.after(0, lambda: confirm(plan))
+            except OperationCancelled:
+                pass
+            except Exception as e:
+                err_msg = str(e)
+                self.after(0, lambda: [self.progress_text.config(text="同步失败"), messagebox.showerror("错误", err_msg)])
+
+        def confirm(plan):
+            counts = {}
+            for a in plan.actions:
+                counts[a.action] = counts.get(a.action, 0) + 1
+            summary = ", ".join(f"{k}: {v}" for k, v in counts.items()) or "无变化"
+            if not messagebox.askyesno("同步计划", f"{src_dir} -> {dst_dir}\n{summary}\n最多写入 {plan.bytes_written / 1024**2:.1f} MB，确定执行?"):
+                return self.progress_text.config(text="已取消")
+            self.progress_text.config(text="正在同步...")
+            self.pool.submit(worker)
+
+        def worker():
+            try:
+                r = sync_tree(src_dir, dst_dir, delete_extraneous=delete_extra, block_checksums=True, cancel=cancel)
+                self.after(0, lambda: [self._log(f"同步完成: 写入 {r.bytes_written / 1024**2:.1f} MB, 相比全量复制节省 {r.bytes_avoided / 1024**2:.1f} MB"), self.progress_text.config(text="完成"), self._on_paths_changed(removed=[dst_dir], added=[dst_dir]), self._refresh_file_list()])
+            except OperationCancelled:
+                pass
+            except Exception as e:
+                err_msg = str(e)
+                self.after(0, lambda: messagebox.showerror("错误", err_msg))
+        self.pool.submit(plan_worker)
+
+    def _find_duplicates(self):
+        try:
+            mp = self._require_mount()
+        except Exception as e:
+            return messagebox.showerror("错误", str(e))
+        win = tk.Toplevel(self)
+        win.title(f"重复文件 - {mp}")
+        win.geometry("760x420")
+        status = ttk.Label(win, text="正在扫描...")
+        status.pack(fill="x", padx=8, pady=4)
+        tree = ttk.Treeview(win, columns=("size",), show="tree headings")
+        tree.heading("#0", text="路径")
+        tree.heading("size", text="大小")
+        tree.column("size", width=100, anchor="e")
+        tree.pack(fill="both", expand=True, padx=8)
+        groups = {}
+        cancel = self._job_cancel_event()
+        win.protocol("WM_DELETE_WINDOW", lambda: [cancel.set(), win.destroy()])
+
+        def add_group(g):
+            if not win.winfo_exists(): return
+            gid = tree.insert("", "end", text=f"{len(g.paths)} 个相同文件 (可释放 {g.wasted_bytes / 1024**2:.2f} MB)", values=(g.size,), open=True)
+            groups[gid] = g
+            for p in g.paths:
+                tree.insert(gid, "end", text=p, values=(g.size,))
+
+        def delete_all():
+            if not groups: return
+            if not messagebox.askyesno("确认", f"删除 {len(groups)} 组中的重复项（每组保留第一个）?", parent=win): return
+            removed = 0
+            for gid, g in list(groups.items()):
+                try:
+                    paths = delete_duplicates(g)
+                    removed += len(paths)
+                    self._on_paths_changed(removed=paths)
+                except OSError as e:
+                    self._log(f"删除重复文件失败: {e}")
+                tree.delete(gid)
+                del groups[gid]
+            self._log(f"已删除重复文件: {removed} 个")
+            self._refresh_file_list()
+
+        ttk.Button(win, text="删除重复项(每组保留第一个)", command=delete_all).pack(pady=6)
+
+        def worker():
+            try:
+                found = find_duplicates(mp, on_group=lambda g: self.after(0, lambda: add_group(g)), cancel=cancel)
+                wasted = sum(g.wasted_bytes for g in found) / 1024**2
+                self.after(0, lambda: win.winfo_exists() and status.config(text=f"完成: {len(found)} 组, 可释放 {wasted:.2f} MB"))
+            except Exception as e:
+                err_msg = str(e)
+                self.after(0, lambda: win.winfo_exists() and status.config(text=f"扫描失败: {err_msg}"))
+        self.pool.submit(worker)
+
+    def _surface_scan(self):
+        mp = self.selected_usb_mount.get()
+        default = f"\\\\.\\{mp[:2]}" if os.name == "nt" and mp else ""
+        target = simpledialog.askstring("表面扫描", "设备路径或镜像文件 (如 \\\\.\\G: 或 /dev/sdb):", initialvalue=default, parent=self)
+        if not target: return
+        win = tk.Toplevel(self)
+        win.title(f"表面扫描 - {target}")
+        win.geometry("640x420")
+        status = ttk.Label(win, text="正在扫描...")
+        status.pack(fill="x", padx=8, pady=4)
+        canvas = tk.Canvas(win, background="white")
+        canvas.pack(fill="both", expand=True, padx=8)
+        cancel = self._job_cancel_event()
+        state = {"result": None}
+        win.protocol("WM_DELETE_WINDOW", lambda: [cancel.set(), win.destroy()])
+
+        def draw(result):
+            if not win.winfo_exists(): return
+            state["result"] = result
+            canvas.delete("all")
+            cell, cols = 12, max(1, (canvas.winfo_width() - 4) // 12)
+            for i, color in enumerate(region_colors(result)):
+                x, y = 2 + (i % cols) * cell, 2 + (i // cols) * cell
+                canvas.create_rectangle(x, y, x + cell - 1, y + cell - 1, fill=color, outline="")
+            pct = result.scanned_bytes / max(result.total_bytes, 1) * 100
+            speeds = sorted(result.throughput)
+            med = speeds[len(speeds) // 2] if speeds else 0
+            status.config(text=f"{pct:.1f}% | 中位速度 {med:.1f} MB/s | 错误/超时 {len(result.errors)} 处" + (" | 完成" if result.completed else ""))
+
+        def export():
+            if state["result"] is None: return
+            f = filedialog.asksaveasfilename(defaultextension=".json", parent=win)
+            if f:
+                state["result"].export_json(f)
+                self._log(f"表面扫描结果已导出: {f}")
+
+        ttk.Button(win, text="导出 JSON", command=export).pack(pady=6)
+
+        def worker():
+            try:
+                result = scan_surface(target, cancel=cancel, on_progress=lambda r: self.after(0, lambda: draw(r)))
+                self.after(0, lambda: [draw(result), self._log(f"表面扫描结束: {target}, 错误/超时 {len(result.errors)} 处")])
+            except Exception as e:
+                err_msg = str(e)
+                self.after(0, lambda: win.winfo_exists() and status.config(text=f"扫描失败: {err_msg}"))
+        self.pool.submit(worker)
+
+    def _capacity_test(self):
+        try:
+            mp = self._require_mount()
+        except Exception as e:
+            return messagebox.showerror("错误", str(e))
+        resume = False
+        if capacity_test.has_unfinished_test(mp):
+            resume = messagebox.askyesno("扩容检测", "发现未完成的检测，是否继续上次进度？\n(选“否”将重新开始)")
+        else:
+            note = "" if capacity_test.CAN_DROP_CACHE else "\n\n本系统无法绕过读缓存：写入完成后会暂停，需重新插拔 U 盘后再次点击“扩容检测”继续校验。"
+            if not messagebox.askyesno("扩容检测", f"将写满 {mp} 的全部剩余空间并读回校验，耗时较长，确定开始?{note}"):
+                return
         self.progress_var.set(0)
+        self.progress_text.config(text="扩容检测: 写入中...")
+        phase_names = {"write": "写入", "verify": "校验"}
+        last = [0.0]
+        cancel = self._job_cancel_event()
+
+        win = tk.Toplevel(self)
+        win.title(f"扩容检测 - {mp}")
+        win.geometry("360x110")
+        status = ttk.Label(win, text="扩容检测: 写入中...")
+        status.pack(fill="x", padx=10, pady=(10, 5))
+        bar_var = tk.DoubleVar()
+        ttk.Progressbar(win, variable=bar_var, maximum=100).pack(fill="x", padx=10)
+        stop_btn = ttk.Button(win, text="停止（可稍后继续）", command=lambda: [cancel.set(), stop_btn.config(state="disabled"), status.config(text="正在停止...")])
+        stop_btn.pack(pady=6)
+        win.protocol("WM_DELETE_WINDOW", lambda: [cancel.set(), win.destroy()])
+
+        def show(percent, text):
+            self.progress_var.set(percent)
+            self.progress_text.config(text=text)
+            if win.winfo_exists() and not cancel.is_set():
+                bar_var.set(percent)
+                status.config(text=text)
+
+        def on_progress(phase, done, total):
+            now = time.time()
+            if now - last[0] < 0.2 and done < total: return
+            last[0] = now
+            self.after(0, lambda: show(done / max(total, 1) * 100, f"扩容检测: {phase_names[phase]} {done / 1024**3:.2f}/{total / 1024**3:.2f} GB"))
+
+        def finish(r):
+            if win.winfo_exists():
+                win.destroy()
+            if r.needs_replug:
+                self._log(f"扩容检测写入完成: {r.written_bytes / 1024**3:.2f} GB，等待重新插拔后校验", device=mp)
+                self.progress_text.config(text="扩容检测: 等待重新插拔")
+                return messagebox.showinfo("扩容检测", "写入完成。\n为避免读到系统缓存，请安全弹出并重新插入 U 盘，然后再次点击“扩容检测”继续校验。")
+            if not r.completed:
+                self._log("扩容检测已停止，可稍后继续", device=mp)
+                self.progress_text.config(text="扩容检测已停止")
+                return
+            gb = 1024 ** 3
+            verdict = "⚠ 疑似扩容盘!" if r.is_fake else "容量真实"
+            msg = (f"{verdict}\n真实可用: {r.usable_bytes / gb:.2f} GB / 测试 {r.written_bytes / gb:.2f} GB\n"
+                   f"损坏区间: {len(r.corrupted_ranges)} 段\n写入 {r.write_mbps:.1f} MB/s, 读取 {r.read_mbps:.1f} MB/s")
+            self._log("扩容检测结果: " + msg.replace("\n", "; "))
+            self.dashboard.set_health(mp, "疑似扩容" if r.is_fake else "容量真实")
+            self.progress_text.config(text="扩容检测完成")
+            test_dir = os.path.join(mp, capacity_test.TEST_DIRNAME)
+            if messagebox.askyesno("扩容检测结果", msg + "\n\n是否删除测试文件?"):
+                capacity_test.cleanup(mp)
+                self._on_paths_changed(removed=[test_dir])
+            else:
+                # 测试文件留在盘上，按新增登记
+                self._on_paths_changed(added=[test_dir])
+            self._refresh_file_list()
+            self._update_capacity_display()
+
         def worker():
             try:
-                copy_with_progress(src, dst, on_progress=lambda p: self.after(0, lambda: self.progress_var.set(p.bytes_copied/p.total_bytes*100)))
-                self.after(0, lambda: [self._log(f"导出成功: {dst}"), self.progress_text.config(text="完成")])
+                r = capacity_test.run_capacity_test(mp, resume=resume, on_progress=on_progress, cancel=cancel,
+                                                    pause_before_verify=not capacity_test.CAN_DROP_CACHE)
+                self.after(0, lambda: finish(r))
             except Exception as e:
-                self.after(0, lambda: messagebox.showerror("错误", str(e)))
-        threading.Thread(target=worker, daemon=True).start()
+                err_msg = str(e)
+                self.after(0, lambda: [win.winfo_exists() and win.destroy(), self.progress_text.config(text="扩容检测失败"), messagebox.showerror("错误", f"扩容检测失败(可稍后继续):\n{err_msg}")])
+        self.pool.submit(worker)
 
     def _rename_file(self):
         mp = self.selected_usb_mount.get()
         sel = self.file_tree.selection()
         if not sel: return messagebox.showwarning("提示", "请选择一个文件")
-        old_name = self.file_tree.item(sel[0])['values'][0]
+        old_path = sel[0]
+        old_name = os.path.basename(old_path)
         new_name = simpledialog.askstring("重命名", f"请输入 {old_name} 的新名称:", parent=self)
         if new_name:
             try:
-                os.rename(os.path.join(mp, old_name), os.path.join(mp, new_name))
+                new_path = os.path.join(mp, new_name)
+                os.rename(old_path, new_path)
                 self._log(f"重命名成功: {old_name} -> {new_name}")
+                self._on_paths_changed(added=[new_path], removed=[old_path])
                 self._refresh_file_list()
             except Exception as e:
                 messagebox.showerror("重命名失败", str(e))
@@ -108,26 +590,76 @@ class EnhancedApp(App):
         sel = self.file_tree.selection()
         if not sel: return messagebox.showwarning("提示", "请选择至少一个文件")
         if not messagebox.askyesno("确认", f"确定删除选中的 {len(sel)} 个项目吗？"): return
+        removed = []
         for item in sel:
             try:
-                delete_path(mp, self.file_tree.item(item)['values'][0])
+                removed.append(delete_path(mp, os.path.relpath(item, mp)))
             except Exception: pass
+        self._on_paths_changed(removed=removed)
         self._log(f"批量删除结束")
         self._refresh_file_list()
 
     def _safe_eject(self):
         mp = self.selected_usb_mount.get()
         if not mp: return
-        if messagebox.askyesno("安全弹出", f"确定弹出 {mp}?"):
-            threading.Thread(target=lambda: [usb_extensions.safe_eject_drive(mp), self.after(2000, self._refresh_mounts)], daemon=True).start()
-            self._log("正在尝试弹出...")
+        if not messagebox.askyesno("安全弹出", f"确定弹出 {mp}?"): return
+        if os.name == "nt":
+            # 弹出命令返回后再刷新盘符，而不是固定等待
+            self.pool.submit(lambda: [usb_extensions.safe_eject_drive(mp), self.after(0, self._refresh_mounts)])
+            self._log("正在尝试弹出...", device=mp)
+            return
+
+        win = tk.Toplevel(self)
+        win.title("安全弹出")
+        win.geometry("360x110")
+        status = ttk.Label(win, text="正在回写缓存数据...")
+        status.pack(fill="x", padx=10, pady=(10, 5))
+        bar_var = tk.DoubleVar()
+        ttk.Progressbar(win, variable=bar_var, maximum=100).pack(fill="x", padx=10)
+        phase_text = {"flush": "正在回写缓存数据", "unmount": "正在卸载", "power_off": "正在断电"}
+
+        def on_progress(phase, fraction):
+            self.after(0, lambda: [status.config(text=f"{phase_text[phase]}... {fraction * 100:.0f}%"), bar_var.set(fraction * 100)])
+
+        def finish(report):
+            level = "ERROR" if not report.ok else ("WARN" if report.error else "INFO")
+            for line in report.format().splitlines():
+                self._log(line.strip(), level=level, device=mp)
+            if win.winfo_exists():
+                win.destroy()
+            if report.ok:
+                self._notify("warning" if report.error else "info", "安全弹出", report.error or f"{mp} 已可安全拔出")
+            else:
+                messagebox.showerror("弹出失败", report.error)
+            self._refresh_mounts()
+
+        def worker():
+            report = eject_mount(mp, on_progress=on_progress)
+            self.after(0, lambda: finish(report))
+
+        self.pool.submit(worker)
+        self._log("正在回写并弹出...", device=mp)
+
+    def _toggle_trace_recording(self):
+        if self.trace_recorder is None:
+            f = filedialog.asksaveasfilename(title="插拔事件轨迹保存为", defaultextension=".jsonl")
+            if not f: return
+            self.trace_recorder = TraceRecorder(f, forward=self._on_drive_event_from_worker)
+            self.watcher.on_event = self.trace_recorder
+            self.trace_btn.config(text="⏹ 停止录制")
+            self._log(f"开始录制插拔事件: {f}")
+        else:
+            rec, self.trace_recorder = self.trace_recorder, None
+            self.watcher.on_event = self._on_drive_event_from_worker
+            rec.close()
+            self.trace_btn.config(text="⏺ 录制插拔事件")
+            self._log(f"插拔事件录制结束: {rec.count} 个事件 -> {rec.path}")
 
     def _export_log_to_file(self):
-        text = self.log.get("1.0", "end")
-        f = filedialog.asksaveasfilename(defaultextension=".txt")
+        f = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("文本", "*.txt"), ("JSON Lines", "*.jsonl")])
         if f:
-            with open(f, "w", encoding='utf-8') as file: file.write(text)
-            messagebox.showinfo("完成", "日志已导出")
+            n = self.oplog.export(f, as_text=not f.lower().endswith(".jsonl"))
+            messagebox.showinfo("完成", f"日志已导出 ({n} 条)")
 
 if __name__ == "__main__":
     app = EnhancedApp()
@@ -0,0 +1,429 @@
+"""
+simulation.py
+模拟 U 盘后端：不需要真实硬件和 Windows 即可运行 GUI、无界面回放与各拷贝引擎，并测量性能。
+
+- SimBackend：假设备注册表 + 插拔事件源。每个盘是 tmpfs（/dev/shm）下的一个目录，
+  插入/拔出时向已启动的 SimDriveEventWatcher 投递 DriveEvent；
+- 读写垫片：通过 file_ops.set_io_hook 对落在模拟盘上的读写按设备参数限速，
+  并注入每次操作的延迟、周期性卡顿与 I/O 错误（随机数种子固定，结果可复现）；
+- install()：把 storage_monitor / usb_info / usb_extensions / app 中直接访问 WMI、PowerShell 的入口
+  替换为模拟后端，界面与业务代码本身不做修改。
+
+用法：
+    python simulation.py gui --drives 3 --write-mbps 20
+    python simulation.py replay hub16.jsonl --speed 10
+"""
+from __future__ import annotations
+
+import argparse
+import errno
+import os
+import queue
+import random
+import shutil
+import string
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import file_ops
+from storage_monitor import DriveEvent
+
+
+@dataclass
+class SimDeviceSpec:
+    """单个模拟盘的参数。带宽为 0 表示不限速。"""
+    product: str = "Sim USB Flash"
+    vendor_id: str = "0x1d6b"
+    product_id: str = "0x0104"
+    serial: str = "SIM0001"
+    usb_version_bcd: str = "3.0"
+    capacity_bytes: int = 8 * 1024 ** 3
+    read_bps: float = 0.0
+    write_bps: float = 0.0
+    latency_sec: float = 0.0  # 每次读/写/列目录的固定延迟
+    stall_every_bytes: int = 0  # 每传输这么多字节卡顿一次，0 表示不卡顿
+    stall_sec: float = 0.0
+    error_rate: float = 0.0  # 每次读写失败（EIO）的概率
+    fail_after_bytes: int = 0  # 累计传输超过该字节数后所有读写失败，0 表示不启用
+    seed: int = 0
+    files: int = 0  # 插入时预置的文件数（每个 1 KiB 左右）
+
+
+class _SimDevice:
+    """一个已插入的模拟盘及其限速状态。读、写各有一个令牌桶，多线程共享带宽。"""
+
+    def __init__(self, letter: str, mount: str, spec: SimDeviceSpec):
+        self.letter = letter
+        self.mount = mount
+        self.spec = spec
+        self._lock = threading.Lock()
+        self._next_free = {"read": 0.0, "write": 0.0}
+        self._transferred = 0
+        self._next_stall = spec.stall_every_bytes
+        self._rng = random.Random(spec.seed)
+
+    def throttle(self, op: str, nbytes: int) -> None:
+        spec = self.spec
+        with self._lock:
+            if op != "list":
+                if spec.fail_after_bytes and self._transferred >= spec.fail_after_bytes:
+                    raise OSError(errno.EIO, "模拟 I/O 错误（超过 fail_after_bytes）", self.mount)
+                if spec.error_rate and self._rng.random() < spec.error_rate:
+                    raise OSError(errno.EIO, "模拟 I/O 错误", self.mount)
+            now = time.perf_counter()
+            ready = now
+            if op in self._next_free:
+                bps = spec.read_bps if op == "read" else spec.write_bps
+                start = max(now, self._next_free[op])
+                ready = start + (nbytes / bps if bps > 0 else 0.0)
+                self._transferred += nbytes
+                if self._next_stall and self._transferred >= self._next_stall:
+                    ready += spec.stall_sec
+                    self._next_stall += spec.stall_every_bytes
+                self._next_free[op] = ready
+        delay = ready - time.perf_counter() + spec.latency_sec
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _default_root() -> str:
+    shm = "/dev/shm"
+    return tempfile.mkdtemp(prefix="usb_lab_sim_", dir=shm if os.path.isdir(shm) else None)
+
+
+class SimBackend:
+    """
+    模拟设备注册表与插拔事件源。
+
+    与 hotplug_trace.FakeDriveBackend 接口兼容（mount_for / apply / get_removable_drives /
+    list_usb_devices / close），可直接传给 replay_trace 做无界面回放。
+    query_latency_sec 为每次设备枚举的固定延迟，模拟 WMI/PowerShell 查询开销。
+    """
+
+    def __init__(self, default_spec: Optional[SimDeviceSpec] = None, root: Optional[str] = None,
+                 query_latency_sec: float = 0.0):
+        self.root = root or _default_root()
+        self.default_spec = default_spec or SimDeviceSpec()
+        self.query_latency_sec = query_latency_sec
+        self._lock = threading.Lock()
+        self._devices: dict[str, _SimDevice] = {}
+        self._watchers: list["SimDriveEventWatcher"] = []
+        self._free_letters = [f"{c}:" for c in string.ascii_uppercase[3:]]
+
+    # ---- 设备注册表 ----
+
+    def mount_for(self, drive_letter: str) -> str:
+        return os.path.join(self.root, drive_letter.rstrip(":"))
+
+    def _attach(self, spec: SimDeviceSpec, drive_letter: Optional[str]) -> str:
+        with self._lock:
+            if drive_letter is None:
+                drive_letter = next(d for d in self._free_letters if d not in self._devices)
+            mount = self.mount_for(drive_letter)
+            os.makedirs(mount, exist_ok=True)
+            for i in range(spec.files):
+                with open(os.path.join(mount, f"file{i}.txt"), "w") as f:
+                    f.write("x" * (1024 + i))
+            self._devices[drive_letter] = _SimDevice(drive_letter, mount, spec)
+        return drive_letter
+
+    def _detach(self, drive_letter: str) -> bool:
+        with self._lock:
+            dev = self._devices.pop(drive_letter, None)
+        if dev is None:
+            return False
+        shutil.rmtree(dev.mount, ignore_errors=True)
+        return True
+
+    def insert(self, spec: Optional[SimDeviceSpec] = None, drive_letter: Optional[str] = None) -> str:
+        """插入一个模拟盘并投递插入事件，返回盘符。"""
+        drive_letter = self._attach(spec or self.default_spec, drive_letter)
+        self._emit(DriveEvent("inserted", drive_letter))
+        return drive_letter
+
+    def remove(self, drive_letter: str) -> None:
+        if self._detach(drive_letter):
+            self._emit(DriveEvent("removed", drive_letter))
+
+    def apply(self, evt: DriveEvent) -> None:
+        """按事件修改注册表（供 replay_trace 使用）；事件由调用方自行投递，这里不再重复发出。"""
+        if evt.action == "inserted":
+            self._attach(self.default_spec, evt.drive_letter)
+        else:
+            self._detach(evt.drive_letter)
+
+    def eject(self, mount: str, on_progress: Optional[Callable[[str, float], None]] = None, **_kwargs):
+        """替代 eject.eject_mount：模拟盘没有回写与断电，直接移除并报告耗时。"""
+        from eject import EjectReport
+
+        progress = on_progress or (lambda phase, fraction: None)
+        dev = self.device_for_path(mount)
+        report = EjectReport(mount=mount, device=dev.letter if dev else None, phases=["flush", "unmount"])
+        progress("flush", 1.0)
+        t0 = time.perf_counter()
+        if dev is None:
+            report.error = "不是模拟盘"
+            return report
+        self.remove(dev.letter)
+        report.unmount_sec = time.perf_counter() - t0
+        progress("unmount", 1.0)
+        report.ok = True
+        return report
+
+    def device_for_path(self, path: str) -> Optional[_SimDevice]:
+        path = os.path.abspath(path)
+        for dev in list(self._devices.values()):
+            if path == dev.mount or path.startswith(dev.mount + os.sep):
+                return dev
+        return None
+
+    # ---- 替代平台查询的接口 ----
+
+    def get_removable_drives(self) -> list[str]:
+        if self.query_latency_sec:
+            time.sleep(self.query_latency_sec)
+        with self._lock:
+            return sorted(self._devices)
+
+    def list_usb_devices(self, only_storage: bool = True) -> list[dict]:
+        if self.query_latency_sec:
+            time.sleep(self.query_latency_sec)
+        with self._lock:
+            devs = [self._devices[d] for d in sorted(self._devices)]
+        return [
+            {
+                "vendor_id": d.spec.vendor_id,
+                "product_id": d.spec.product_id,
+                "manufacturer": "Simulated",
+                "product": f"{d.spec.product} ({d.letter})",
+                "serial_number": d.spec.serial,
+                "usb_version_bcd": d.spec.usb_version_bcd,
+                "bus": 1,
+                "address": i + 2,
+                "pnp_device_id": f"USB\\VID_{d.spec.vendor_id[2:].upper()}&PID_{d.spec.product_id[2:].upper()}\\{d.spec.serial}",
+                "service": "USBSTOR",
+            }
+            for i, d in enumerate(devs)
+        ]
+
+    def get_disk_space(self, mount_point: str) -> Optional[dict]:
+        """按设备参数中的容量报告空间；不是模拟盘时返回 None。"""
+        dev = self.device_for_path(mount_point)
+        if dev is None:
+            return None
+        used = 0
+        for dirpath, _dirnames, filenames in os.walk(dev.mount):
+            for name in filenames:
+                try:
+                    used += os.path.getsize(os.path.join(dirpath, name))
+                except OSError:
+                    pass
+        total = dev.spec.capacity_bytes
+        free = max(total - used, 0)
+        return {
+            "total_gb": round(total / (1024 ** 3), 2),
+            "free_gb": round(free / (1024 ** 3), 2),
+            "percent": round(used / total * 100, 1) if total else 0,
+            "free_bytes": free,
+        }
+
+    def io_hook(self, op: str, path: str, nbytes: int) -> None:
+        dev = self.device_for_path(path)
+        if dev is not None:
+            dev.throttle(op, nbytes)
+
+    # ---- 插拔事件源 ----
+
+    def _emit(self, evt: DriveEvent) -> None:
+        with self._lock:
+            watchers = list(self._watchers)
+        for w in watchers:
+            w.post(evt)
+
+    def play_trace(self, events: list[tuple[float, DriveEvent]], speed: float = 1.0) -> threading.Thread:
+        """在后台线程中按时间轴执行 hotplug_trace 格式的插拔轨迹。"""
+        def run():
+            t0 = time.perf_counter()
+            for t, evt in events:
+                delay = t0 + t / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                if evt.action == "inserted":
+                    self.insert(drive_letter=evt.drive_letter)
+                else:
+                    self.remove(evt.drive_letter)
+
+        th = threading.Thread(target=run, name="SimTracePlayer", daemon=True)
+        th.start()
+        return th
+
+    def close(self) -> None:
+        with self._lock:
+            self._devices.clear()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+class SimDriveEventWatcher:
+    """与 storage_monitor.WmiDriveEventWatcher 接口一致：事件在独立线程中回调 on_event。"""
+
+    backend: Optional[SimBackend] = None
+
+    def __init__(self, on_event: Callable[[DriveEvent], None]):
+        self.on_event = on_event
+        self._queue: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def post(self, evt: DriveEvent) -> None:
+        self._queue.put(evt)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        if self.backend is not None:
+            with self.backend._lock:
+                self.backend._watchers.append(self)
+        self._thread = threading.Thread(target=self._run, name="SimDriveEventWatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, join_timeout_sec: float = 2.0) -> None:
+        self._stop.set()
+        if self.backend is not None:
+            with self.backend._lock:
+                if self in self.backend._watchers:
+                    self.backend._watchers.remove(self)
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=join_timeout_sec)
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                evt = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            self.on_event(evt)
+
+
+# ---- 替换平台入口 ----
+
+_saved: list[tuple[object, str, object]] = []
+_active: Optional[SimBackend] = None
+
+
+def active() -> Optional[SimBackend]:
+    return _active
+
+
+def install(backend: SimBackend) -> None:
+    """
+    把各模块中访问 WMI / PowerShell / sysfs 的入口替换为 backend，并安装读写垫片。
+    app.py 等通过 from-import 取得的名字也一并替换；须在创建 App 之前调用。
+    """
+    global _active
+    import app
+    import run_enhanced
+    import storage_monitor
+    import usb_extensions
+    import usb_info
+
+    uninstall()
+    SimDriveEventWatcher.backend = backend
+    real_disk_space = usb_extensions.get_disk_space
+
+    def get_disk_space(mount_point: str) -> dict:
+        return backend.get_disk_space(mount_point) or real_disk_space(mount_point)
+
+    def get_removable_drives() -> list[str]:
+        return backend.get_removable_drives()
+
+    def mount_for_drive(drive_letter: str) -> str:
+        return backend.mount_for(drive_letter)
+
+    patches = [
+        (storage_monitor, "get_removable_drives", get_removable_drives),
+        (storage_monitor, "mount_for_drive", mount_for_drive),
+        (storage_monitor, "WmiDriveEventWatcher", SimDriveEventWatcher),
+        (app, "get_removable_drives", get_removable_drives),
+        (app, "mount_for_drive", mount_for_drive),
+        (app, "WmiDriveEventWatcher", SimDriveEventWatcher),
+        (usb_info, "list_usb_devices", backend.list_usb_devices),
+        (app, "list_usb_devices", backend.list_usb_devices),
+        (usb_extensions, "get_enhanced_usb_list", backend.list_usb_devices),
+        (usb_extensions, "safe_eject_drive", lambda mount: backend.eject(mount)),
+        (usb_extensions, "get_disk_space", get_disk_space),
+        (run_enhanced, "eject_mount", backend.eject),
+    ]
+    for module, name, value in patches:
+        _saved.append((module, name, getattr(module, name)))
+        setattr(module, name, value)
+    _saved.append((file_ops, "_io_hook", file_ops.set_io_hook(backend.io_hook)))
+    _active = backend
+
+
+def uninstall() -> None:
+    global _active
+    while _saved:
+        module, name, value = _saved.pop()
+        setattr(module, name, value)
+    SimDriveEventWatcher.backend = None
+    _active = None
+
+
+def spec_from_args(args: argparse.Namespace) -> SimDeviceSpec:
+    mb = 1024 * 1024
+    return SimDeviceSpec(
+        read_bps=args.read_mbps * mb,
+        write_bps=args.write_mbps * mb,
+        latency_sec=args.latency_ms / 1000.0,
+        stall_every_bytes=int(args.stall_every_mb * mb),
+        stall_sec=args.stall_ms / 1000.0,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        files=args.files,
+    )
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="模拟 U 盘后端")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_gui = sub.add_parser("gui", help="在模拟后端上启动增强版界面")
+    p_gui.add_argument("--drives", type=int, default=2)
+    p_replay = sub.add_parser("replay", help="在模拟后端上无界面回放插拔轨迹")
+    p_replay.add_argument("path")
+    p_replay.add_argument("--speed", type=float, default=1.0)
+    for p in (p_gui, p_replay):
+        p.add_argument("--read-mbps", type=float, default=0.0)
+        p.add_argument("--write-mbps", type=float, default=0.0)
+        p.add_argument("--latency-ms", type=float, default=0.0)
+        p.add_argument("--stall-every-mb", type=float, default=0.0)
+        p.add_argument("--stall-ms", type=float, default=0.0)
+        p.add_argument("--error-rate", type=float, default=0.0)
+        p.add_argument("--seed", type=int, default=0)
+        p.add_argument("--files", type=int, default=20)
+        p.add_argument("--query-latency-ms", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    backend = SimBackend(spec_from_args(args), query_latency_sec=args.query_latency_ms / 1000.0)
+    try:
+        if args.cmd == "gui":
+            for _ in range(args.drives):
+                backend.insert()
+            install(backend)
+            from run_enhanced import EnhancedApp
+            EnhancedApp().mainloop()
+        else:
+            from hotplug_trace import load_trace, replay_trace
+            install(backend)
+            print(replay_trace(load_trace(args.path), speed=args.speed, backend=backend).format())
+    finally:
+        uninstall()
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,14 @@ import threading
 from dataclasses import dataclass
 from typing import Callable, Optional
 
-import pythoncom
-import win32com.client
+from usb_transport import removable_mounts
+
+try:
+    import pythoncom
+    import win32com.client
+except ImportError:  # 非 Windows 平台：盘符列表改由 /proc/mounts 与 sysfs 得到，没有插拔事件
+    pythoncom = None
+    win32com = None
 
 
 @dataclass(frozen=True)
@@ -14,11 +20,21 @@ class DriveEvent:
     drive_letter: str  # e.g. "G:"
 
 
+def mount_for_drive(drive_letter: str) -> str:
+    """盘符对应的挂载路径，如 "G:" -> "G:\\"；Linux 上 get_removable_drives 返回的已是挂载点，原样返回。"""
+    if len(drive_letter) == 2 and drive_letter[1] == ":":
+        return drive_letter + "\\"
+    return drive_letter
+
+
 def get_removable_drives() -> list[str]:
     """
     WMI 查询当前可移动盘（DriveType=2）
     返回如 ["G:", "H:"]（不带反斜杠）
+    没有 pywin32 时（Linux）返回可移动块设备的挂载点，如 ["/media/user/USB"]。
     """
+    if pythoncom is None:
+        return removable_mounts()
     pythoncom.CoInitialize()
     try:
         wmi = win32com.client.GetObject("winmgmts:")
@@ -48,6 +64,9 @@ class WmiDriveEventWatcher:
         self._watcher = None
 
     def start(self) -> None:
+        if pythoncom is None:
+            # 没有 WMI 时不监听插拔，靠“刷新U盘列表”手动刷新
+            return
         if self._thread and self._thread.is_alive():
             return
         self._stop.clear()
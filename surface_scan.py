@@ -0,0 +1,218 @@
+"""
+surface_scan.py
+全盘表面读扫描：按大块对齐顺序读取整个块设备或镜像文件，
+记录每个区域的吞吐与延迟，以及读错误/超时的偏移，用于淘汰即将损坏的 U 盘。
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import threading
+import time
+from array import array
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from file_ops import get_io_hook
+
+_ALIGN = 4096
+
+
+@dataclass
+class ScanError:
+    offset: int
+    length: int
+    kind: str  # "error" | "timeout"
+    message: str
+
+
+@dataclass
+class SurfaceScanResult:
+    path: str
+    total_bytes: int
+    region_size: int
+    direct_io: bool
+    # 每个区域一个值：平均吞吐 MB/s、最大单次读延迟 ms
+    throughput: array = field(default_factory=lambda: array("f"))
+    max_latency_ms: array = field(default_factory=lambda: array("f"))
+    errors: list[ScanError] = field(default_factory=list)
+    elapsed_sec: float = 0.0
+    completed: bool = False
+
+    @property
+    def scanned_bytes(self) -> int:
+        return min(len(self.throughput) * self.region_size, self.total_bytes)
+
+    def bad_regions(self) -> set[int]:
+        return {e.offset // self.region_size for e in self.errors}
+
+    def to_dict(self) -> dict:
+        return {
+            "path": self.path,
+            "total_bytes": self.total_bytes,
+            "region_size": self.region_size,
+            "direct_io": self.direct_io,
+            "elapsed_sec": round(self.elapsed_sec, 3),
+            "completed": self.completed,
+            "throughput_mbps": [round(v, 2) for v in self.throughput],
+            "max_latency_ms": [round(v, 2) for v in self.max_latency_ms],
+            "errors": [e.__dict__ for e in self.errors],
+        }
+
+    def export_json(self, json_path: str) -> None:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+
+
+def _open_for_scan(path: str) -> tuple[int, bool]:
+    """以只读方式打开；Linux 下优先 O_DIRECT 绕过页缓存，失败则普通打开。"""
+    flags = os.O_RDONLY | getattr(os, "O_BINARY", 0)
+    if hasattr(os, "O_DIRECT"):
+        try:
+            return os.open(path, flags | os.O_DIRECT), True
+        except OSError:
+            pass
+    return os.open(path, flags), False
+
+
+_IOCTL_DISK_GET_LENGTH_INFO = 0x7405C
+
+
+def _windows_volume_size(fd: int) -> int:
+    """Windows 卷句柄（\\.\G:）上 lseek 取不到大小，改用 IOCTL_DISK_GET_LENGTH_INFO 查询。"""
+    import ctypes
+    import msvcrt
+    from ctypes import wintypes
+
+    length = ctypes.c_longlong(0)
+    returned = wintypes.DWORD(0)
+    ok = ctypes.windll.kernel32.DeviceIoControl(
+        wintypes.HANDLE(msvcrt.get_osfhandle(fd)), _IOCTL_DISK_GET_LENGTH_INFO, None, 0,
+        ctypes.byref(length), ctypes.sizeof(length), ctypes.byref(returned), None)
+    if not ok:
+        raise ctypes.WinError()
+    return length.value
+
+
+def _device_size(fd: int) -> int:
+    size = os.lseek(fd, 0, os.SEEK_END)
+    os.lseek(fd, 0, os.SEEK_SET)
+    if size == 0 and os.name == "nt":
+        size = _windows_volume_size(fd)
+    if size <= 0:
+        # 大小为 0 时扫描循环一次也不执行却会报告"完成"，必须当作错误
+        raise OSError("无法获取设备大小，拒绝扫描")
+    return size
+
+
+def scan_surface(
+        path: str,
+        chunk_size: int = 4 * 1024 * 1024,
+        region_size: int = 64 * 1024 * 1024,
+        timeout_ms: float = 2000.0,
+        on_progress: Optional[Callable[[SurfaceScanResult], None]] = None,
+        cancel: Optional[threading.Event] = None,
+        read_hook: Optional[Callable[[int, int], None]] = None,
+) -> SurfaceScanResult:
+    """
+    顺序读取 path（块设备如 /dev/sdb、\\\\.\\G:，或镜像文件）的全部内容。
+
+    chunk_size 为单次读取大小（按 4 KiB 对齐），region_size 为统计粒度（须为 chunk_size 的整数倍）。
+    单次读取超过 timeout_ms 记为 "timeout"，读取失败记为 "error" 并跳过该块继续。
+    read_hook(offset, length) 在每次读取前调用，可用于测试时注入延迟或抛出 OSError；
+    file_ops 的全局 I/O 钩子同样在每次读取前调用，两者抛出的 OSError 都记为读错误。
+    每完成一个区域回调一次 on_progress。
+    """
+    chunk_size = max(_ALIGN, chunk_size // _ALIGN * _ALIGN)
+    region_size = max(chunk_size, region_size // chunk_size * chunk_size)
+
+    fd, direct = _open_for_scan(path)
+    # mmap 分配的缓冲区按页对齐，满足 O_DIRECT 的要求
+    buf = mmap.mmap(-1, chunk_size)
+    try:
+        total = _device_size(fd)
+        result = SurfaceScanResult(path=path, total_bytes=total, region_size=region_size, direct_io=direct)
+        use_preadv = hasattr(os, "preadv")
+        io_hook = get_io_hook()
+        fadvise = getattr(os, "posix_fadvise", None) if not direct else None
+
+        t_start = time.perf_counter()
+        offset = 0
+        while offset < total:
+            if cancel is not None and cancel.is_set():
+                break
+            region_end = min(offset + region_size, total)
+            region_start = offset
+            region_time = 0.0
+            region_max = 0.0
+
+            while offset < region_end:
+                length = min(chunk_size, region_end - offset)
+                t0 = time.perf_counter()
+                try:
+                    if read_hook is not None:
+                        read_hook(offset, length)
+                    if io_hook is not None:
+                        io_hook("read", path, length)
+                    if use_preadv:
+                        n = os.preadv(fd, [buf], offset)
+                    else:
+                        os.lseek(fd, offset, os.SEEK_SET)
+                        n = os.readv(fd, [buf]) if hasattr(os, "readv") else len(os.read(fd, chunk_size))
+                    if n <= 0:
+                        raise OSError(f"意外的文件结尾 @ {offset}")
+                    n = min(n, length)
+                except OSError as e:
+                    n = length
+                    result.errors.append(ScanError(offset, length, "error", str(e)))
+                latency = time.perf_counter() - t0
+                if latency * 1000 > timeout_ms:
+                    result.errors.append(ScanError(offset, n, "timeout", f"读取耗时 {latency * 1000:.0f} ms"))
+                if fadvise is not None:
+                    fadvise(fd, offset, n, os.POSIX_FADV_DONTNEED)
+                region_time += latency
+                region_max = max(region_max, latency)
+                offset += n
+
+            mb = (offset - region_start) / (1024 * 1024)
+            result.throughput.append(mb / max(region_time, 1e-9))
+            result.max_latency_ms.append(region_max * 1000)
+            result.elapsed_sec = time.perf_counter() - t_start
+            if on_progress:
+                on_progress(result)
+
+        result.completed = offset >= total
+        result.elapsed_sec = time.perf_counter() - t_start
+        return result
+    finally:
+        buf.close()
+        os.close(fd)
+
+
+def region_colors(result: SurfaceScanResult) -> list[str]:
+    """
+    把每个区域映射为热力图颜色：有错误为红色，超时为橙色，
+    其余按吞吐相对中位数的比例从黄（慢）到绿（正常）。
+    """
+    values = sorted(result.throughput)
+    median = values[len(values) // 2] if values else 0.0
+    kinds: dict[int, str] = {}
+    for e in result.errors:
+        idx = e.offset // result.region_size
+        if kinds.get(idx) != "error":
+            kinds[idx] = e.kind
+
+    colors = []
+    for i, v in enumerate(result.throughput):
+        kind = kinds.get(i)
+        if kind == "error":
+            colors.append("#d62728")
+        elif kind == "timeout":
+            colors.append("#ff7f0e")
+        else:
+            ratio = min(v / median, 1.0) if median > 0 else 1.0
+            red = int(255 * (1 - ratio) + 44 * ratio)
+            green = int(200 * (1 - ratio) + 160 * ratio)
+            colors.append(f"#{red:02x}{green:02x}2c")
+    return colors
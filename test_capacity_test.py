@@ -0,0 +1,85 @@
+"""capacity_test 的测试数据生成与校验。"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+
+import pytest
+
+import capacity_test
+import usb_extensions
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def fake_mount(tmp_path, monkeypatch):
+    """把一个临时目录当作剩余 12 MiB 的 U 盘，测试文件每个 4 MiB。"""
+    monkeypatch.setattr(usb_extensions, "get_disk_space", lambda mount: {"free_bytes": 12 * MB + capacity_test.RESERVE_BYTES})
+    monkeypatch.setattr(capacity_test, "FILE_SIZE", 4 * MB)
+    monkeypatch.setattr(capacity_test, "CHUNK_SIZE", 1 * MB)
+    return str(tmp_path)
+
+
+def test_pattern_is_deterministic_and_offset_bound():
+    a = capacity_test.pattern_chunk(0, 64 * 1024, seed=1)
+    assert a == capacity_test.pattern_chunk(0, 64 * 1024, seed=1)
+    assert a != capacity_test.pattern_chunk(0, 64 * 1024, seed=2)
+    sectors = {a[i:i + capacity_test.SECTOR] for i in range(0, len(a), capacity_test.SECTOR)}
+    # 每个扇区都带有自己的扇区号，内容互不相同
+    assert len(sectors) == len(a) // capacity_test.SECTOR
+
+
+def test_pattern_slices_agree_across_chunk_boundaries():
+    whole = capacity_test.pattern_chunk(4096, 8192, seed=7)
+    assert capacity_test.pattern_chunk(4096 + 512, 8192 - 512, seed=7) == whole[512:]
+    # 非扇区对齐的偏移与长度（写入空间不足时的最后一个文件）
+    assert capacity_test.pattern_chunk(4096 + 8, 1000, seed=7) == whole[8:1008]
+
+
+def test_genuine_drive_passes(fake_mount):
+    report = capacity_test.run_capacity_test(fake_mount, resume=False, seed=42)
+    assert report.completed
+    assert not report.is_fake
+    assert report.written_bytes == 12 * MB
+    assert report.verified_bytes == report.written_bytes
+    assert not capacity_test.has_unfinished_test(fake_mount)
+
+
+def test_wrapped_writes_are_detected(fake_mount):
+    report = capacity_test.run_capacity_test(fake_mount, resume=False, seed=42, pause_before_verify=True)
+    assert report.needs_replug
+    test_dir = os.path.join(fake_mount, capacity_test.TEST_DIRNAME)
+    # 模拟假容量盘：第 3 个文件的位置实际回绕到了盘的开头
+    shutil.copyfile(os.path.join(test_dir, "00000.bin"), os.path.join(test_dir, "00002.bin"))
+
+    report = capacity_test.run_capacity_test(fake_mount, resume=True)
+    assert report.completed
+    assert report.is_fake
+    assert report.usable_bytes == 8 * MB
+    assert report.corrupted_ranges == [(8 * MB, 12 * MB)]
+
+
+def test_single_corrupted_sector_is_located(fake_mount):
+    capacity_test.run_capacity_test(fake_mount, resume=False, seed=3, pause_before_verify=True)
+    path = os.path.join(fake_mount, capacity_test.TEST_DIRNAME, "00001.bin")
+    with open(path, "r+b") as f:
+        f.seek(5 * capacity_test.SECTOR + 100)
+        f.write(b"\xff")
+    report = capacity_test.run_capacity_test(fake_mount, resume=True)
+    start = 4 * MB + 5 * capacity_test.SECTOR
+    assert report.corrupted_ranges == [(start, start + capacity_test.SECTOR)]
+
+
+def test_state_from_older_pattern_is_not_resumed(fake_mount):
+    capacity_test.run_capacity_test(fake_mount, resume=False, seed=5, pause_before_verify=True)
+    state_path = os.path.join(fake_mount, capacity_test.TEST_DIRNAME, capacity_test.STATE_FILENAME)
+    with open(state_path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    state.pop("pattern")
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    assert not capacity_test.has_unfinished_test(fake_mount)
+    report = capacity_test.run_capacity_test(fake_mount, resume=True, seed=6)
+    assert report.completed and not report.is_fake
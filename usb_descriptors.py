@@ -0,0 +1,297 @@
+"""
+usb_descriptors.py
+USB 标准描述符解析：直接解码 Linux sysfs 中 /sys/bus/usb/devices/*/descriptors 的原始字节
+（设备描述符 + 全部配置描述符，小端序），得到真实的 bcdUSB、各端点最大包长、SuperSpeed 伴随描述符等。
+
+解析使用预编译的 struct 布局；结果按描述符字节的哈希缓存，相同设备重复枚举时不再解析。
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+SYSFS_USB_DEVICES = "/sys/bus/usb/devices"
+
+# 描述符类型
+DT_DEVICE = 0x01
+DT_CONFIG = 0x02
+DT_INTERFACE = 0x04
+DT_ENDPOINT = 0x05
+DT_SS_ENDPOINT_COMPANION = 0x30
+
+USB_CLASS_MASS_STORAGE = 0x08
+
+_DEVICE = struct.Struct("<BBHBBBBHHHBBBB")      # 18 字节
+_CONFIG = struct.Struct("<BBHBBBBB")            # 9 字节
+_INTERFACE = struct.Struct("<BBBBBBBBB")        # 9 字节
+_ENDPOINT = struct.Struct("<BBBBHB")            # 7 字节
+_SS_COMPANION = struct.Struct("<BBBBH")         # 6 字节
+
+_TRANSFER_TYPES = ("control", "isochronous", "bulk", "interrupt")
+
+
+class DescriptorError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class EndpointDescriptor:
+    address: int
+    attributes: int
+    max_packet_size: int
+    interval: int
+    # SuperSpeed 端点伴随描述符（USB 3.x 设备才有）
+    ss_max_burst: Optional[int] = None
+    ss_attributes: Optional[int] = None
+    ss_bytes_per_interval: Optional[int] = None
+
+    @property
+    def direction(self) -> str:
+        return "in" if self.address & 0x80 else "out"
+
+    @property
+    def number(self) -> int:
+        return self.address & 0x0F
+
+    @property
+    def transfer_type(self) -> str:
+        return _TRANSFER_TYPES[self.attributes & 0x03]
+
+
+@dataclass(frozen=True)
+class InterfaceDescriptor:
+    number: int
+    alternate: int
+    interface_class: int
+    interface_subclass: int
+    interface_protocol: int
+    endpoints: tuple[EndpointDescriptor, ...]
+
+
+@dataclass(frozen=True)
+class ConfigDescriptor:
+    value: int
+    attributes: int
+    max_power_raw: int  # 单位：USB 2.0 为 2mA，SuperSpeed 为 8mA
+    interfaces: tuple[InterfaceDescriptor, ...]
+
+
+@dataclass(frozen=True)
+class DeviceDescriptor:
+    bcd_usb: int
+    device_class: int
+    device_subclass: int
+    device_protocol: int
+    max_packet_size0: int
+    vendor_id: int
+    product_id: int
+    bcd_device: int
+    num_configurations: int
+    configurations: tuple[ConfigDescriptor, ...]
+
+    @property
+    def usb_version(self) -> str:
+        """bcdUSB 的常见写法，如 0x0320 -> "3.20"。"""
+        return f"{self.bcd_usb >> 8:x}.{self.bcd_usb & 0xFF:02x}"
+
+    def interfaces(self) -> list[InterfaceDescriptor]:
+        return [i for c in self.configurations for i in c.interfaces]
+
+    def is_mass_storage(self) -> bool:
+        return self.device_class == USB_CLASS_MASS_STORAGE or any(
+            i.interface_class == USB_CLASS_MASS_STORAGE for i in self.interfaces())
+
+
+def _parse_config(blob: bytes, offset: int) -> tuple[ConfigDescriptor, int]:
+    """从 offset 处解析一个配置描述符及其下属描述符，返回 (配置, 下一个配置的偏移)。"""
+    if offset + _CONFIG.size > len(blob):
+        raise DescriptorError(f"配置描述符被截断 @ {offset}")
+    b_len, b_type, total_len, _num_if, value, _i_cfg, attrs, max_power = _CONFIG.unpack_from(blob, offset)
+    if b_type != DT_CONFIG or b_len < _CONFIG.size:
+        raise DescriptorError(f"不是配置描述符 @ {offset}")
+    end = min(offset + total_len, len(blob))
+
+    interfaces: list[InterfaceDescriptor] = []
+    cur_if: Optional[list] = None
+    endpoints: list[EndpointDescriptor] = []
+
+    def close_interface():
+        if cur_if is not None:
+            interfaces.append(InterfaceDescriptor(*cur_if, endpoints=tuple(endpoints)))
+
+    pos = offset + b_len
+    while pos + 2 <= end:
+        d_len = blob[pos]
+        d_type = blob[pos + 1]
+        if d_len < 2 or pos + d_len > end:
+            raise DescriptorError(f"描述符长度非法 @ {pos}")
+        if d_type == DT_INTERFACE and d_len >= _INTERFACE.size:
+            close_interface()
+            _, _, number, alt, _n_ep, cls, sub, proto, _i_if = _INTERFACE.unpack_from(blob, pos)
+            cur_if = [number, alt, cls, sub, proto]
+            endpoints = []
+        elif d_type == DT_ENDPOINT and d_len >= _ENDPOINT.size:
+            _, _, address, ep_attrs, max_packet, interval = _ENDPOINT.unpack_from(blob, pos)
+            # wMaxPacketSize 的 bit 11-12 为高速高带宽端点的附加事务数，只取包长部分
+            endpoints.append(EndpointDescriptor(address, ep_attrs, max_packet & 0x07FF, interval))
+        elif d_type == DT_SS_ENDPOINT_COMPANION and d_len >= _SS_COMPANION.size and endpoints:
+            _, _, burst, ss_attrs, bytes_per_interval = _SS_COMPANION.unpack_from(blob, pos)
+            ep = endpoints[-1]
+            endpoints[-1] = EndpointDescriptor(ep.address, ep.attributes, ep.max_packet_size, ep.interval,
+                                               burst, ss_attrs, bytes_per_interval)
+        # 其他类型（接口关联、类特定描述符等）跳过
+        pos += d_len
+    close_interface()
+
+    return ConfigDescriptor(value, attrs, max_power, tuple(interfaces)), offset + max(total_len, b_len)
+
+
+def _parse(blob: bytes) -> DeviceDescriptor:
+    if len(blob) < _DEVICE.size:
+        raise DescriptorError("设备描述符长度不足 18 字节")
+    (b_len, b_type, bcd_usb, cls, sub, proto, mps0, vid, pid, bcd_dev,
+     _i_mfr, _i_prod, _i_serial, num_cfg) = _DEVICE.unpack_from(blob, 0)
+    if b_type != DT_DEVICE or b_len != _DEVICE.size:
+        raise DescriptorError("不是设备描述符")
+
+    configs = []
+    offset = b_len
+    while offset + _CONFIG.size <= len(blob) and len(configs) < num_cfg:
+        cfg, offset = _parse_config(blob, offset)
+        configs.append(cfg)
+    return DeviceDescriptor(bcd_usb, cls, sub, proto, mps0, vid, pid, bcd_dev, num_cfg, tuple(configs))
+
+
+_CACHE_MAX = 4096
+_cache: "OrderedDict[bytes, DeviceDescriptor]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def parse_descriptors(blob: bytes) -> DeviceDescriptor:
+    """解析 sysfs descriptors 文件内容（带 LRU 缓存，键为描述符字节的 BLAKE2b 摘要）。"""
+    key = hashlib.blake2b(blob, digest_size=16).digest()
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+            return hit
+    desc = _parse(blob)
+    with _cache_lock:
+        _cache[key] = desc
+        if len(_cache) > _CACHE_MAX:
+            _cache.popitem(last=False)
+    return desc
+
+
+def clear_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
+
+
+def _read_attr(dev_dir: str, name: str) -> Optional[str]:
+    try:
+        with open(os.path.join(dev_dir, name), "r", encoding="utf-8", errors="replace") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def list_sysfs_usb_devices(only_storage: bool = True, root: str = SYSFS_USB_DEVICES) -> List[Dict[str, Any]]:
+    """
+    Linux：从 sysfs 枚举 USB 设备，返回与 usb_extensions.get_enhanced_usb_list 相同结构的字典，
+    其中 usb_version_bcd / bus / address 为描述符与内核提供的真实值。
+    """
+    devices: List[Dict[str, Any]] = []
+    try:
+        names = sorted(os.listdir(root))
+    except OSError:
+        return devices
+
+    for name in names:
+        # 形如 "1-1.2:1.0" 的是接口节点，只处理设备节点
+        if ":" in name:
+            continue
+        dev_dir = os.path.join(root, name)
+        try:
+            with open(os.path.join(dev_dir, "descriptors"), "rb") as f:
+                blob = f.read()
+            desc = parse_descriptors(blob)
+        except (OSError, DescriptorError):
+            continue
+        if only_storage and not desc.is_mass_storage():
+            continue
+
+        busnum = _read_attr(dev_dir, "busnum")
+        devnum = _read_attr(dev_dir, "devnum")
+        speed = _read_attr(dev_dir, "speed")
+        bulk = [ep for i in desc.interfaces() for ep in i.endpoints if ep.transfer_type == "bulk"]
+        devices.append({
+            "vendor_id": f"0x{desc.vendor_id:04x}",
+            "product_id": f"0x{desc.product_id:04x}",
+            "manufacturer": _read_attr(dev_dir, "manufacturer"),
+            "product": _read_attr(dev_dir, "product"),
+            "serial_number": _read_attr(dev_dir, "serial"),
+            "usb_version_bcd": desc.usb_version,
+            "bus": int(busnum) if busnum and busnum.isdigit() else None,
+            "address": int(devnum) if devnum and devnum.isdigit() else None,
+            "pnp_device_id": name,
+            "speed_mbps": speed,
+            "max_packet_size0": desc.max_packet_size0,
+            "bulk_max_packet_size": max((ep.max_packet_size for ep in bulk), default=None),
+            "ss_max_burst": max((ep.ss_max_burst for ep in bulk if ep.ss_max_burst is not None), default=None),
+        })
+    return devices
+
+
+def _synthetic_blob(seed: int) -> bytes:
+    """构造一个 USB 3.x 大容量存储设备（BOT + UAS 备用接口）的描述符，用于基准测试。"""
+    eps_bot = [(0x81, 2, 1024, 0), (0x02, 2, 1024, 0)]
+    body = b""
+    for alt, eps, proto in ((0, eps_bot, 0x50), (1, eps_bot + [(0x83, 2, 1024, 0), (0x04, 2, 1024, 0)], 0x62)):
+        body += _INTERFACE.pack(9, DT_INTERFACE, 0, alt, len(eps), USB_CLASS_MASS_STORAGE, 0x06, proto, 0)
+        for addr, attrs, mps, interval in eps:
+            body += _ENDPOINT.pack(7, DT_ENDPOINT, addr, attrs, mps, interval)
+            body += _SS_COMPANION.pack(6, DT_SS_ENDPOINT_COMPANION, 15, 0, 0)
+    config = _CONFIG.pack(9, DT_CONFIG, 9 + len(body), 1, 1, 0, 0x80, 112) + body
+    device = _DEVICE.pack(18, DT_DEVICE, 0x0320, 0, 0, 0, 9, 0x0781, seed & 0xFFFF, 0x0100, 1, 2, 3, 1)
+    return device + config
+
+
+def benchmark(blobs: List[bytes]) -> Dict[str, float]:
+    """冷（无缓存）与热（命中缓存）解析的耗时，单位微秒/个。"""
+    cold = warm = 0.0
+    for b in blobs:
+        # 每个描述符先清空缓存再解析，保证冷计时不受重复样本或缓存容量影响
+        clear_cache()
+        t0 = time.perf_counter()
+        parse_descriptors(b)
+        t1 = time.perf_counter()
+        parse_descriptors(b)
+        t2 = time.perf_counter()
+        cold += t1 - t0
+        warm += t2 - t1
+    clear_cache()
+    n = max(len(blobs), 1)
+    return {"count": len(blobs), "cold_us": cold / n * 1e6, "warm_us": warm / n * 1e6}
+
+
+if __name__ == "__main__":
+    import sys
+
+    # 用法：python usb_descriptors.py [抓取的描述符文件目录]
+    if len(sys.argv) > 1:
+        captured = []
+        for fn in sorted(os.listdir(sys.argv[1])):
+            with open(os.path.join(sys.argv[1], fn), "rb") as f:
+                captured.append(f.read())
+        blobs = [captured[i % len(captured)] for i in range(10000)] if captured else []
+    else:
+        blobs = [_synthetic_blob(i) for i in range(10000)]
+    r = benchmark(blobs)
+    print(f"解析 {r['count']} 个描述符：冷 {r['cold_us']:.2f} us/个，热 {r['warm_us']:.2f} us/个")
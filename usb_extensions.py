@@ -9,6 +9,8 @@ import json
 import re
 from typing import List, Dict, Any
 
+import usb_descriptors
+
 
 def get_disk_space(mount_point: str) -> dict:
     try:
@@ -16,10 +18,11 @@ def get_disk_space(mount_point: str) -> dict:
         return {
             'total_gb': round(usage.total / (1024**3), 2),
             'free_gb': round(usage.free / (1024**3), 2),
-            'percent': round((usage.used / usage.total) * 100, 1)
+            'percent': round((usage.used / usage.total) * 100, 1),
+            'free_bytes': usage.free
         }
     except Exception:
-        return {'total_gb': 0, 'free_gb': 0, 'percent': 0}
+        return {'total_gb': 0, 'free_gb': 0, 'percent': 0, 'free_bytes': 0}
 
 
 def safe_eject_drive(drive_letter: str):
@@ -30,6 +33,9 @@ def safe_eject_drive(drive_letter: str):
 
 
 def get_enhanced_usb_list(only_storage: bool = True) -> List[Dict[str, Any]]:
+    # Linux：直接解析 sysfs 中的原始描述符，bcdUSB / bus / address 为真实值
+    if os.name != "nt":
+        return usb_descriptors.list_sysfs_usb_devices(only_storage=only_storage)
  
     ps_script = r"""
 $ErrorActionPreference = 'Stop';
@@ -0,0 +1,107 @@
+"""
+usb_transport.py
+识别 U 盘所用的 USB 存储传输协议，据此选择批量导出的读取并发度。
+
+- usb-storage（BOT，Bulk-Only Transport）：同一时刻只能有一个命令在途，并行读取只会互相打断顺序流；
+- uas（USB Attached SCSI）：支持多个未完成命令，并行读取可以填满设备队列。
+
+通过 sysfs 中块设备祖先节点的 driver 链接判断，并读取 SCSI 设备的 queue_depth。
+"""
+from __future__ import annotations
+
+import os
+import sys
+from dataclasses import dataclass
+from typing import Optional
+
+from diskstats import PROC_MOUNTS, SYS_CLASS_BLOCK, block_device_for_mount, iter_block_mounts, parent_disk
+
+# UAS 设备的并发上限：再多也只是增加线程切换，USB 总线带宽先成为瓶颈
+MAX_UAS_CONCURRENCY = 8
+# 无法识别（Windows、非 USB 盘等）时的保守取值
+DEFAULT_CONCURRENCY = 2
+
+
+@dataclass(frozen=True)
+class TransportInfo:
+    device: Optional[str]
+    transport: str  # "uas" | "usb-storage" | "unknown"
+    queue_depth: int
+
+    @property
+    def concurrency(self) -> int:
+        return recommended_concurrency(self.transport, self.queue_depth)
+
+
+def recommended_concurrency(transport: str, queue_depth: int) -> int:
+    if transport == "usb-storage":
+        return 1
+    if transport == "uas":
+        return max(1, min(queue_depth or MAX_UAS_CONCURRENCY, MAX_UAS_CONCURRENCY))
+    return DEFAULT_CONCURRENCY
+
+
+def _read_int(path: str) -> int:
+    try:
+        with open(path, "r", encoding="ascii") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return 0
+
+
+def detect_transport(dev: str, sys_root: str = SYS_CLASS_BLOCK) -> TransportInfo:
+    """根据块设备名（分区或整盘）识别传输协议。"""
+    disk = parent_disk(dev, sys_root)
+    node = os.path.realpath(os.path.join(sys_root, disk))
+    queue_depth = _read_int(os.path.join(sys_root, disk, "device", "queue_depth"))
+
+    # 自块设备向上查找第一个由 USB 存储驱动绑定的接口
+    while node and node != os.path.dirname(node):
+        driver = os.path.join(node, "driver")
+        if os.path.islink(driver):
+            name = os.path.basename(os.readlink(driver))
+            if name in ("uas", "usb-storage"):
+                return TransportInfo(disk, name, queue_depth)
+        node = os.path.dirname(node)
+    return TransportInfo(disk, "unknown", queue_depth)
+
+
+def is_removable(dev: str, sys_root: str = SYS_CLASS_BLOCK) -> bool:
+    """
+    块设备是否为可移动盘：内核标记 removable，或挂在 USB 存储驱动下。
+    后者覆盖 removable=0 的 USB 移动硬盘和部分读卡器。
+    """
+    disk = parent_disk(dev, sys_root)
+    if _read_int(os.path.join(sys_root, disk, "removable")) == 1:
+        return True
+    return detect_transport(dev, sys_root).transport != "unknown"
+
+
+def removable_mounts(mounts_path: str = PROC_MOUNTS, sys_root: str = SYS_CLASS_BLOCK) -> list[str]:
+    """Linux：当前已挂载的可移动盘挂载点，按 /proc/mounts 中的顺序，同一挂载点只出现一次。"""
+    mounts: list[str] = []
+    for dev, mnt in iter_block_mounts(mounts_path):
+        if mnt not in mounts and is_removable(dev, sys_root):
+            mounts.append(mnt)
+    return mounts
+
+
+def transport_for_mount(mount: str, mounts_path: str = PROC_MOUNTS,
+                        sys_root: str = SYS_CLASS_BLOCK) -> TransportInfo:
+    dev = block_device_for_mount(mount, mounts_path) if os.name != "nt" else None
+    if dev is None:
+        return TransportInfo(None, "unknown", 0)
+    return detect_transport(dev, sys_root)
+
+
+if __name__ == "__main__":
+    from file_ops import benchmark_export_concurrency
+
+    if len(sys.argv) < 4:
+        print("用法: python usb_transport.py <U盘挂载点> <电脑上的临时目录> <要导出的文件或目录>...")
+        sys.exit(1)
+    info = transport_for_mount(sys.argv[1])
+    print(f"设备: {info.device or '--'}  协议: {info.transport}  queue_depth: {info.queue_depth}"
+          f"  建议并发: {info.concurrency}")
+    for row in benchmark_export_concurrency(sys.argv[3:], sys.argv[2]):
+        print(f"并发 {row['concurrency']:>2}: {row['mbps']:8.2f} MB/s  {row['files']} 个文件  耗时 {row['seconds']:.2f}s")
@@ -0,0 +1,405 @@
+"""
+volume_index.py
+U 盘卷索引：
+- HashCache：保存在卷根目录下的隐藏文件中，缓存文件内容哈希，
+  以 (相对路径, 大小, mtime) 为键，文件未变化时无需重新读取；
+- VolumeIndex：整卷路径的内存索引，支持文件名/扩展名/大小/时间快速搜索。
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, Optional
+
+INDEX_FILENAME = ".usb_lab_index.json"
+
+
+class HashCache:
+    """
+    内容哈希缓存。kind 区分哈希类型（如 "partial" 只哈希文件头部、"full" 全文件）。
+    文件大小或 mtime 变化后，旧记录自然失效（键不再匹配）。
+    """
+
+    def __init__(self, volume_root: str):
+        self.volume_root = volume_root
+        self.index_path = os.path.join(volume_root, INDEX_FILENAME)
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        self._dirty = False
+
+    def _key(self, path: str) -> str:
+        return os.path.relpath(path, self.volume_root).replace(os.sep, "/")
+
+    def load(self) -> "HashCache":
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._entries = data.get("hashes", {})
+        except (OSError, ValueError):
+            self._entries = {}
+        return self
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": 1, "hashes": self._entries}
+            tmp = self.index_path + ".tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp, self.index_path)
+                self._dirty = False
+            except OSError:
+                # 只读介质等情况下缓存写不进去，不影响本次结果
+                pass
+
+    def get(self, path: str, size: int, mtime_ns: int, kind: str) -> Optional[str]:
+        with self._lock:
+            rec = self._entries.get(self._key(path))
+        if not rec or rec.get("size") != size or rec.get("mtime_ns") != mtime_ns:
+            return None
+        return rec.get(kind)
+
+    def put(self, path: str, size: int, mtime_ns: int, kind: str, digest: str) -> None:
+        key = self._key(path)
+        with self._lock:
+            rec = self._entries.get(key)
+            if not rec or rec.get("size") != size or rec.get("mtime_ns") != mtime_ns:
+                rec = {"size": size, "mtime_ns": mtime_ns}
+                self._entries[key] = rec
+            rec[kind] = digest
+            self._dirty = True
+
+
+@dataclass
+class IndexEntry:
+    path: str  # 相对卷根目录，"/" 分隔
+    size: int
+    mtime: float
+    is_dir: bool
+
+
+_SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+_SIZE_TOKEN_RE = re.compile(r"^size([<>])(\d+(?:\.\d+)?)([BKMG]?)$", re.IGNORECASE)
+
+
+def parse_query(text: str) -> dict:
+    """
+    把搜索框中的文本解析为 VolumeIndex.search 的关键字参数。
+
+    支持：ext:.mp4  prefix:IMG_  size>10M  size<1G  after:2024-01-01  before:2024-12-31
+    其余词作为子串（多个词以空格连接）。
+    """
+    kwargs: dict = {}
+    words = []
+    for tok in text.split():
+        low = tok.lower()
+        m = _SIZE_TOKEN_RE.match(tok)
+        if m:
+            value = int(float(m.group(2)) * _SIZE_UNITS[m.group(3).upper()])
+            kwargs["min_size" if m.group(1) == ">" else "max_size"] = value
+        elif low.startswith("ext:"):
+            kwargs["ext"] = low[4:]
+        elif low.startswith("prefix:"):
+            kwargs["prefix"] = tok[7:]
+        elif low.startswith("after:"):
+            kwargs["newer_than"] = datetime.strptime(tok[6:], "%Y-%m-%d").timestamp()
+        elif low.startswith("before:"):
+            kwargs["older_than"] = datetime.strptime(tok[7:], "%Y-%m-%d").timestamp()
+        else:
+            words.append(tok)
+    if words:
+        kwargs["text"] = " ".join(words)
+    return kwargs
+
+
+class VolumeIndex:
+    """
+    整卷文件名内存索引，用于在 U 盘全部路径中快速搜索。
+
+    存储采用平行数组（路径列表 + array 保存大小/mtime），查询时：
+    - 子串：在全部小写路径拼接成的大字符串上做 str.find；
+    - 前缀：在排好序的小写文件名上二分；
+    - 扩展名：扩展名 -> 条目编号的字典；
+    - 大小/mtime 区间：按大小、mtime 排序的编号数组上二分；
+    - 删除目录：在按完整路径排序的编号数组上二分出该目录下的全部条目。
+    本程序自身的拷贝/重命名/删除通过 add_path/remove_path 增量更新，
+    新增条目先放在增量区线性搜索，积累到一定数量后再整体重建有序结构。
+    """
+
+    _REBUILD_THRESHOLD = 4096
+
+    def __init__(self, volume_root: str):
+        self.volume_root = volume_root
+        self.ready = threading.Event()
+        self._lock = threading.RLock()
+        self._thread: Optional[threading.Thread] = None
+        self._cancel = threading.Event()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._paths: list[str] = []
+        self._sizes = array("q")
+        self._mtimes = array("d")
+        self._is_dir = bytearray()
+        self._alive = bytearray()
+        self._ids: dict[str, int] = {}
+        self._by_ext: dict[str, list[int]] = {}
+        self._live_count = 0
+        # 以下结构只覆盖编号 < _base_count 的条目
+        self._base_count = 0
+        self._blob = ""
+        self._offsets = array("q")
+        self._name_keys: list[str] = []
+        self._name_ids = array("q")
+        self._size_order = array("q")
+        self._mtime_order = array("q")
+        self._path_order = array("q")
+
+    def __len__(self) -> int:
+        return self._live_count
+
+    # ---------- 构建 ----------
+
+    def build(self, on_done: Optional[Callable[["VolumeIndex"], None]] = None) -> None:
+        """在后台线程中递归扫描整卷并建立索引；完成后 ready 置位并回调 on_done。"""
+        self.cancel()
+        self._cancel = threading.Event()
+        self.ready.clear()
+        cancel = self._cancel
+
+        def run():
+            entries = list(self._scan(self.volume_root, "", cancel))
+            if cancel.is_set():
+                return
+            with self._lock:
+                self._reset()
+                for e in entries:
+                    self._append(e)
+                self._rebuild()
+            self.ready.set()
+            if on_done:
+                on_done(self)
+
+        self._thread = threading.Thread(target=run, name="VolumeIndexBuild", daemon=True)
+        self._thread.start()
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    @staticmethod
+    def _scan(abs_root: str, rel_root: str, cancel: Optional[threading.Event] = None) -> Iterator[IndexEntry]:
+        stack = [(abs_root, rel_root)]
+        while stack:
+            if cancel is not None and cancel.is_set():
+                return
+            abs_dir, rel_dir = stack.pop()
+            try:
+                it = os.scandir(abs_dir)
+            except OSError:
+                continue
+            with it:
+                for entry in it:
+                    if not rel_dir and entry.name in (INDEX_FILENAME, INDEX_FILENAME + ".tmp"):
+                        continue
+                    rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    yield IndexEntry(rel, 0 if is_dir else st.st_size, st.st_mtime, is_dir)
+                    if is_dir:
+                        stack.append((entry.path, rel))
+
+    def _append(self, e: IndexEntry) -> None:
+        old = self._ids.get(e.path)
+        if old is not None:
+            self._kill(old)
+        i = len(self._paths)
+        self._paths.append(e.path)
+        self._sizes.append(e.size)
+        self._mtimes.append(e.mtime)
+        self._is_dir.append(1 if e.is_dir else 0)
+        self._alive.append(1)
+        self._ids[e.path] = i
+        if not e.is_dir:
+            self._by_ext.setdefault(_ext_of(e.path), []).append(i)
+        self._live_count += 1
+
+    def _kill(self, i: int) -> None:
+        if self._alive[i]:
+            self._alive[i] = 0
+            self._live_count -= 1
+            self._ids.pop(self._paths[i], None)
+
+    def _rebuild(self) -> None:
+        """压缩已删除条目并重建全部有序结构。"""
+        live = [i for i in range(len(self._paths)) if self._alive[i]]
+        if len(live) != len(self._paths):
+            entries = [IndexEntry(self._paths[i], self._sizes[i], self._mtimes[i], bool(self._is_dir[i])) for i in live]
+            self._reset()
+            for e in entries:
+                self._append(e)
+
+        n = len(self._paths)
+        lower = [p.lower() for p in self._paths]
+        offsets = array("q")
+        pos = 0
+        for p in lower:
+            offsets.append(pos)
+            pos += len(p) + 1
+        self._blob = "\n".join(lower) + "\n" if lower else ""
+        self._offsets = offsets
+
+        names = sorted((p.rsplit("/", 1)[-1], i) for i, p in enumerate(lower))
+        self._name_keys = [k for k, _ in names]
+        self._name_ids = array("q", (i for _, i in names))
+        self._size_order = array("q", sorted(range(n), key=self._sizes.__getitem__))
+        self._mtime_order = array("q", sorted(range(n), key=self._mtimes.__getitem__))
+        self._path_order = array("q", sorted(range(n), key=self._paths.__getitem__))
+        self._base_count = n
+
+    # ---------- 增量更新 ----------
+
+    def _rel(self, abs_path: str) -> str:
+        return os.path.relpath(abs_path, self.volume_root).replace(os.sep, "/")
+
+    def add_path(self, abs_path: str) -> None:
+        """登记新建/修改的文件或目录（目录会递归登记其内容）。"""
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            return
+        rel = self._rel(abs_path)
+        is_dir = os.path.isdir(abs_path)
+        with self._lock:
+            self._append(IndexEntry(rel, 0 if is_dir else st.st_size, st.st_mtime, is_dir))
+            if is_dir:
+                for e in self._scan(abs_path, rel):
+                    self._append(e)
+            if len(self._paths) - self._base_count > self._REBUILD_THRESHOLD:
+                self._rebuild()
+
+    def remove_path(self, abs_path: str) -> None:
+        """移除已删除的文件或目录（含目录下全部条目）。"""
+        rel = self._rel(abs_path)
+        prefix = rel + "/"
+        with self._lock:
+            i = self._ids.get(rel)
+            if i is not None:
+                self._kill(i)
+            # 目录下的条目：有序区按完整路径二分，增量区线性检查
+            order, paths = self._path_order, self._paths
+            k = bisect_left(order, prefix, key=paths.__getitem__)
+            while k < len(order) and paths[order[k]].startswith(prefix):
+                self._kill(order[k])
+                k += 1
+            for j in range(self._base_count, len(paths)):
+                if self._alive[j] and paths[j].startswith(prefix):
+                    self._kill(j)
+
+    # ---------- 查询 ----------
+
+    def _substring_ids(self, needle: str) -> Iterator[int]:
+        blob, offsets = self._blob, self._offsets
+        pos = blob.find(needle)
+        while pos != -1:
+            i = bisect_right(offsets, pos) - 1
+            yield i
+            # 跳到下一行，避免同一条目重复命中
+            nxt = offsets[i + 1] if i + 1 < len(offsets) else len(blob)
+            pos = blob.find(needle, nxt)
+        for i in range(self._base_count, len(self._paths)):
+            if needle in self._paths[i].lower():
+                yield i
+
+    def _prefix_ids(self, prefix: str) -> Iterator[int]:
+        keys = self._name_keys
+        k = bisect_left(keys, prefix)
+        while k < len(keys) and keys[k].startswith(prefix):
+            yield self._name_ids[k]
+            k += 1
+        for i in range(self._base_count, len(self._paths)):
+            if self._paths[i].rsplit("/", 1)[-1].lower().startswith(prefix):
+                yield i
+
+    def _range_ids(self, order: array, values: array, lo: Optional[float], hi: Optional[float]) -> Iterator[int]:
+        start = 0 if lo is None else bisect_left(order, lo, key=values.__getitem__)
+        stop = len(order) if hi is None else bisect_right(order, hi, key=values.__getitem__)
+        for k in range(start, stop):
+            yield order[k]
+        for i in range(self._base_count, len(self._paths)):
+            if (lo is None or values[i] >= lo) and (hi is None or values[i] <= hi):
+                yield i
+
+    def search(
+            self,
+            text: Optional[str] = None,
+            prefix: Optional[str] = None,
+            ext: Optional[str] = None,
+            min_size: Optional[int] = None,
+            max_size: Optional[int] = None,
+            newer_than: Optional[float] = None,
+            older_than: Optional[float] = None,
+            limit: int = 1000,
+    ) -> list[IndexEntry]:
+        """
+        组合查询：text 为路径子串，prefix 为文件名前缀，ext 为扩展名（如 ".mp4"），
+        其余为大小/mtime 闭区间。条件均不区分大小写，最多返回 limit 条。
+        """
+        text = text.lower() if text else None
+        prefix = prefix.lower() if prefix else None
+        if ext:
+            ext = ext.lower() if ext.startswith(".") else "." + ext.lower()
+
+        with self._lock:
+            # 选一个有索引的条件产生候选，其余条件逐条过滤
+            if text:
+                candidates: Iterable[int] = self._substring_ids(text)
+            elif prefix:
+                candidates = self._prefix_ids(prefix)
+            elif ext:
+                candidates = list(self._by_ext.get(ext, ()))
+            elif min_size is not None or max_size is not None:
+                candidates = self._range_ids(self._size_order, self._sizes, min_size, max_size)
+            elif newer_than is not None or older_than is not None:
+                candidates = self._range_ids(self._mtime_order, self._mtimes, newer_than, older_than)
+            else:
+                candidates = range(len(self._paths))
+
+            results: list[IndexEntry] = []
+            for i in candidates:
+                if not self._alive[i]:
+                    continue
+                path = self._paths[i]
+                if text and text not in path.lower():
+                    continue
+                if prefix and not path.rsplit("/", 1)[-1].lower().startswith(prefix):
+                    continue
+                if ext and (self._is_dir[i] or _ext_of(path) != ext):
+                    continue
+                size, mtime = self._sizes[i], self._mtimes[i]
+                if min_size is not None and size < min_size:
+                    continue
+                if max_size is not None and size > max_size:
+                    continue
+                if newer_than is not None and mtime < newer_than:
+                    continue
+                if older_than is not None and mtime > older_than:
+                    continue
+                results.append(IndexEntry(path, size, mtime, bool(self._is_dir[i])))
+                if len(results) >= limit:
+                    break
+            return results
+
+
+def _ext_of(path: str) -> str:
+    return os.path.splitext(path)[1].lower()